@@ -96,10 +96,16 @@ class TunnelManager:
 
         self._ipsec_manager.renew(tunnel)
 
-        self._tasks[target].set_ready(datetime.timestamp(
-            datetime.now() + tunnel.get_soft_time_limit()))
+        # the current task has been executed already -> schedule the next refresh
+        self._tasks[target] = self._event_system.set_timeout(lambda: self.refresh_tunnel(target),
+                int(tunnel.get_soft_time_limit().total_seconds()))
 
     def remove_tunnel(self, tunnel: Tunnel) -> None:
+        for target in [ target for target, tunnel_ in self._tunnels.items() if tunnel_ == tunnel ]:
+            task = self._tasks.pop(target, None)
+            if task is not None:
+                task.cancel()
+
         ipsec = self._wan_controller.get_service("ipsec")
         try:
             ipsec.remove_tunnel(tunnel.to_proto())
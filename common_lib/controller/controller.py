@@ -4,6 +4,7 @@ from abc import abstractmethod
 from common_lib.logger import Logger
 from common_lib.credentials import Credentials
 from common_lib.event import EventSystem
+from common_lib.metrics import Registry
 from common_lib.repl import Repl
 
 # other
@@ -22,7 +23,8 @@ class Controller:
         self._interactive = interactive
 
         self.logger = Logger(TemporaryFile(), TemporaryFile()) if interactive else Logger()
-        self.event_system = EventSystem(self.logger)
+        self.metrics = Registry()
+        self.event_system = EventSystem(self.logger, self.metrics)
 
     def start(self) -> None:
         self.prepare()
@@ -1,2 +1,3 @@
 from common_lib.event.system import System as EventSystem
 from common_lib.event.task import Task
+from common_lib.event.interval import Interval
@@ -0,0 +1,39 @@
+from common_lib.event.task import Task
+
+from typing import Optional
+
+class Interval:
+    """
+    Handle of a function which is called periodically by the event system.
+    """
+
+    def __init__(self, system, f, interval: float) -> None:
+        self._system = system
+        self._f = f
+        self._interval = interval
+        self._task = None # type: Optional[ Task ]
+        self._stopped = False
+
+    def get_interval(self) -> float:
+        return self._interval
+
+    def is_stopped(self) -> bool:
+        return self._stopped
+
+    def start(self, timeout: float) -> None:
+        self._task = self._system.set_timeout(self._run, timeout)
+
+    def stop(self) -> None:
+        """ Do not call the function again. """
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _run(self) -> None:
+        self._task = None
+        try:
+            self._f()
+        finally:
+            if not self._stopped:
+                self.start(self._interval)
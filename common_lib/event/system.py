@@ -1,16 +1,24 @@
 from common_lib.event.task import Task
+from common_lib.event.interval import Interval
 from common_lib.logger import Logger
+from common_lib.metrics import Registry
 
-from time import time
+from time import time, perf_counter
 from threading import Event, RLock
-from typing import Set, Dict, Any
+from typing import Dict, Any, List, Optional
+from itertools import count
+from heapq import heappush, heappop, heapify
 import traceback
 
 class System:
 
-    def __init__(self, logger: Logger):
+    def __init__(self, logger: Logger, metrics: Optional[ Registry ] = None):
         self._logger = logger
-        self._tasks = set() # type: Set[Task]
+        self._metrics = metrics if metrics is not None else Registry()
+        # heap of [ ready, sequence number, task ], the task of an invalidated entry is None
+        self._tasks = [ ] # type: List[ List ]
+        self._size = 0
+        self._sequence = count()
 
         self._new_task_event = Event()
         self._lock = RLock()
@@ -18,34 +26,91 @@ class System:
 
         self._context = { } # type: Dict[ str, Any ]
 
+        self._lock_wait = self._metrics.histogram("p4sec_event_system_lock_wait_seconds",
+                "Time spent waiting for the lock of the event system.")
+        self._task_lag = self._metrics.histogram("p4sec_event_system_task_lag_seconds",
+                "Delay between the time a task was due and its execution.")
+        self._task_duration = self._metrics.histogram("p4sec_event_system_task_seconds",
+                "Execution time of tasks.")
+        self._metrics.gauge("p4sec_event_system_tasks",
+                "Number of scheduled tasks.").set_function(lambda: self._size)
+
+    def get_metrics(self) -> Registry:
+        """ Metrics registry of the controller. """
+        return self._metrics
+
     def set_context(self, key: str, value: Any) -> None:
         self._context[key] = value
 
     def get_context(self, key) -> Any:
         return self._context.get(key)
 
-    def _push_task(self, task: Task) -> None:
-        self._tasks.add(task)
+    def _push_task(self, task: Task, ready: Optional[ float ] = None) -> None:
+        entry = [ task.get_ready() if ready is None else ready, next(self._sequence), task ]
+        task.set_entry(entry)
+        heappush(self._tasks, entry)
+        self._size += 1
+
+    def _remove_task(self, task: Task) -> None:
+        """ Invalidate the entry of a task, it is dropped when it reaches the top. """
+        entry = task.get_entry()
+        if entry is None:
+            return
+
+        entry[2] = None
+        task.set_entry(None)
+        self._size -= 1
+
+        # do not let invalidated entries dominate the heap
+        if len(self._tasks) > 64 and self._size < len(self._tasks) // 2:
+            self._tasks = [ entry for entry in self._tasks if entry[2] is not None ]
+            heapify(self._tasks)
 
     def _pop_task(self) -> Task:
         task = self._peek_task()
-        self._tasks.remove(task)
+        assert task is not None, "There is no scheduled task."
+        heappop(self._tasks)
+        task.set_entry(None)
+        self._size -= 1
         return task
 
-    def _peek_task(self) -> Task:
-        return sorted(self._tasks, reverse=True).pop()
+    def _peek_task(self) -> Optional[ Task ]:
+        while len(self._tasks) > 0 and self._tasks[0][2] is None:
+            heappop(self._tasks)
+        return self._tasks[0][2] if len(self._tasks) > 0 else None
+
+    def reschedule(self, task: Task, ready: float) -> None:
+        """ Move a scheduled task to a new point in time. """
+        self.acquire()
+        try:
+            if not task.is_scheduled():
+                return
+            self._remove_task(task)
+            self._push_task(task, ready)
+            self._new_task_event.set()
+        finally:
+            self.release()
+
+    def cancel(self, task: Task) -> None:
+        """ Remove a scheduled task. """
+        self.acquire()
+        try:
+            self._remove_task(task)
+        finally:
+            self.release()
 
     def set_timeout(self, f, timeout: int) -> Task:
         self.acquire()
-        task = Task(f, time() + timeout)
+        task = Task(f, time() + timeout, self)
         self._push_task(task)
         self._new_task_event.set()
         self.release()
         return task
 
-    def set_interval(self, f, interval: int, continue_=True, immediate=False) -> None:
-        self.set_timeout(lambda: self.set_interval(f, interval, not f()), \
-                0 if immediate else interval)
+    def set_interval(self, f, interval: int, immediate=False) -> Interval:
+        interval_ = Interval(self, f, interval)
+        interval_.start(0 if immediate else interval)
+        return interval_
 
     def force_release(self) -> None:
         while not self._lock.acquire(blocking=False):
@@ -53,7 +118,9 @@ class System:
         self._lock.release()
 
     def acquire(self) -> bool:
+        start = perf_counter()
         result = self._lock.acquire(timeout=10)#s
+        self._lock_wait.observe(perf_counter() - start)
 
         if result == False:
             self._logger.warn("Could not acquire Lock -> Probably a deadlock occured.")
@@ -74,8 +141,12 @@ class System:
         while True:
             self._new_task_event.clear()
 
-            if len(self._tasks) > 0:
-                self._new_task_event.wait(self._peek_task().get_ready() - time())
+            self.acquire()
+            task = self._peek_task()
+            self.release()
+
+            if task is not None:
+                self._new_task_event.wait(task.get_ready() - time())
             else:
                 self._new_task_event.wait()
 
@@ -84,12 +155,14 @@ class System:
 
             try:
                 self.acquire()
-                task = self._pop_task()
-
-                if task.get_ready() < time():
-                    task()
-                else:
-                    self._push_task(task)
+                task = self._peek_task()
+
+                now = time()
+                if task is not None and task.get_ready() <= now:
+                    self._pop_task()
+                    self._task_lag.observe(now - task.get_ready())
+                    with self._task_duration.time():
+                        task()
             except Exception as e:
                 self._logger.error("Unexpected error occured: " + str(e))
                 traceback.print_exc()
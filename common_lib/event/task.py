@@ -1,16 +1,40 @@
 from time import time
+from typing import List, Optional
 
 class Task:
-    def __init__(self, f, ready: float):
+    def __init__(self, f, ready: float, system=None):
         self._f = f
         self._ready = ready
+        self._system = system
+
+        # entry of the task in the heap of the system, None if not scheduled
+        self._entry = None # type: Optional[ List ]
 
     def set_ready(self, ready: float) -> None:
-        self._ready = ready
+        if self._system is not None:
+            self._system.reschedule(self, ready)
+        else:
+            self._ready = ready
 
     def get_ready(self) -> float:
         return self._ready
 
+    def set_entry(self, entry: Optional[ List ]) -> None:
+        self._entry = entry
+        if entry is not None:
+            self._ready = entry[0]
+
+    def get_entry(self) -> Optional[ List ]:
+        return self._entry
+
+    def is_scheduled(self) -> bool:
+        return self._entry is not None
+
+    def cancel(self) -> None:
+        """ Remove the task from its system, it will not be executed anymore. """
+        if self._system is not None:
+            self._system.cancel(self)
+
     def __call__(self) -> None:
         self._f()
 
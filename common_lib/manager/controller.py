@@ -54,6 +54,9 @@ class ControllerManager:
     def get_controller(self, id_: UUID) -> StubController:
         return self._controllers[id_]
 
+    def has_controller(self, id_: UUID) -> bool:
+        return id_ in self._controllers
+
     def get_controllers(self) -> List[ StubController ]:
         return [ controller for _id, controller in self._controllers.items() ]
 
@@ -0,0 +1,2 @@
+from common_lib.metrics.metric import Counter, Gauge, Histogram
+from common_lib.metrics.registry import Registry
@@ -0,0 +1,187 @@
+# other
+from abc import abstractmethod
+from contextlib import contextmanager
+from bisect import bisect_left
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+def _format_labels(labels: List[ Tuple[ str, str ] ]) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(name + "=\"" + _escape(value) + "\"" for name, value in labels) + "}"
+
+# suffix of the sample name, additional labels, value
+Sample = Tuple[ str, List[ Tuple[ str, str ] ], float ]
+
+class Metric:
+    """
+    Metric with a value per combination of label values.
+    A metric without labels is used directly, otherwise the values
+    of a combination are selected with labels.
+    """
+
+    type_ = "untyped"
+
+    def __init__(self, name: str, help_: str, label_names: Iterable[ str ] = ()) -> None:
+        self._name = name
+        self._help = help_
+        self._label_names = tuple(label_names)
+        self._lock = Lock()
+        self._children = dict() # type: Dict[ Tuple, Metric ]
+
+    def get_name(self) -> str:
+        return self._name
+
+    def _create_child(self) -> 'Metric':
+        return self.__class__(self._name, self._help)
+
+    def labels(self, *values) -> 'Metric':
+        """ Get the metric of a combination of label values. """
+        assert len(values) == len(self._label_names), "Wrong number of label values"
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._create_child())
+        return child
+
+    @abstractmethod
+    def _get_samples(self) -> List[ Sample ]:
+        """ Samples of a metric without labels. """
+        pass
+
+    def expose(self) -> str:
+        """ Format the metric in the Prometheus text format. """
+        lines = [ "# HELP " + self._name + " " + self._help,
+                "# TYPE " + self._name + " " + self.type_ ]
+
+        if len(self._label_names) == 0:
+            children = [ ((), self) ] # type: List[ Tuple[ Tuple, Metric ] ]
+        else:
+            with self._lock:
+                children = sorted(self._children.items())
+
+        for values, child in children:
+            labels = list(zip(self._label_names, values))
+            for suffix, extra, value in child._get_samples():
+                lines.append(self._name + suffix + _format_labels(labels + extra)
+                        + " " + _format_value(value))
+
+        return "\n".join(lines) + "\n"
+
+class Counter(Metric):
+    """ Value which only increases, e.g. the number of handled requests (name_total). """
+
+    type_ = "counter"
+
+    def __init__(self, name: str, help_: str, label_names: Iterable[ str ] = ()) -> None:
+        super().__init__(name, help_, label_names)
+        self._value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+    def _get_samples(self) -> List[ Sample ]:
+        return [ ("", [ ], self._value) ]
+
+class Gauge(Metric):
+    """ Value which goes up and down, or is read from a function when exposed. """
+
+    type_ = "gauge"
+
+    def __init__(self, name: str, help_: str, label_names: Iterable[ str ] = ()) -> None:
+        super().__init__(name, help_, label_names)
+        self._value = 0.0
+        self._function = None # type: Optional[ Callable[ [], float ] ]
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, function: Callable[ [], float ]) -> None:
+        """ Read the value from function whenever it is exposed. """
+        self._function = function
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def get(self) -> float:
+        return self._function() if self._function is not None else self._value
+
+    def _get_samples(self) -> List[ Sample ]:
+        return [ ("", [ ], self.get()) ]
+
+class Histogram(Metric):
+    """ Distribution of observed values, e.g. latencies in seconds. """
+
+    type_ = "histogram"
+
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+            1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self,
+            name: str,
+            help_: str,
+            label_names: Iterable[ str ] = (),
+            buckets: Iterable[ float ] = BUCKETS
+        ) -> None:
+        super().__init__(name, help_, label_names)
+        self._buckets = tuple(sorted(buckets))
+        self._counts = [ 0 ] * (len(self._buckets) + 1)
+        self._sum = 0.0
+
+    def _create_child(self) -> 'Metric':
+        return Histogram(self._name, self._help, buckets=self._buckets)
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        """ Observe the duration of the block in seconds. """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start)
+
+    def get_count(self) -> int:
+        return sum(self._counts)
+
+    def get_sum(self) -> float:
+        return self._sum
+
+    def _get_samples(self) -> List[ Sample ]:
+        with self._lock:
+            counts = list(self._counts)
+            sum_ = self._sum
+
+        samples = [ ] # type: List[ Sample ]
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"), ), counts):
+            cumulative += count
+            samples.append(("_bucket", [ ("le", _format_value(bound)) ], cumulative))
+        samples.append(("_sum", [ ], sum_))
+        samples.append(("_count", [ ], cumulative))
+        return samples
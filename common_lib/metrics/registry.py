@@ -0,0 +1,42 @@
+# local
+from common_lib.metrics.metric import Metric, Counter, Gauge, Histogram
+
+# other
+from threading import Lock
+from typing import Dict, Iterable
+
+class Registry:
+    """
+    Collection of all metrics of a controller.
+    Metrics are created on first use and shared afterwards, such that
+    several components may ask for the same metric.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._metrics = dict() # type: Dict[ str, Metric ]
+
+    def _get(self, Class, name: str, help_: str, label_names: Iterable[ str ], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = Class(name, help_, label_names, **kwargs)
+                self._metrics[name] = metric
+            assert isinstance(metric, Class), "Metric " + name + " has another type."
+            return metric
+
+    def counter(self, name: str, help_: str, label_names: Iterable[ str ] = ()) -> Counter:
+        return self._get(Counter, name, help_, label_names)
+
+    def gauge(self, name: str, help_: str, label_names: Iterable[ str ] = ()) -> Gauge:
+        return self._get(Gauge, name, help_, label_names)
+
+    def histogram(self, name: str, help_: str, label_names: Iterable[ str ] = (),
+            buckets: Iterable[ float ] = Histogram.BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_, label_names, buckets=buckets)
+
+    def expose(self) -> str:
+        """ All metrics in the Prometheus text format. """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.get_name())
+        return "".join(metric.expose() for metric in metrics)
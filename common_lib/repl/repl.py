@@ -84,6 +84,9 @@ class Repl(Cmd):
         settings = [ [ k, v ] for k, v in vars(self.get_settings()).items() ]
         self.print(tabulate(settings))
 
+    def do_print_metrics(self, line):
+        self.print(self.get_event_system().get_metrics().expose(), end="")
+
     def do_exit(self, line):
         self.get_event_system().stop()
         return True
@@ -5,18 +5,34 @@ from common_lib.ipaddress import Network
 from routing_pb2 import forward_rule # type: ignore
 
 # other
-from typing import Set
+from typing import Set, Tuple
 from ipaddress import ip_network
 from uuid import UUID
 
 class ForwardRule:
+    """
+    Immutable rule of a local controller (src) to forward packets of a
+    subnet to the next controller (dst). Rules with the same values are
+    equal and can be kept in sets.
+    """
+
+    __slots__ = [ "_src", "_dst", "_dst_mac", "_port", "_subnet", "_key", "_hash" ]
 
     def __init__(self, src: UUID, dst: UUID, dst_mac: str, port: int, subnet: Network):
-        self._src = src
-        self._dst = dst
-        self._dst_mac = dst_mac
-        self._port = port
-        self._subnet = subnet
+        set_ = super().__setattr__
+        set_("_src", src)
+        set_("_dst", dst)
+        set_("_dst_mac", dst_mac)
+        set_("_port", port)
+        set_("_subnet", subnet)
+        set_("_key", (src, dst, dst_mac, port, subnet))
+        set_("_hash", hash(self._key))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ForwardRule is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ForwardRule is immutable")
 
     def get_src(self) -> UUID:
         return self._src
@@ -33,6 +49,25 @@ class ForwardRule:
     def get_subnet(self) -> Network:
         return self._subnet
 
+    def get_key(self) -> Tuple:
+        return self._key
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ForwardRule):
+            return NotImplemented
+        return self._hash == other._hash and self._key == other._key
+
+    def __ne__(self, other) -> bool:
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        # copies have to go through the constructor as well
+        return (ForwardRule, self._key)
+
     def to_proto(self) -> forward_rule:
         return forward_rule(
             src = str(self.get_src()),
@@ -1,4 +1,5 @@
 from common_lib.server.synchronous import synchronize
 from common_lib.server.traceback import traceback
 from common_lib.server.lazy import lazy
+from common_lib.server.metrics import MetricsInterceptor
 from common_lib.server.server import Server
@@ -0,0 +1,63 @@
+# common
+from common_lib.metrics import Registry
+
+# other
+from grpc import ServerInterceptor, unary_unary_rpc_method_handler, \
+        unary_stream_rpc_method_handler, stream_unary_rpc_method_handler, \
+        stream_stream_rpc_method_handler # type: ignore
+from time import perf_counter
+
+class MetricsInterceptor(ServerInterceptor):
+    """ Counts the calls of every rpc and observes how long they take. """
+
+    def __init__(self, metrics: Registry) -> None:
+        self._calls = metrics.counter("p4sec_rpc_calls_total",
+                "Handled remote procedure calls.", [ "method", "status" ])
+        self._duration = metrics.histogram("p4sec_rpc_seconds",
+                "Duration of remote procedure calls.", [ "method" ])
+
+    def _observe(self, method: str, start: float, status: str) -> None:
+        self._duration.labels(method).observe(perf_counter() - start)
+        self._calls.labels(method, status).inc()
+
+    def _wrap_unary(self, method: str, behavior):
+        def observed(request, context):
+            start = perf_counter()
+            status = "error"
+            try:
+                response = behavior(request, context)
+                status = "ok"
+                return response
+            finally:
+                self._observe(method, start, status)
+        return observed
+
+    def _wrap_stream(self, method: str, behavior):
+        def observed(request, context):
+            start = perf_counter()
+            status = "error"
+            try:
+                yield from behavior(request, context)
+                status = "ok"
+            finally:
+                self._observe(method, start, status)
+        return observed
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+
+        method = handler_call_details.method
+        arguments = (handler.request_deserializer, handler.response_serializer)
+        if handler.unary_unary is not None:
+            return unary_unary_rpc_method_handler(
+                    self._wrap_unary(method, handler.unary_unary), *arguments)
+        if handler.stream_unary is not None:
+            return stream_unary_rpc_method_handler(
+                    self._wrap_unary(method, handler.stream_unary), *arguments)
+        if handler.unary_stream is not None:
+            return unary_stream_rpc_method_handler(
+                    self._wrap_stream(method, handler.unary_stream), *arguments)
+        return stream_stream_rpc_method_handler(
+                self._wrap_stream(method, handler.stream_stream), *arguments)
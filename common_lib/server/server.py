@@ -5,6 +5,7 @@ from common_lib.controller import Settings
 from common_lib.event import EventSystem
 from common_lib.ipaddress import Address
 from common_lib.credentials import Credentials
+from common_lib.server.metrics import MetricsInterceptor
 
 # other
 from abc import abstractmethod
@@ -37,7 +38,8 @@ class Server:
         self._logger.debug("Start thread")
 
         # Create instance
-        self.instance = server(ThreadPoolExecutor(max_workers=cpu_count()))
+        self.instance = server(ThreadPoolExecutor(max_workers=cpu_count()),
+                interceptors=[ MetricsInterceptor(self._event_system.get_metrics()) ])
         if self.secure == True:
             self.instance.add_secure_port(str(self.get_address()), \
                     self.get_credentials().get_server_credentials())
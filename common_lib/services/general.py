@@ -5,6 +5,7 @@ from common_lib.event import EventSystem
 # protobuf
 from general_pb2_grpc import add_GeneralServicer_to_server, GeneralServicer # type: ignore
 from nothing_pb2 import nothing # type: ignore
+from text_pb2 import text # type: ignore
 from grpc import ServicerContext # type: ignore
 
 class GeneralService(Service, GeneralServicer):
@@ -14,3 +15,6 @@ class GeneralService(Service, GeneralServicer):
 
     def check_connection(self, request: nothing, context: ServicerContext) -> nothing:
         return nothing()
+
+    def get_metrics(self, request: nothing, context: ServicerContext) -> text:
+        return text(value=self.get_event_system().get_metrics().expose())
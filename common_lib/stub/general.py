@@ -1,6 +1,7 @@
 # protobuf / grpc
 from general_pb2_grpc import GeneralStub # type: ignore
 from nothing_pb2 import nothing # type: ignore
+from text_pb2 import text # type: ignore
 from grpc import Channel, RpcError # type: ignore
 
 class General:
@@ -15,3 +16,6 @@ class General:
         except RpcError:
             return False
 
+    def get_metrics(self) -> str:
+        """ Metrics of the controller in the Prometheus text format. """
+        return self._stub.get_metrics(nothing()).value
@@ -1,3 +1,4 @@
 from common_lib.topology.edge import Edge
 from common_lib.topology.topology import Topology
+from common_lib.topology.tree import ShortestPathTree
 from common_lib.topology.bddp import BDDPPacket
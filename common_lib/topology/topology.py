@@ -78,6 +78,11 @@ class Topology:
     def get_edges_of(self, x: UUID):
         return [ edge[2]["edge"] for edge in self._connections.edges([ x ], data=True) ]
 
+    def get_neighbors(self, x: UUID) -> List[ UUID ]:
+        if not self._connections.has_node(x):
+            return [ ]
+        return list(self._connections.neighbors(x))
+
     def get_edges(self) -> List[ Edge ]:
         return [ edge[2]["edge"] for edge in self._connections.edges.data() ]
 
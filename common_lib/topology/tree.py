@@ -0,0 +1,133 @@
+# other
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+INFINITY = float("inf")
+
+class ShortestPathTree:
+    """
+    Tree of shortest paths (in hops) of all nodes of a topology towards
+    a root. The tree is updated incrementally, a change of an edge only
+    recomputes the part of the tree whose distances can change.
+    Updates return the nodes whose parent or distance has changed, mapped
+    to their previous parent (None if they have not been in the tree).
+    """
+
+    def __init__(self, topology, root: UUID) -> None:
+        self._topology = topology
+        self._root = root
+
+        self._parents = { root: None } # type: Dict[ UUID, Optional[ UUID ] ]
+        self._distances = { root: 0 } # type: Dict[ UUID, float ]
+        self._children = { root: set() } # type: Dict[ UUID, Set[ UUID ] ]
+
+        self._relax([ (0, root) ], dict())
+
+    def get_root(self) -> UUID:
+        return self._root
+
+    def get_parent(self, node: UUID) -> Optional[ UUID ]:
+        """ Next node on the path towards the root, None for the root or unreachable nodes. """
+        return self._parents.get(node)
+
+    def get_parents(self) -> Dict[ UUID, Optional[ UUID ] ]:
+        return dict(self._parents)
+
+    def get_distance(self, node: UUID) -> float:
+        return self._distances.get(node, INFINITY)
+
+    def get_next_hops(self, node: UUID) -> List[ UUID ]:
+        """ All neighbors on a shortest path towards the root, the parent is one of them. """
+        distance = self.get_distance(node)
+        if distance == 0 or distance == INFINITY:
+            return [ ]
+        return [ neighbor for neighbor in self._topology.get_neighbors(node)
+                if self.get_distance(neighbor) == distance - 1 ]
+
+    def _set_parent(self,
+            node: UUID,
+            parent: UUID,
+            distance: float,
+            changed: Dict[ UUID, Tuple[ Optional[ UUID ], float ] ]
+        ) -> None:
+        old = self._parents.get(node)
+        if node not in changed:
+            changed[node] = (old, self.get_distance(node))
+        if old is not None:
+            self._children[old].discard(node)
+
+        self._parents[node] = parent
+        self._distances[node] = distance
+        self._children[parent].add(node)
+        self._children.setdefault(node, set())
+
+    def _relax(self,
+            heap: List[ Tuple[ float, UUID ] ],
+            changed: Dict[ UUID, Tuple[ Optional[ UUID ], float ] ]
+        ) -> None:
+        """ Propagate shortened distances from the nodes of the heap. """
+        while len(heap) > 0:
+            distance, node = heappop(heap)
+            if distance > self.get_distance(node):
+                continue
+
+            for neighbor in self._topology.get_neighbors(node):
+                if distance + 1 < self.get_distance(neighbor):
+                    self._set_parent(neighbor, node, distance + 1, changed)
+                    heappush(heap, (distance + 1, neighbor))
+
+    def _get_changes(self,
+            changed: Dict[ UUID, Tuple[ Optional[ UUID ], float ] ]
+        ) -> Dict[ UUID, Optional[ UUID ] ]:
+        return dict((node, parent) for node, (parent, distance) in changed.items()
+                if self._parents.get(node) != parent or self.get_distance(node) != distance)
+
+    def add_edge(self, x: UUID, y: UUID) -> Dict[ UUID, Optional[ UUID ] ]:
+        """ Update the tree after an edge between x and y has been added. """
+        changed = dict() # type: Dict[ UUID, Tuple[ Optional[ UUID ], float ] ]
+        heap = [ ] # type: List[ Tuple[ float, UUID ] ]
+
+        for a, b in [ (x, y), (y, x) ]:
+            if self.get_distance(a) + 1 < self.get_distance(b):
+                self._set_parent(b, a, self.get_distance(a) + 1, changed)
+                heappush(heap, (self.get_distance(b), b))
+
+        self._relax(heap, changed)
+        return self._get_changes(changed)
+
+    def _get_subtree(self, node: UUID) -> List[ UUID ]:
+        subtree = [ node ]
+        for child in subtree:
+            subtree.extend(self._children[child])
+        return subtree
+
+    def remove_edge(self, x: UUID, y: UUID) -> Dict[ UUID, Optional[ UUID ] ]:
+        """ Update the tree after the edge between x and y has been removed. """
+        if self._parents.get(x) == y:
+            child = x
+        elif self._parents.get(y) == x:
+            child = y
+        else:
+            # distances only depend on tree edges
+            return dict()
+
+        # detach the subtree below the edge, the rest of the tree keeps its distances
+        changed = dict() # type: Dict[ UUID, Tuple[ Optional[ UUID ], float ] ]
+        subtree = self._get_subtree(child)
+        self._children[self._parents[child]].discard(child)
+        for node in subtree:
+            changed[node] = (self._parents.pop(node), self._distances.pop(node))
+            self._children[node] = set()
+
+        # reattach the subtree at the nearest remaining nodes
+        heap = [ ] # type: List[ Tuple[ float, UUID ] ]
+        for node in subtree:
+            for neighbor in self._topology.get_neighbors(node):
+                if self.get_distance(neighbor) + 1 < self.get_distance(node):
+                    self._set_parent(node, neighbor, self.get_distance(neighbor) + 1, changed)
+            if node in self._distances:
+                heappush(heap, (self._distances[node], node))
+
+        self._relax(heap, changed)
+        return self._get_changes(changed)
@@ -30,7 +30,7 @@ class Controller(BaseController):
         self.controller_manager = ControllerManager(self.logger, self.event_system)
         self.lldp_manager = LLDPManager(self.logger, self.controller_manager)
         self.macsec_manager = MacsecManager(self.logger, self.lldp_manager, self.event_system)
-        self.routing_manager = RoutingManager(self.logger, self.wan_controller,
+        self.routing_manager = RoutingManager(self.logger, self.settings, self.wan_controller,
                 self.controller_manager, self.lldp_manager.get_topology())
         self.ipsec_manager = IpsecManager(self.logger, self.settings, self.wan_controller,
                 self.controller_manager, self.routing_manager)
@@ -62,6 +62,7 @@ class Controller(BaseController):
         except RpcError:
             self.logger.error("Could not unregister at wan controller.")
         self.macsec_manager.teardown()
+        self.routing_manager.teardown()
 
         self.interface.stop()
         #self.interface2.stop()
@@ -3,9 +3,12 @@ from common_lib.macsec import Rule, Address
 
 # protobuf / grpc
 from macsec_pb2_grpc import MacsecStub # type: ignore
-from macsec_pb2 import bddp_key # type: ignore
+from macsec_pb2 import bddp_key, rules, rule_errors # type: ignore
 from grpc import Channel # type: ignore
 
+# other
+from typing import Iterable, List, Tuple
+
 class Macsec:
 
     def __init__(self, channel: Channel):
@@ -20,5 +23,35 @@ class Macsec:
     def renew(self, rule: Rule) -> None:
         self._stub.renew(rule.to_proto())
 
+    @staticmethod
+    def _to_proto(removed: Iterable[ Address ], added: Iterable[ Rule ], renewed: Iterable[ Rule ]) -> rules:
+        return rules(
+            remove=[ address.to_proto() for address in removed ],
+            add=[ rule.to_proto() for rule in added ],
+            renew=[ rule.to_proto() for rule in renewed ]
+        )
+
+    @staticmethod
+    def _from_proto(errors: rule_errors) -> List[ Tuple[ Address, str ] ]:
+        return [ (Address.from_proto(error.address), error.message) for error in errors.errors ]
+
+    def apply_macsec_rules(self,
+            removed: Iterable[ Address ] = (),
+            added: Iterable[ Rule ] = (),
+            renewed: Iterable[ Rule ] = ()
+        ) -> List[ Tuple[ Address, str ] ]:
+        """
+        Remove, add and renew rules with a single call.
+        Returns the address and the error of every rule which failed.
+        """
+        return self._from_proto(self._stub.apply_macsec_rules(self._to_proto(removed, added, renewed)))
+
+    def stream_macsec_rules(self,
+            changes: Iterable[ Tuple[ List[ Address ], List[ Rule ], List[ Rule ] ] ]
+        ) -> List[ Tuple[ Address, str ] ]:
+        """ Send (removed, added, renewed) chunks of rules over a single stream. """
+        return self._from_proto(self._stub.stream_macsec_rules(
+            self._to_proto(*change) for change in changes))
+
     def send_bddp_packet(self, key: bddp_key) -> None:
         self._stub.send_bddp_packet(key)
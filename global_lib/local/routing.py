@@ -3,8 +3,12 @@ from common_lib.routing import ForwardRule
 
 # protobuf / grpc
 from routing_pb2_grpc import LocalRoutingStub # type: ignore
+from routing_pb2 import forward_rules # type: ignore
 from grpc import Channel # type: ignore
 
+# other
+from typing import Iterable, List, Tuple
+
 class Routing:
 
     def __init__(self, channel: Channel):
@@ -15,3 +19,20 @@ class Routing:
 
     def remove_forward_rule(self, rule: ForwardRule) -> None:
         self._stub.remove_forward_rule(rule.to_proto())
+
+    @staticmethod
+    def _to_proto(added: Iterable[ ForwardRule ], removed: Iterable[ ForwardRule ]) -> forward_rules:
+        return forward_rules(
+            add=[ rule.to_proto() for rule in added ],
+            remove=[ rule.to_proto() for rule in removed ]
+        )
+
+    def apply_forward_rules(self, added: Iterable[ ForwardRule ], removed: Iterable[ ForwardRule ]) -> None:
+        """ Remove and add forward rules with a single call. """
+        self._stub.apply_forward_rules(self._to_proto(added, removed))
+
+    def stream_forward_rules(self,
+            changes: Iterable[ Tuple[ List[ ForwardRule ], List[ ForwardRule ] ] ]
+        ) -> None:
+        """ Send (added, removed) chunks of forward rules over a single stream. """
+        self._stub.stream_forward_rules(self._to_proto(added, removed) for added, removed in changes)
@@ -10,10 +10,15 @@ from global_lib.local.controller import LocalController
 
 # other
 from os import urandom
-from typing import Tuple, cast
+from typing import Dict, Iterable, List, Tuple, cast
+from uuid import UUID
+from collections import defaultdict
 from datetime import datetime, timedelta
 from macsec_pb2 import bddp_key # type: ignore
 
+# macsec rules per call to a local controller, larger updates are streamed
+RULE_CHUNK_SIZE = 1024
+
 class MacsecManager:
     def __init__(self,
             logger: Logger,
@@ -27,40 +32,102 @@ class MacsecManager:
 
     def add(self, edge: Edge) -> None:
         """ Write protect and validate rules in both switches. """
-        self._logger.info("Add macsec rules for " + str(edge))
-        try:
-            controller1, controller2 = self._get_controllers(edge)
-            rule1, rule2 = self._create_rules(edge)
-            controller1.get_service("macsec").add(rule1)
-            controller2.get_service("macsec").add(rule2)
-
-        except Exception as e:
-            # Rollback
-            self._logger.error("Could not write macsec rules for " + str(edge))
-            self._logger.error(str(e))
-            self.remove(edge)
-
+        self.apply(added=[ edge ])
 
     def remove(self, edge: Edge) -> None:
         """ Remove protect and validate rules in both switches. """
-        self._logger.info("Remove macsec rules for " + str(edge))
-        controller1, controller2 = self._get_controllers(edge)
-
-        address1 = Address(controller1.get_mac(), edge.get_port2())
-        address2 = Address(controller2.get_mac(), edge.get_port1())
-
-        try:
-            if not controller1.is_client():
-                controller1.get_service("macsec").remove(address2)
-        except:
-            self._logger.warn("Could not remove macsec rules for controller " + \
-                    controller1.get_name())
+        self.apply(removed=[ edge ])
+
+    def apply(self,
+            added: Iterable[ Edge ] = (),
+            removed: Iterable[ Edge ] = (),
+            renewed: Iterable[ Edge ] = ()
+        ) -> None:
+        """
+        Add, remove and renew the rules of several edges. The rules are
+        grouped by controller and every controller gets all of its rules
+        with a single call. Edges whose rules could not be added are
+        removed again.
+        """
+        changes = defaultdict(lambda: ([ ], [ ], [ ])) # type: defaultdict
+        controllers = dict() # type: Dict[ UUID, LocalController ]
+        # edge of every added rule by controller and address
+        edges = dict() # type: Dict[ Tuple[ UUID, str ], Edge ]
+
+        for edge in removed:
+            self._logger.info("Remove macsec rules for " + str(edge))
+            controller1, controller2 = self._get_controllers(edge)
+            address1 = Address(controller1.get_mac(), edge.get_port2())
+            address2 = Address(controller2.get_mac(), edge.get_port1())
+            for controller, address in [ (controller1, address2), (controller2, address1) ]:
+                if not controller.is_client():
+                    controllers[controller.get_id()] = controller
+                    changes[controller.get_id()][0].append(address)
+
+        for edge in added:
+            self._logger.info("Add macsec rules for " + str(edge))
+            controller1, controller2 = self._get_controllers(edge)
+            rule1, rule2 = self._create_rules(edge)
+            for controller, rule in [ (controller1, rule1), (controller2, rule2) ]:
+                controllers[controller.get_id()] = controller
+                changes[controller.get_id()][1].append(rule)
+                edges[(controller.get_id(), str(rule.get_protect().get_address()))] = edge
+
+        for edge in renewed:
+            if self._lldp_manager.get_topology().has(edge):
+                self._logger.info("Renew macsec rules for " + str(edge))
+                controller1, controller2 = self._get_controllers(edge)
+                rule1, rule2 = self._create_rules(edge)
+                for controller, rule in [ (controller1, rule1), (controller2, rule2) ]:
+                    controllers[controller.get_id()] = controller
+                    changes[controller.get_id()][2].append(rule)
+
+        failed = [ ] # type: List[ Edge ]
+        for id_, (removed_, added_, renewed_) in changes.items():
+            errors = self._send_rules(controllers[id_], removed_, added_, renewed_)
+            for address, error in errors:
+                edge = edges.get((id_, str(address)))
+                if edge is not None and edge not in failed:
+                    self._logger.error("Could not write macsec rules for " + str(edge))
+                    failed.append(edge)
+
+        if len(failed) > 0:
+            # Rollback
+            self.apply(removed=failed)
+
+    def _send_rules(self,
+            controller: LocalController,
+            removed: List[ Address ],
+            added: List[ Rule ],
+            renewed: List[ Rule ]
+        ) -> List[ Tuple[ Address, str ] ]:
+        """
+        Send the rule changes of one controller.
+        Returns the address and the error of every rule which failed.
+        """
         try:
-            if not controller2.is_client():
-                controller2.get_service("macsec").remove(address1)
-        except:
-            self._logger.warn("Could not remove macsec rules for controller " + \
-                    controller2.get_name())
+            macsec = controller.get_service("macsec")
+            if len(removed) + len(added) + len(renewed) <= RULE_CHUNK_SIZE:
+                errors = macsec.apply_macsec_rules(removed, added, renewed)
+            else:
+                # large updates are streamed in chunks
+                chunks = [ (removed[i:i + RULE_CHUNK_SIZE], [ ], [ ])
+                        for i in range(0, len(removed), RULE_CHUNK_SIZE) ]
+                chunks += [ ([ ], added[i:i + RULE_CHUNK_SIZE], [ ])
+                        for i in range(0, len(added), RULE_CHUNK_SIZE) ]
+                chunks += [ ([ ], [ ], renewed[i:i + RULE_CHUNK_SIZE])
+                        for i in range(0, len(renewed), RULE_CHUNK_SIZE) ]
+                errors = macsec.stream_macsec_rules(chunks)
+        except Exception as e:
+            self._logger.warn("Could not apply macsec rules on controller "
+                    + controller.get_name() + ": " + str(e))
+            errors = [ (address, str(e)) for address in removed ] \
+                    + [ (rule.get_protect().get_address(), str(e)) for rule in added + renewed ]
+
+        for address, error in errors:
+            self._logger.warn("Could not apply macsec rule " + str(address)
+                    + " on controller " + controller.get_name() + ": " + error)
+        return errors
 
     def _get_controllers(self, edge: Edge) -> Tuple[ LocalController, LocalController ]:
         controller1, controller2 = self._lldp_manager.get_edge_controllers(edge)
@@ -102,13 +169,7 @@ class MacsecManager:
         return rule1, rule2
 
     def renew(self, edge: Edge) -> None:
-        self._logger.info("Renew macsec rules for " + str(edge))
-
-        if self._lldp_manager.get_topology().has(edge):
-            controller1, controller2 = self._get_controllers(edge)
-            rule1, rule2 = self._create_rules(edge)
-            controller1.get_service("macsec").renew(rule1)
-            controller2.get_service("macsec").renew(rule2)
+        self.apply(renewed=[ edge ])
 
     def start(self):
         self._lldp_manager.register_add_connection(self.add)
@@ -125,11 +186,11 @@ class MacsecManager:
         rule1, rule2 = self._create_rules(edge)
 
         if controller1.is_client():
-            controller2.get_service("macsec").add(rule2)
+            self._send_rules(cast(LocalController, controller2), [ ], [ rule2 ], [ ])
             return rule1
 
         if controller2.is_client():
-            controller1.get_service("macsec").add(rule1)
+            self._send_rules(cast(LocalController, controller1), [ ], [ rule1 ], [ ])
             return rule2
 
         raise Exception("One controller must be a client.")
@@ -144,10 +205,10 @@ class MacsecManager:
             controller1, controller2 = self._get_controllers(edge)
             rule1, rule2 = self._create_rules(edge)
             if not controller1.is_client():
-                controller1.get_service("macsec").renew(rule1)
+                self._send_rules(controller1, [ ], [ ], [ rule1 ])
                 return rule2
             if not controller2.is_client():
-                controller2.get_service("macsec").renew(rule2)
+                self._send_rules(controller2, [ ], [ ], [ rule2 ])
                 return rule1
         raise Exception("One controller must be a client.")
 
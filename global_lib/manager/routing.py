@@ -1,23 +1,43 @@
 # common
 from common_lib.logger import Logger
 from common_lib.ipaddress import Network
-from common_lib.topology import Edge, Topology
+from common_lib.topology import Edge, Topology, ShortestPathTree
 from common_lib.routing import ForwardRule
-from common_lib.stub import LocalController, StubController
+from common_lib.stub import StubController
 
 # global
 from global_lib.manager import ControllerManager
+from global_lib.settings import Settings
 from global_lib.wan import WanController
 
 # other
-from typing import Set, List, Tuple, Dict
+from typing import Set, List, Tuple, Dict, Iterable, Optional, FrozenSet
 from uuid import UUID
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+
+# forward rules per call to a local controller, larger updates are streamed
+RULE_CHUNK_SIZE = 1024
+
+# next hop of a controller towards the owner of a tree: controller, mac, port
+Hop = Tuple[ UUID, str, int ]
 
 class RoutingManager:
+    """
+    Computes the forward rules of all local controllers towards the
+    subnets of the others. Every controller with subnets has a shortest
+    path tree which is shared by all of its subnets and updated
+    incrementally on topology changes. A controller gets a rule for
+    every neighbor on a shortest path (equal-cost multipath). Only the
+    rules which changed are written to the local controllers, all
+    controllers are updated concurrently. Rules count as installed once
+    their controller has confirmed them, a controller whose update failed
+    gets the whole difference with the next update.
+    """
 
     def __init__(self,
             logger: Logger,
+            settings: Settings,
             wan_controller: WanController,
             controller_manager: ControllerManager,
             topology: Topology
@@ -33,72 +53,194 @@ class RoutingManager:
         self._controller_manager.listen_remove_controller(self._remove_controller)
 
         self._controller_subnets = defaultdict(set) # type: defaultdict
-        self._forward_rules = set() # type: Set[ ForwardRule ]
-
-    def _update_routes(self) -> None:
-        rules = [ ] # type: List[ ForwardRule ]
-        for controller in self._controller_manager.get_local_controllers():
-            for subnet in self._controller_subnets[controller.get_id()]:
-                rules += self._get_forward_rules(controller, subnet)
-
-        # remove duplicates -> use this ugly method because python sets suck!!!!!
-        x = dict()
-        for rule in rules:
-            x[str(rule)] = rule
-        rules = [ ]
-        for key, rule in x.items():
-            rules.append(rule)
-
-        y = dict()
-        for rule in self._forward_rules:
-            y[str(rule)] = rule
-
-        # delete old rules
-        for key, rule in y.items():
-            if key not in x:
-                source = self._controller_manager.get_controller(rule.get_src())
-                try:
-                    source.get_service("routing").remove_forward_rule(rule)
-                except:
-                    self._logger.warn("Could not remove forwarding rule: " + str(rule))
-
-        # write new rules
-        for key, rule in x.items():
-            if key not in y:
-                source = self._controller_manager.get_controller(rule.get_src())
-                source.get_service("routing").new_forward_rule(rule)
-
-        self._forward_rules = set([ rule for key, rule in x.items() ])
-
-    def _get_path_forward_rules(self,
-            path: List[ UUID ],
-            subnet: Network
-        ) -> Set[ ForwardRule ]:
-        rules = set() # type: Set[ ForwardRule ]
-
-        for i in range(len(path) - 1):
-            source_id = path[i + 1]
-            target_id = path[i]
-            source = self._controller_manager.get_local_controller(source_id)
-            target = self._controller_manager.get_local_controller(target_id)
-            edge = self._topology.get_edge(source_id, target_id)
-            port = edge.get_port1() if edge.get_controller1() == source_id else edge.get_port2()
-            rules.add(ForwardRule(source_id, target_id, target.get_mac(), port, subnet))
-
-        return rules
-
-    def _get_forward_rules(self,
-            controller: LocalController,
-            subnet: Network
-        ) -> Set[ ForwardRule ]:
-        if self._topology.has_node(controller.get_id()):
-            paths = self._topology.shortest_paths_from(controller.get_id())
-            edges = set() # type: Set[ ForwardRule ]
-            for path in paths:
-                edges = edges.union(self._get_path_forward_rules(path, subnet))
-            return edges
-        else:
-            return set()
+
+        # shortest path tree and next hops towards every controller with subnets
+        self._trees = dict() # type: Dict[ UUID, ShortestPathTree ]
+        self._hops = dict() # type: Dict[ UUID, Dict[ UUID, FrozenSet[ Hop ] ] ]
+
+        # number of trees which need a rule, needed and installed rules by controller
+        self._rule_counts = dict() # type: Dict[ ForwardRule, int ]
+        self._needed = defaultdict(set) # type: defaultdict
+        self._installed = defaultdict(set) # type: defaultdict
+
+        # controllers whose last update has failed or timed out
+        self._retry = set() # type: Set[ UUID ]
+
+        # rules are sent to the controllers in parallel, the updates of
+        # one controller are sent in order
+        self._executor = ThreadPoolExecutor(max_workers=settings.get_routing_workers())
+        self._deadline = settings.get_routing_deadline()
+        self._updates = dict() # type: Dict[ UUID, Future ]
+
+    def _get_hop(self, node: UUID, parent: UUID) -> Hop:
+        edge = self._topology.get_edge(node, parent)
+        port = edge.get_port1() if edge.get_controller1() == node else edge.get_port2()
+        return (parent, self._controller_manager.get_local_controller(parent).get_mac(), port)
+
+    def _get_hops(self, tree: ShortestPathTree, node: UUID) -> FrozenSet[ Hop ]:
+        return frozenset(self._get_hop(node, neighbor) for neighbor in tree.get_next_hops(node))
+
+    def _count_rules(self,
+            node: UUID,
+            hop: Hop,
+            subnets: Iterable[ Network ],
+            amount: int,
+            delta: Dict[ ForwardRule, int ]
+        ) -> None:
+        """ Add amount to the number of trees which need the rules of a hop. """
+        parent, mac, port = hop
+        for subnet in subnets:
+            rule = ForwardRule(node, parent, mac, port, subnet)
+            delta[rule] = delta.get(rule, 0) + amount
+
+    def _update_hops(self,
+            owner: UUID,
+            nodes: Iterable[ UUID ],
+            delta: Dict[ ForwardRule, int ]
+        ) -> None:
+        """
+        Recompute the next hops of nodes in the tree of owner and of
+        their neighbors, whose next hops depend on the distances of the
+        nodes.
+        """
+        tree = self._trees[owner]
+        hops = self._hops[owner]
+        subnets = self._controller_subnets[owner]
+
+        affected = set(nodes)
+        for node in list(affected):
+            affected.update(self._topology.get_neighbors(node))
+
+        for node in affected:
+            old = hops.get(node, frozenset())
+            new = self._get_hops(tree, node)
+            if old == new:
+                continue
+
+            for hop in old - new:
+                self._count_rules(node, hop, subnets, -1, delta)
+            for hop in new - old:
+                self._count_rules(node, hop, subnets, 1, delta)
+
+            if len(new) > 0:
+                hops[node] = new
+            else:
+                del hops[node]
+
+    def _apply(self, delta: Dict[ ForwardRule, int ]) -> None:
+        """ Write the rules which are needed now and remove the ones which are not anymore. """
+        touched = defaultdict(list) # type: defaultdict
+        for rule, amount in delta.items():
+            count = self._rule_counts.get(rule, 0) + amount
+            if count > 0:
+                self._rule_counts[rule] = count
+                self._needed[rule.get_src()].add(rule)
+            else:
+                self._rule_counts.pop(rule, None)
+                self._needed[rule.get_src()].discard(rule)
+            touched[rule.get_src()].append(rule)
+
+        changes = dict() # type: Dict[ UUID, Tuple[ List[ ForwardRule ], List[ ForwardRule ] ] ]
+        for id_ in set(touched.keys()) | self._retry:
+            needed = self._needed[id_]
+            installed = self._installed[id_]
+            if id_ in self._retry:
+                # the controller may miss any of the earlier changes
+                changes[id_] = (list(installed - needed), list(needed - installed))
+            else:
+                # only rules whose count has changed can differ
+                changes[id_] = ([ rule for rule in touched[id_]
+                            if rule in installed and rule not in needed ],
+                        [ rule for rule in touched[id_]
+                            if rule in needed and rule not in installed ])
+
+        changes = dict((id_, (removed, added)) for id_, (removed, added) in changes.items()
+                if len(removed) + len(added) > 0 or id_ in self._retry)
+
+        self._logger.debug("Routing update: remove "
+                + str(sum(len(removed) for removed, added in changes.values())) + " rules, add "
+                + str(sum(len(added) for removed, added in changes.values())) + " rules", 3)
+        self._send(changes)
+
+    def _send_rules(self,
+            controller: StubController,
+            removed: List[ ForwardRule ],
+            added: List[ ForwardRule ],
+            previous: Optional[ Future ]
+        ) -> bool:
+        """
+        Send the rule changes of one controller, runs on the executor.
+        Returns whether the controller has applied them.
+        """
+        if previous is not None:
+            # an earlier update of the controller has not been sent completely
+            wait([ previous ])
+
+        try:
+            routing = controller.get_service("routing")
+            if len(removed) + len(added) <= RULE_CHUNK_SIZE:
+                routing.apply_forward_rules(added, removed)
+            else:
+                # large updates (e.g. of a new site) are streamed in chunks
+                chunks = [ ([ ], removed[i:i + RULE_CHUNK_SIZE])
+                        for i in range(0, len(removed), RULE_CHUNK_SIZE) ]
+                chunks += [ (added[i:i + RULE_CHUNK_SIZE], [ ])
+                        for i in range(0, len(added), RULE_CHUNK_SIZE) ]
+                routing.stream_forward_rules(chunks)
+            return True
+        except Exception as e:
+            self._logger.warn("Could not apply " + str(len(removed)) + " removed and "
+                    + str(len(added)) + " added forwarding rules on " + controller.get_name()
+                    + ": " + str(e))
+            return False
+
+    def _send(self, changes: Dict[ UUID, Tuple[ List[ ForwardRule ], List[ ForwardRule ] ] ]) -> None:
+        """
+        Send the changes of every controller concurrently and wait until
+        all controllers have them or the deadline has passed. The changes
+        of a controller are recorded once it has applied them, otherwise
+        it is retried with the next update.
+        """
+        futures = dict() # type: Dict[ UUID, Future ]
+        for id_, (removed, added) in changes.items():
+            if not self._controller_manager.has_controller(id_):
+                # removed in the meantime, its rules are gone with it and
+                # are sent again if it comes back while they are needed
+                self._installed.pop(id_, None)
+                if len(self._needed[id_]) > 0:
+                    self._retry.add(id_)
+                else:
+                    self._retry.discard(id_)
+                continue
+            controller = self._controller_manager.get_controller(id_)
+            future = self._executor.submit(self._send_rules, controller,
+                    removed, added, self._updates.get(id_))
+            self._updates[id_] = future
+            futures[id_] = future
+
+        done, not_done = wait(futures.values(), timeout=self._deadline)
+        if len(not_done) > 0:
+            self._logger.warn("Routing update not converged after " + str(self._deadline)
+                    + "s on " + str(len(not_done)) + " controllers")
+
+        for id_, future in futures.items():
+            if future in done and future.result():
+                removed, added = changes[id_]
+                self._installed[id_].difference_update(removed)
+                self._installed[id_].update(added)
+                self._retry.discard(id_)
+            else:
+                self._retry.add(id_)
+
+        self._updates = dict((id_, future) for id_, future in self._updates.items()
+                if not future.done())
+
+    def teardown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def get_forward_rules(self) -> Set[ ForwardRule ]:
+        """ Rules which the local controllers have confirmed. """
+        return set(rule for rules in self._installed.values() for rule in rules)
 
     def get_all_subnets(self) -> Set[ Network ]:
         return set(subnet for _id, subnets in self._controller_subnets.items()
@@ -106,8 +248,23 @@ class RoutingManager:
 
     def add_subnet_silent(self, controller_id: UUID, subnet: Network) -> None:
         self._logger.info("Add subnet: \"" + str(subnet) + "\" to " + str(controller_id))
+        if subnet in self._controller_subnets[controller_id]:
+            return
+
+        if controller_id not in self._trees:
+            tree = ShortestPathTree(self._topology, controller_id)
+            self._trees[controller_id] = tree
+            self._hops[controller_id] = dict((node, self._get_hops(tree, node))
+                    for node, parent in tree.get_parents().items() if parent is not None)
+
+        # the tree is shared by all subnets of the controller
+        delta = dict() # type: Dict[ ForwardRule, int ]
+        for node, hops in self._hops[controller_id].items():
+            for hop in hops:
+                self._count_rules(node, hop, [ subnet ], 1, delta)
+
         self._controller_subnets[controller_id].add(subnet)
-        self._update_routes()
+        self._apply(delta)
 
     def add_subnet(self, controller_id: UUID, subnet: Network) -> None:
         self.add_subnet_silent(controller_id, subnet)
@@ -118,7 +275,17 @@ class RoutingManager:
     def remove_subnet_silent(self, controller_id: UUID, subnet: Network) -> None:
         self._logger.info("Remove subnet: \"" + str(subnet) + "\" from " + str(controller_id))
         self._controller_subnets[controller_id].remove(subnet)
-        self._update_routes()
+
+        delta = dict() # type: Dict[ ForwardRule, int ]
+        for node, hops in self._hops[controller_id].items():
+            for hop in hops:
+                self._count_rules(node, hop, [ subnet ], -1, delta)
+
+        if len(self._controller_subnets[controller_id]) == 0:
+            del self._trees[controller_id]
+            del self._hops[controller_id]
+
+        self._apply(delta)
 
     def remove_subnet(self, controller_id: UUID, subnet: Network) -> None:
         self.remove_subnet_silent(controller_id, subnet)
@@ -127,10 +294,21 @@ class RoutingManager:
         self._wan_controller.get_service("routing").remove_subnet(subnet)
 
     def _new_connection(self, edge: Edge) -> None:
-        self._update_routes()
+        x, y = self._topology.get_edge_controllers(edge)
+        delta = dict() # type: Dict[ ForwardRule, int ]
+        for owner, tree in self._trees.items():
+            # the edge may replace the one x or y used with other ports
+            changed = set(tree.add_edge(x, y).keys()) | { x, y }
+            self._update_hops(owner, changed, delta)
+        self._apply(delta)
 
     def _remove_connection(self, edge: Edge) -> None:
-        self._update_routes()
+        x, y = self._topology.get_edge_controllers(edge)
+        delta = dict() # type: Dict[ ForwardRule, int ]
+        for owner, tree in self._trees.items():
+            changed = set(tree.remove_edge(x, y).keys()) | { x, y }
+            self._update_hops(owner, changed, delta)
+        self._apply(delta)
 
     def _remove_controller(self, controller: StubController) -> None:
         self._logger.debug("handle remove controller -> delete subnets")
@@ -19,3 +19,11 @@ class Settings(ControllerSettings):
 
     def get_site_address(self) -> Address:
         return ip_address(self.get_data("site-address"))
+
+    def get_routing_workers(self) -> int:
+        """ Number of local controllers which are sent forward rules at the same time. """
+        return int(self.get_data("routing_workers")) if self.has("routing_workers") else 16
+
+    def get_routing_deadline(self) -> float:
+        """ Seconds to wait for all local controllers to receive a routing update. """
+        return float(self.get_data("routing_deadline")) if self.has("routing_deadline") else 10
@@ -91,3 +91,13 @@ class Commands(Repl):
         self.get_port_authorizer().unauthorize(port, mac)
         supplicant.send_failure()
 
+
+    def do_list_packet_statistics(self, line: str) -> None:
+        admitted = self.controller.packet_admission.get_admitted()
+        dropped = self.controller.packet_admission.get_dropped()
+        self.list([ str(type_) + ": admitted " + str(admitted.get(type_, 0)) + \
+                ", dropped " + str(dropped.get(type_, 0))
+            for type_ in sorted(set(admitted.keys()) | set(dropped.keys())) ] + \
+            [ "dropped by dispatcher: " + str(self.controller.packet_dispatcher.get_dropped()) ] + \
+            [ "packet out " + name + ": " + str(value) for name, value in
+                sorted(self.controller.switch_connection.get_packet_out_statistics().items()) ])
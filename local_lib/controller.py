@@ -7,9 +7,10 @@ from local_lib.commands import Commands
 from local_lib.global_ import GlobalController
 from local_lib.interface import Interface
 
-from local_lib.packet import PacketProcessor
+from local_lib.packet import PacketProcessor, PacketDispatcher, Admission
 from local_lib.manager import TopologyManager, L2Manager, IpsecManager, \
-        MacsecManager, IpsecManager, RoutingManager, PortAuthorizer, Authenticator
+        MacsecManager, IpsecManager, RoutingManager, PortAuthorizer, Authenticator, \
+        FloodManager
 
 from local_lib.p4runtime_lib import SwitchConnection, PortMonitor
 
@@ -29,7 +30,7 @@ class Controller(BaseController):
 
         self.global_controller = GlobalController(self)
 
-        self.switch_connection = SwitchConnection(self.logger, self.settings)
+        self.switch_connection = SwitchConnection(self.logger, self.settings, self.metrics)
         self.port_monitor = PortMonitor(self.logger, self.event_system, \
                 self.settings.get_switch())
 
@@ -49,16 +50,27 @@ class Controller(BaseController):
         self.macsec_manager = MacsecManager(self.logger, self.settings, self.switch_connection,
                 self.port_authorizer, self.global_controller, self.event_system,
                 self.topology_manager)
+        self.flood_manager = FloodManager(self.logger, self.settings, self.switch_connection)
         self.l2_manager = L2Manager(self.logger, self.settings,
-                self.event_system, self.switch_connection)
-
+                self.switch_connection, self.flood_manager)
+
+        switch_settings = self.settings.get_switch()
+        self.packet_dispatcher = PacketDispatcher(self.logger,
+                switch_settings.get_packet_workers(), switch_settings.get_packet_queue_size())
+        self.packet_admission = Admission(
+                switch_settings.get_punt_rate(), switch_settings.get_punt_burst(),
+                switch_settings.get_punt_port_rate(), switch_settings.get_punt_port_burst())
         self.packet_processor = PacketProcessor(
             self.logger,
+            self.metrics,
+            self.packet_dispatcher,
+            self.packet_admission,
             self.topology_manager,
             self.l2_manager,
             self.authenticator,
             self.macsec_manager,
-            self.ipsec_manager
+            self.ipsec_manager,
+            by_flow=switch_settings.get_packet_dispatch() == "flow"
         )
 
         self.interface = Interface(self.event_system, self.logger, self.settings,
@@ -71,6 +83,7 @@ class Controller(BaseController):
         self.switch_connection.connect()
 
         self.port_authorizer.initialize()
+        self.flood_manager.initialize()
 
         # Register at global controller
         self.interface.start()
@@ -80,10 +93,15 @@ class Controller(BaseController):
         # to global controller is established, because it
         # will notify the global controller on a topology update
         self.topology_manager.start()
+        self.packet_dispatcher.start()
         self.packet_processor.listen(self.switch_connection)
         self.port_monitor.start()
         self.routing_manager.write_default_settings(self.settings)
 
+        reconcile_interval = self.settings.get_switch().get_reconcile_interval()
+        if reconcile_interval is not None:
+            self.event_system.set_interval(self.switch_connection.reconcile, reconcile_interval)
+
 
     def shutdown(self):
         self.port_monitor.stop()
@@ -94,4 +112,6 @@ class Controller(BaseController):
         self.interface.stop()
         self.topology_manager.teardown()
         self.port_authorizer.cleanup()
+        self.flood_manager.cleanup()
         self.switch_connection.disconnect()
+        self.packet_dispatcher.stop()
@@ -1 +1,3 @@
 from local_lib.exception.registration import RegistrationException
+from local_lib.exception.write import WriteException
+from local_lib.exception.arbitration import ArbitrationException
@@ -0,0 +1,8 @@
+class ArbitrationException(Exception):
+
+    def __init__(self, reason):
+        super().__init__()
+        self.reason = reason
+
+    def __str__(self):
+        return "Could not become master of the switch: " + str(self.reason)
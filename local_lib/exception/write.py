@@ -0,0 +1,9 @@
+class WriteException(Exception):
+
+    def __init__(self, reason, code=None):
+        super().__init__()
+        self.reason = reason
+        self.code = code
+
+    def __str__(self):
+        return "Could not write to switch: " + str(self.reason)
@@ -10,10 +10,13 @@ from local_lib.manager import MacsecManager
 
 # protobuf
 from macsec_pb2_grpc import add_MacsecServicer_to_server, MacsecServicer # type: ignore
-from macsec_pb2 import rule, address, bddp_key # type: ignore
+from macsec_pb2 import rule, rules, rule_errors, address, bddp_key # type: ignore
 from nothing_pb2 import nothing # type: ignore
 from grpc import ServicerContext # type: ignore
 
+# other
+from typing import Iterator
+
 class MacsecService(Service, MacsecServicer):
 
     def __init__(self, event_system: EventSystem, logger: Logger, macsec_manager: MacsecManager):
@@ -42,6 +45,28 @@ class MacsecService(Service, MacsecServicer):
         self._macsec_manager.renew(rule)
         return nothing()
 
+    @traceback("_logger")
+    @synchronize
+    def apply_macsec_rules(self, request: rules, context: ServicerContext) -> rule_errors:
+        errors = self._macsec_manager.apply(
+            [ Address.from_proto(address) for address in request.remove ],
+            [ Rule.from_proto(rule) for rule in request.add ],
+            [ Rule.from_proto(rule) for rule in request.renew ]
+        )
+        response = rule_errors()
+        for address, error in errors:
+            response.errors.add(address=address.to_proto(), message=str(error))
+        return response
+
+    @traceback("_logger")
+    def stream_macsec_rules(self, request_iterator: Iterator[ rules ], \
+            context: ServicerContext) -> rule_errors:
+        # every message is applied on its own, the lock is not held while waiting for the next
+        response = rule_errors()
+        for request in request_iterator:
+            response.errors.extend(self.apply_macsec_rules(request, context).errors)
+        return response
+
     @traceback("_logger")
     @synchronize
     def request_connection(self, request: address, context: ServicerContext) -> rule:
@@ -11,9 +11,12 @@ from local_lib.manager import RoutingManager
 # protobuf / grpc
 from routing_pb2_grpc import LocalRoutingServicer, add_LocalRoutingServicer_to_server # type: ignore
 from nothing_pb2 import nothing # type: ignore
-from routing_pb2 import forward_rule # type: ignore
+from routing_pb2 import forward_rule, forward_rules # type: ignore
 from grpc import ServicerContext # type: ignore
 
+# other
+from typing import Iterator
+
 class RoutingService(Service, LocalRoutingServicer):
 
     def __init__(self,
@@ -39,3 +42,19 @@ class RoutingService(Service, LocalRoutingServicer):
         rule = ForwardRule.from_proto(request)
         self._routing_manager.remove_forward_rule(rule)
         return nothing()
+
+    @traceback("_logger")
+    @synchronize
+    def apply_forward_rules(self, request: forward_rules, context: ServicerContext) -> nothing:
+        added = [ ForwardRule.from_proto(rule) for rule in request.add ]
+        removed = [ ForwardRule.from_proto(rule) for rule in request.remove ]
+        self._routing_manager.apply_forward_rules(added, removed)
+        return nothing()
+
+    @traceback("_logger")
+    def stream_forward_rules(self, request_iterator: Iterator[ forward_rules ], \
+            context: ServicerContext) -> nothing:
+        # every message is applied on its own, the lock is not held while waiting for the next
+        for request in request_iterator:
+            self.apply_forward_rules(request, context)
+        return nothing()
@@ -1,3 +1,4 @@
+from local_lib.manager.flood import FloodManager
 from local_lib.manager.l2 import L2Manager
 from local_lib.manager.topology import TopologyManager
 from local_lib.manager.routing import RoutingManager
@@ -0,0 +1,92 @@
+# common
+from common_lib.logger import Logger
+
+# local
+from local_lib.packet.fast import REASON_FLOOD, pack_cpu_header
+from local_lib.p4runtime_lib import SwitchConnection
+from local_lib.settings import Settings
+
+# other
+from typing import Dict, List
+
+class FloodManager:
+    """
+    Floods broadcast and unknown unicast frames in the data plane.
+    Every port has a multicast group with all other ports, the switch
+    selects the group by the ingress port of the frame. The replicas are
+    recirculated, such that MACsec and the port authorization still
+    apply to every egress port.
+    """
+
+    def __init__(self,
+            logger: Logger,
+            settings: Settings,
+            switch_connection: SwitchConnection
+        ) -> None:
+        self._logger = logger
+        self._settings = settings
+        self._switch_connection = switch_connection
+
+        self._enabled = settings.get_switch().get_flood_offload()
+
+        # ports of the multicast group by ingress port (= group id)
+        self._groups = dict() # type: Dict[ int, List[ int ] ]
+
+        if self._enabled:
+            helper = self._switch_connection.helper
+            self._flood_group_entry = helper.compileTableEntry(
+                    "ingress.ethernet.forward.flood_groups",
+                    [ "standard_metadata.ingress_port" ],
+                    "ingress.ethernet.forward.flood_group", [ "group" ])
+            self._flood_group_key = helper.compileTableEntry(
+                    "ingress.ethernet.forward.flood_groups",
+                    [ "standard_metadata.ingress_port" ])
+
+    def _get_ports(self) -> List[ int ]:
+        return list(range(1, self._switch_connection.get_num_ports()))
+
+    def has_group(self, port: int) -> bool:
+        return port in self._groups
+
+    def initialize(self) -> None:
+        if not self._enabled:
+            return
+
+        self._logger.debug("Writing flood groups", 3)
+        ports = self._get_ports()
+        groups = dict((port, [ other for other in ports if other != port ]) for port in ports)
+
+        # groups must exist before they are referenced
+        with self._switch_connection.batch():
+            for group, replicas in groups.items():
+                self._switch_connection.write_multicast_group(group, replicas)
+
+        with self._switch_connection.batch():
+            for port in groups.keys():
+                self._switch_connection.write_table_entry(
+                        self._flood_group_entry.build([ port ], [ port ]))
+
+        self._groups = groups
+
+    def cleanup(self) -> None:
+        groups = self._groups
+        self._groups = dict()
+
+        with self._switch_connection.batch():
+            for port in groups.keys():
+                self._switch_connection.delete_table_entry(self._flood_group_key.build([ port ]))
+
+        with self._switch_connection.batch():
+            for group in groups.keys():
+                self._switch_connection.delete_multicast_group(group)
+
+    def flood(self, port: int, ethernet: bytes) -> None:
+        """
+        Flood an ethernet frame received on a port.
+        The frame is handed to the switch once if the port has a flood
+        group, otherwise it is sent out on every other port.
+        """
+        if self.has_group(port):
+            self._switch_connection.send_packet_out(pack_cpu_header(REASON_FLOOD, port) + ethernet)
+        else:
+            self._switch_connection.flood(ethernet, exclude=port)
@@ -10,7 +10,7 @@ from local_lib.packet.cpu import CPUPacket, Notification, Config
 from local_lib.global_ import GlobalController
 
 # other
-from typing import Set, Optional
+from typing import Set, Optional, Tuple
 import traceback
 
 class RegisterManager:
@@ -62,7 +62,7 @@ class IpsecManager:
         src_address = str(source.get_address())
         dst_address = str(destination.get_address())
 
-        self._switch_connection.write(
+        self._switch_connection.upsert(
             table_name="ingress.ethernet.ipv4.ipsec.decrypt",
             match_fields={
                 "hdr.ipv4.srcAddr": src_address,
@@ -93,7 +93,7 @@ class IpsecManager:
                 .format(src=src_address, dst=dst_address))
 
         for subnet in destination.get_subnets():
-            self._switch_connection.write(
+            self._switch_connection.upsert(
                 table_name="ingress.ethernet.ipv4.ipsec.encrypt",
                 match_fields={
                     "hdr.ipv4.dstAddr": (str(subnet.network_address), subnet.prefixlen)
@@ -110,40 +110,61 @@ class IpsecManager:
                     "hard_packet_limit": hard_packet_limit
                 })
 
-    def new(self, tunnel: Tunnel) -> None:
-        self._logger.info("Create new tunnel: " + str(tunnel))
-
+    def _get_local_side(self, tunnel: Tunnel) \
+            -> Optional[ Tuple[ Endpoint, Endpoint, Connection, Connection ] ]:
+        """
+        Get the local and the remote endpoint of a tunnel together with the
+        outgoing and the incoming connection or None if it does not end here.
+        """
+        if str(tunnel.get_endpoint1().get_address()) == str(self.get_ip()):
+            return tunnel.get_endpoint1(), tunnel.get_endpoint2(), \
+                    tunnel.get_connection_1_to_2(), tunnel.get_connection_2_to_1()
+        elif str(tunnel.get_endpoint2().get_address()) == str(self.get_ip()):
+            return tunnel.get_endpoint2(), tunnel.get_endpoint1(), \
+                    tunnel.get_connection_2_to_1(), tunnel.get_connection_1_to_2()
+        return None
+
+    def _get_tunnel(self, tunnel: Tunnel) -> Tunnel:
+        """ Get the installed version of a tunnel. """
+        return next(installed for installed in self._tunnels if installed == tunnel)
+
+    def _assign_registers(self, tunnel: Tunnel) -> Tuple[ int, int ]:
         register1 = self.register_manager.get_register()
         register2 = self.register_manager.get_register()
 
         self.register_tunnel[register1] = tunnel
         self.register_tunnel[register2] = tunnel
 
+        return register1, register2
+
+    def _write_tunnel(self, tunnel: Tunnel, register1: int, register2: int) -> None:
+        side = self._get_local_side(tunnel)
+        if side is None:
+            self._logger.info("ignore tunnel")
+            return
+
+        local, remote, outgoing, incoming = side
+        self._write_encrypt(local, remote, outgoing, register1,
+                tunnel.get_soft_packet_limit(), tunnel.get_hard_packet_limit())
+        self._write_decrypt(remote, local, incoming, register2)
+
+    def new(self, tunnel: Tunnel) -> None:
+        self._logger.info("Create new tunnel: " + str(tunnel))
+
+        register1, register2 = self._assign_registers(tunnel)
+
         if tunnel in self._tunnels:
             self._logger.warn("Tunnel already exists.")
             return
 
         try:
-            if str(tunnel.get_endpoint1().get_address()) == str(self.get_ip()):
-                self._write_encrypt(tunnel.get_endpoint1(), tunnel.get_endpoint2(),
-                        tunnel.get_connection_1_to_2(), register1,
-                        tunnel.get_soft_packet_limit(), tunnel.get_hard_packet_limit())
-                self._write_decrypt(tunnel.get_endpoint2(), tunnel.get_endpoint1(),
-                        tunnel.get_connection_2_to_1(), register2)
-            elif str(tunnel.get_endpoint2().get_address())== str(self.get_ip()):
-                self._write_encrypt(tunnel.get_endpoint2(), tunnel.get_endpoint1(),
-                        tunnel.get_connection_2_to_1(), register1,
-                        tunnel.get_soft_packet_limit(), tunnel.get_hard_packet_limit())
-                self._write_decrypt(tunnel.get_endpoint1(), tunnel.get_endpoint2(),
-                        tunnel.get_connection_1_to_2(), register2)
-            else:
-                self._logger.info("ignore tunnel")
+            with self._switch_connection.batch():
+                self._write_tunnel(tunnel, register1, register2)
 
             self._tunnels.add(tunnel)
         except:
             self._logger.error("Could not create ipsec connection.")
 
-
     def _delete_encrypt(self, destination: Endpoint) -> None:
         for subnet in destination.get_subnets():
             self._logger.debug("Delete encryption rule for " + str(subnet))
@@ -180,14 +201,13 @@ class IpsecManager:
             return
 
         try:
-            if str(tunnel.get_endpoint1().get_address()) == str(self.get_ip()):
-                self._delete_encrypt(tunnel.get_endpoint2())
-                self._delete_decrypt(tunnel.get_endpoint2(), tunnel.get_endpoint1(),
-                        tunnel.get_connection_2_to_1())
-            elif str(tunnel.get_endpoint2().get_address())== str(self.get_ip()):
-                self._delete_encrypt(tunnel.get_endpoint1())
-                self._delete_decrypt(tunnel.get_endpoint1(), tunnel.get_endpoint2(),
-                        tunnel.get_connection_1_to_2())
+            # the installed tunnel knows the spi of the installed rules
+            side = self._get_local_side(self._get_tunnel(tunnel))
+            if side is not None:
+                local, remote, outgoing, incoming = side
+                with self._switch_connection.batch():
+                    self._delete_encrypt(remote)
+                    self._delete_decrypt(remote, local, incoming)
 
             self._tunnels.remove(tunnel)
         except Exception as e:
@@ -195,10 +215,40 @@ class IpsecManager:
             # TODO exception
 
     def renew(self, tunnel: Tunnel) -> None:
+        """
+        Replace the keys of a tunnel. Encryption rules are modified in place,
+        decryption rules of a changed spi are replaced after the new one is
+        installed, such that no packet hits a missing rule.
+        """
         self._logger.debug("Renew connection: " + str(tunnel))
 
-        self.remove(tunnel)
-        self.new(tunnel)
+        if tunnel not in self._tunnels:
+            self.new(tunnel)
+            return
+
+        old_side = self._get_local_side(self._get_tunnel(tunnel))
+        side = self._get_local_side(tunnel)
+        if side is None or old_side is None:
+            self.remove(tunnel)
+            self.new(tunnel)
+            return
+
+        register1, register2 = self._assign_registers(tunnel)
+
+        try:
+            # the switch may apply the updates of one write in any order,
+            # thus the old decryption rule is deleted in a separate write
+            with self._switch_connection.batch():
+                self._write_tunnel(tunnel, register1, register2)
+
+            self._tunnels.remove(tunnel)
+            self._tunnels.add(tunnel)
+
+            local, remote, outgoing, incoming = old_side
+            if incoming.get_spi() != side[3].get_spi():
+                self._delete_decrypt(remote, local, incoming)
+        except Exception as e:
+            self._logger.error("Could not renew ipsec connection: " + str(e))
 
 
     def handle_notification(self, cpu: CPUPacket) -> None:
@@ -1,17 +1,19 @@
 # common
 from common_lib.logger import Logger
-from common_lib.event import EventSystem
 
 # local
-from local_lib.packet.cpu import CPUPacket, Notification
-from local_lib.p4runtime_lib import SwitchConnection
+from local_lib.packet.cpu import CPUPacket
+from local_lib.packet.fast import FastPacket, NOTIFICATION_TYPES, REASON_SEND, pack_cpu_header
+from local_lib.p4runtime_lib import SwitchConnection, PendingUpdate
+from local_lib.p4runtime_lib.convert import decodeMac
+from local_lib.manager.flood import FloodManager
 from local_lib.settings import Settings
 
 # other
 from time import time
-from copy import copy
-from typing import Dict, List
-from datetime import datetime, timedelta
+from threading import RLock
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime
 from scapy.all import ARP, Ether # type: ignore
 
 
@@ -43,29 +45,55 @@ class L2Entry:
                 ", Timestamp: " + str(datetime.fromtimestamp(self.get_timestamp()))
 
 class L2Manager:
+
+    # notifications which trigger learning of the source mac
+    LEARN_TYPES = frozenset([
+        NOTIFICATION_TYPES["SRC_MAC_UNKNOWN"],
+        NOTIFICATION_TYPES["CHANGED_L2_ENTRY"]
+    ])
+
     def __init__(self,
             logger: Logger,
             settings: Settings,
-            event_system: EventSystem,
-            switch_connection: SwitchConnection
+            switch_connection: SwitchConnection,
+            flood_manager: FloodManager
         ) -> None:
         # utils
         self._logger = logger
         self._settings = settings
         self._switch_connection = switch_connection
+        self._flood_manager = flood_manager
 
         # attributes
         self._mapping = { } # type: Dict[ str, L2Entry ]
         self._l2_mapping_timeout = 40 #s
         self._gateway_mac_set = False
 
-        event_system.set_interval(self._remove_old_macs, self._l2_mapping_timeout)
+        # packets in may be handled on several workers
+        self._lock = RLock()
+
+        # (mac, port) pairs whose entries are being written to the switch
+        self._learning = set() # type: Set[ Tuple[ str, int ] ]
+
+        # templates of the entries which are written on every learned mac
+        helper = self._switch_connection.helper
+        self._mac_dst_entry = helper.compileTableEntry("ingress.ethernet.forward.mac_dst",
+                [ "hdr.ethernet.dstAddr" ], "ingress.ethernet.forward.forward", [ "port" ])
+        self._mac_dst_key = helper.compileTableEntry("ingress.ethernet.forward.mac_dst",
+                [ "hdr.ethernet.dstAddr" ])
+        self._mac_src_entry = helper.compileTableEntry("ingress.ethernet.learn.mac_src",
+                [ "hdr.ethernet.srcAddr" ], "ingress.ethernet.learn.src_known",
+                [ "port" ])
+        self._mac_src_key = helper.compileTableEntry("ingress.ethernet.learn.mac_src",
+                [ "hdr.ethernet.srcAddr" ])
 
     def _set_entry(self, entry):
-        self._mapping[entry.get_mac()] = entry
+        with self._lock:
+            self._mapping[entry.get_mac()] = entry
 
     def _delete_entry(self, entry):
-        del self._mapping[entry.get_mac()]
+        with self._lock:
+            del self._mapping[entry.get_mac()]
 
     def _has_entry(self, mac_address):
         return mac_address in self._mapping
@@ -73,105 +101,130 @@ class L2Manager:
     def _get_entry(self, mac_address):
         return self._mapping[mac_address]
 
-    def _write_l2_entry(self, entry):
+    def _track(self, pending: PendingUpdate, entry: L2Entry) -> PendingUpdate:
+        """ Log failed writes of an l2 entry without blocking the caller. """
+        def check(pending: PendingUpdate) -> None:
+            if pending.get_error() is not None:
+                self._logger.warn("Could not write l2 entry (" + str(entry) + "): "
+                        + str(pending.get_error()))
+
+        pending.add_done_callback(check)
+        return pending
+
+    def _write_l2_entry(self, entry) -> List[ PendingUpdate ]:
         self._logger.debug("writing l2 entry (" + str(entry) + ")", 4)
         self._set_entry(entry)
-        self._switch_connection.write( \
-            table_name="ingress.ethernet.forward.mac_dst", \
-            match_fields={ "hdr.ethernet.dstAddr": entry.get_mac() }, \
-            action_name="ingress.ethernet.forward.forward", \
-            action_params={ "port": entry.get_port() } \
-        )
-
-        self._switch_connection.write(
-            table_name="ingress.ethernet.learn.mac_src", \
-            match_fields={ "hdr.ethernet.srcAddr": entry.get_mac() }, \
-            action_name="ingress.ethernet.learn.src_known",
-            action_params={ \
-                "port": entry.get_port(),
-                "refresh_time": int(datetime.timestamp(datetime.now() + timedelta(seconds=self._l2_mapping_timeout / 2)))
-            } \
-        )
+        dst = self._track(self._switch_connection.upsert_table_entry(self._mac_dst_entry.build(
+            [ entry.get_mac() ],
+            [ entry.get_port() ]
+        ), wait=False), entry)
+
+        # the switch notifies us once the source has not been seen for the timeout
+        src_entry = self._mac_src_entry.build([ entry.get_mac() ], [ entry.get_port() ])
+        src_entry.idle_timeout_ns = self._l2_mapping_timeout * 10**9
+        src = self._track(self._switch_connection.upsert_table_entry(src_entry, wait=False), entry)
+
+        return [ dst, src ]
 
     def _delete_l2_entry(self, entry):
         self._logger.debug("deleting l2 entry (" + str(entry) + ")", 4)
         self._delete_entry(entry)
-        self._switch_connection.delete( \
-            table_name="ingress.ethernet.forward.mac_dst", \
-            match_fields={ "hdr.ethernet.dstAddr": entry.get_mac() } \
-        )
+        self._track(self._switch_connection.delete_table_entry(
+            self._mac_dst_key.build([ entry.get_mac() ]), wait=False), entry)
+        self._track(self._switch_connection.delete_table_entry(
+            self._mac_src_key.build([ entry.get_mac() ]), wait=False), entry)
 
-        self._switch_connection.delete( \
-            table_name="ingress.ethernet.learn.mac_src", \
-            match_fields={ "hdr.ethernet.srcAddr": entry.get_mac() } \
-        )
-
-    def _update_l2_entry(self, entry):
+    def _update_l2_entry(self, entry) -> List[ PendingUpdate ]:
         """
         update an l2 entry, thus save it in software and write to switch.
         entry: L2Entry
         """
         self._logger.debug("update entry (" + str(entry) + ")")
-        # delete old entries -> prevent errors by p4
-        if self._has_entry(entry.get_mac()):
-            self._delete_l2_entry(entry)
-        self._write_l2_entry(entry)
+        with self._switch_connection.batch():
+            return self._write_l2_entry(entry)
 
-    def learn_source(self, packet):
+    def _learn(self, entry: L2Entry) -> None:
+        """
+        Write a learned entry unless the same mac and port is being written
+        already, duplicate notifications of a burst are thus collapsed.
+        """
+        key = (entry.get_mac(), entry.get_port())
+        with self._lock:
+            if key in self._learning:
+                self._logger.debug("learning of " + str(key) + " pending", 4)
+                return
+            self._learning.add(key)
+
+        try:
+            pendings = self._update_l2_entry(entry)
+        except:
+            with self._lock:
+                self._learning.discard(key)
+            raise
+
+        remaining = [ len(pendings) ]
+        def done(pending: PendingUpdate) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    self._learning.discard(key)
+
+        for pending in pendings:
+            pending.add_done_callback(done)
+
+    def learn_source(self, packet: FastPacket) -> None:
         """
         Learn a source mac address.
-        packet: CPUPacket
+        packet: FastPacket
         """
-        ethernet = packet["Ether"]
+        src = packet.get_src()
         self._logger.debug("Learn new mac address {mac} on port {port}"
-                .format(mac=ethernet.src, port=packet.port))
-        if ethernet.src.lower() == self._settings.get_mac().lower():
-            if not self._gateway_mac_set:
+                .format(mac=src, port=packet.port))
+        if src == self._settings.get_mac().lower():
+            with self._lock:
+                if self._gateway_mac_set:
+                    return
+                self._gateway_mac_set = True
+
+            try:
                 self._switch_connection.write(
                     table_name="ingress.ethernet.learn.mac_src", \
-                    match_fields={ "hdr.ethernet.srcAddr": ethernet.src }, \
+                    match_fields={ "hdr.ethernet.srcAddr": src }, \
                     action_name="ingress.ethernet.learn.ignore_source"
                 )
-                self._gateway_mac_set = True
+            except:
+                with self._lock:
+                    self._gateway_mac_set = False
+                raise
         else:
-            self._update_l2_entry(L2Entry(ethernet.src, packet.port, int(time())))
+            self._learn(L2Entry(src, packet.port, int(time())))
 
-    def _flood_packet(self, packet: CPUPacket) -> None:
+    def _flood_packet(self, packet: FastPacket) -> None:
         """
         Flood packet to all ports except the ingress port.
-        packet: CPUPacket
+        Only used if the switch could not flood it itself.
+        packet: FastPacket
         """
-        packets = [] # type: List[ bytes ]
-        for i in range(1, self._switch_connection.get_num_ports()):
-            if i != packet.port:
-                self._logger.debug("flooding, port " + str(i), 4)
-                cpu = CPUPacket(reason="SEND_DIRECT", port=i)
-                packets += [ bytes(cpu / copy(packet["Ether"])) ]
-
-        self._switch_connection.send_packets_out(packets)
+        self._logger.debug("flooding from port " + str(packet.port), 4)
+        self._switch_connection.flood(packet.get_ethernet(), exclude=packet.port)
 
-    def process_packet(self, packet):
+    def process_packet(self, packet: FastPacket) -> None:
         """
         process packet
-        packet: CPUPacket
+        packet: FastPacket
         """
 
         type = packet.type
 
-        if type == Notification(type="SRC_MAC_UNKNOWN").type \
-                or type == Notification(type="REFRESH_L2_ENTRY").type \
-                or type == Notification(type="CHANGED_L2_ENTRY").type:
+        if type in L2Manager.LEARN_TYPES:
             self.learn_source(packet)
-            cpu = CPUPacket(
-                reason="SEND",
-                port=packet.port
-            )
-            self._switch_connection.send_packet_out(bytes(cpu / packet["Ether"]))
-        elif type == Notification(type="DST_MAC_UNKNOWN").type:
+            self._switch_connection.send_packet_out(
+                    pack_cpu_header(REASON_SEND, packet.port) + packet.get_ethernet())
+        elif type == NOTIFICATION_TYPES["DST_MAC_UNKNOWN"]:
             self._logger.debug("destination mac {mac} unknown"
-                    .format(mac=packet["Ether"].dst))
+                    .format(mac=packet.get_dst()))
             self._flood_packet(packet)
-        elif type == Notification(type="ARP").type:
+        elif type == NOTIFICATION_TYPES["ARP"]:
             arp = packet["ARP"]
             if arp.pdst == self._settings.get_gateway():
                 reply = ARP(op="is-at", hwsrc=self._settings.get_mac(),
@@ -182,16 +235,41 @@ class L2Manager:
                     reason="SEND_DIRECT",
                     port=packet.port,
                 )
-                cpu.payload = Ether(src=self._settings.get_mac(), dst=packet["Ether"].src) / reply
+                cpu.payload = Ether(src=self._settings.get_mac(), dst=packet.get_src()) / reply
                 self._switch_connection.send_packet_out(bytes(cpu))
             else:
-                self._flood_packet(packet)
+                self._flood_manager.flood(packet.port, packet.get_ethernet())
 
-    def _remove_old_macs(self) -> None:
-        self._logger.debug("Remove old l2 entries.")
-        old_entries = [ entry for mac, entry in self._mapping.items()
-            if datetime.fromtimestamp(entry.get_timestamp()) \
-                    + timedelta(seconds=self._l2_mapping_timeout) < datetime.now() ]
+    def _get_idle_mac(self, table_entry) -> Optional[ str ]:
+        if table_entry.table_id != self._mac_src_key.get_table_id():
+            return None
 
-        for entry in old_entries:
-            self._delete_l2_entry(entry)
+        # values may be sent without leading zeros
+        return decodeMac(table_entry.match[0].exact.value.rjust(6, b"\0"))
+
+    def get_idle_source(self, table_entry) -> Optional[ Tuple[ int, str ] ]:
+        """ Port and mac of the learned source an idle timeout refers to, None if unknown. """
+        mac = self._get_idle_mac(table_entry)
+        with self._lock:
+            if mac is None or not self._has_entry(mac):
+                return None
+            return (self._get_entry(mac).get_port(), mac)
+
+    def handle_idle_timeout(self, table_entries: List) -> None:
+        """
+        Remove the l2 entries of sources which the switch reported as idle.
+        table_entries: entries of the idle timeout notification
+        """
+        with self._lock, self._switch_connection.batch():
+            for table_entry in table_entries:
+                mac = self._get_idle_mac(table_entry)
+                if mac is None or not self._has_entry(mac):
+                    continue
+
+                entry = self._get_entry(mac)
+                if (mac, entry.get_port()) in self._learning:
+                    # relearned while the notification was on its way
+                    continue
+
+                self._logger.debug("l2 entry timed out (" + str(entry) + ")", 4)
+                self._delete_l2_entry(entry)
@@ -6,13 +6,13 @@ from common_lib.event import EventSystem, Task
 # local
 from local_lib.manager.port_authorizer import PortAuthorizer
 from local_lib.manager.topology import TopologyManager
-from local_lib.p4runtime_lib import SwitchConnection
+from local_lib.p4runtime_lib import SwitchConnection, PendingUpdate
 from local_lib.packet import CPUPacket, Config, Notification
 from local_lib.global_ import GlobalController
 from local_lib.settings import Settings
 
 # other
-from typing import Dict, Set
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 import traceback
 from time import sleep
 from datetime import datetime, timedelta
@@ -49,6 +49,20 @@ class MacsecManager:
         self._soft_time_limit_timeouts = dict() # type: Dict[ str, Task ]
         self._key_state = dict() # type: Dict[ str, int ]
 
+        helper = self._switch_connection.helper
+        self._protect_entry = helper.compileTableEntry("ingress.ethernet.macsec_protect.targets",
+                [ "standard_metadata.egress_spec" ],
+                "ingress.ethernet.macsec_protect.protect_packet",
+                [ "key1", "key2", "system_id", "register_index" ])
+        self._protect_key = helper.compileTableEntry("ingress.ethernet.macsec_protect.targets",
+                [ "standard_metadata.egress_spec" ])
+        self._validate_entry = helper.compileTableEntry("ingress.ethernet.macsec_validate.sources",
+                [ "standard_metadata.ingress_port" ],
+                "ingress.ethernet.macsec_validate.validate_packet",
+                [ "key1", "key2", "register_index" ])
+        self._validate_key = helper.compileTableEntry("ingress.ethernet.macsec_validate.sources",
+                [ "standard_metadata.ingress_port" ])
+
     def _get_register(self) -> int:
         return self._unused_registers.pop()
 
@@ -93,94 +107,98 @@ class MacsecManager:
         )
         self._soft_time_limit_timeouts[str(rule.get_protect().get_address())] = task
 
+    def _write_add(self, rule: Rule) -> int:
+        """ Prepare the register of a new rule and write its entries. """
+        #protect rule
+        protect = rule.get_protect()
+        register = self._get_register()
+        self._registers[str(protect.get_address())] = register
+
+        self._reset_counter(register)
+        self._set_soft_packet_limit(register, rule.get_soft_packet_limit());
+        self._set_hard_packet_limit(register, rule.get_hard_packet_limit());
+        self._set_soft_time_limit(rule)
+
+        self._switch_connection.write_table_entry(self._protect_entry.build(
+            [ protect.get_address().get_port() ],
+            [
+                protect.get_key(),
+                urandom(16), #simulate old key
+                self._settings.get_mac(),
+                register
+            ]
+        ))
+
+        #validate rule
+        validate = rule.get_validate()
+        self._switch_connection.write_table_entry(self._validate_entry.build(
+            [ validate.get_address().get_port() ],
+            [
+                validate.get_key(),
+                urandom(16), #simulate old key
+                register
+            ]
+        ))
+        self._port_authorizer.force_authorization(protect.get_address().get_port())
+
+        return register
+
+    def _added(self, rule: Rule, register: int) -> None:
+        self._rules[str(rule.get_protect().get_address())] = rule
+        self._register_to_rules[register] = rule
+        self._key_state[str(rule.get_protect().get_address())] = MacsecManager.KeyState.KEY1
+
+    def _add_failed(self, rule: Rule, stop: bool) -> None:
+        self._logger.error("Could not write macsec: " + str(rule))
+        self.remove(rule.get_protect().get_address())
+        # implicit -> self.remove(rule.get_validate().get_address())
+        # retry
+        if not stop:
+            self.add(rule, stop=True)
+
     def add(self, rule: Rule, stop=False) -> None:
         try:
             self._logger.info("add MACsec rule: " + str(rule))
 
-            #protect rule
-            protect = rule.get_protect()
-            register = self._get_register()
-            self._registers[str(protect.get_address())] = register
-
-            self._reset_counter(register)
-            self._set_soft_packet_limit(register, rule.get_soft_packet_limit());
-            self._set_hard_packet_limit(register, rule.get_hard_packet_limit());
-            self._set_soft_time_limit(rule)
-
-            self._switch_connection.write(
-                table_name="ingress.ethernet.macsec_protect.targets",
-                match_fields={
-                    "standard_metadata.egress_spec": protect.get_address().get_port()
-                },
-                action_name="ingress.ethernet.macsec_protect.protect_packet",
-                action_params={
-                    "key1": protect.get_key(),
-                    "key2": urandom(16), #simulate old key
-                    "system_id": self._settings.get_mac(),
-                    "register_index": register
-                }
-            )
-
-            #validate rule
-            validate = rule.get_validate()
-            self._switch_connection.write(
-                table_name="ingress.ethernet.macsec_validate.sources",
-                match_fields={
-                    "standard_metadata.ingress_port": validate.get_address().get_port()
-                },
-                action_name="ingress.ethernet.macsec_validate.validate_packet",
-                action_params={
-                    "key1": validate.get_key(),
-                    "key2": urandom(16), #simulate old key
-                    "register_index": register
-                }
-            )
-            self._port_authorizer.force_authorization(protect.get_address().get_port())
-            self._rules[str(rule.get_protect().get_address())] = rule
-            self._register_to_rules[register] = rule
-            self._key_state[str(rule.get_protect().get_address())] = MacsecManager.KeyState.KEY1
+            with self._switch_connection.batch():
+                register = self._write_add(rule)
+
+            self._added(rule, register)
         except:
-            self._logger.error("Could not write macsec: " + str(rule))
-            self.remove(rule.get_protect().get_address())
-            # implicit -> self.remove(rule.get_validate().get_address())
-            # retry
-            if not stop:
-                self.add(rule, stop=True)
+            self._add_failed(rule, stop)
 
+    def _write_remove(self, address: Address) -> None:
+        self._port_authorizer.unforce_authorization(address.get_port())
+
+        self._switch_connection.delete_table_entry(
+                self._protect_key.build([ address.get_port() ]))
+        self._switch_connection.delete_table_entry(
+                self._validate_key.build([ address.get_port() ]))
+
+    def _removed(self, address: Address) -> None:
+        del self._register_to_rules[self._registers[str(address)]]
+        self._return_register(self._registers[str(address)])
+        del self._rules[str(address)]
+        del self._key_state[str(address)]
+
+        task = self._soft_time_limit_timeouts.pop(str(address), None)
+        if task is not None:
+            task.cancel()
 
     def remove(self, address: Address) -> None:
         try:
             self._logger.info("remove MACsec rule: " + str(address))
 
-            self._port_authorizer.unforce_authorization(address.get_port())
-
-            self._switch_connection.delete("ingress.ethernet.macsec_protect.targets",
-                match_fields={
-                    "standard_metadata.egress_spec": address.get_port()
-                }
-            )
-            self._switch_connection.delete("ingress.ethernet.macsec_validate.sources",
-                match_fields={
-                    "standard_metadata.ingress_port": address.get_port()
-                }
-            )
-            del self._register_to_rules[self._registers[str(address)]]
-            self._return_register(self._registers[str(address)])
-            del self._rules[str(address)]
-            del self._key_state[str(address)]
-            #TODO del self._soft_time_limit_timeouts[str(address)]
+            with self._switch_connection.batch():
+                self._write_remove(address)
+
+            self._removed(address)
         except Exception as e:
             print(e)
             self._logger.error("Could not remove macsec: " + str(address))
 
-    def renew(self, rule: Rule) -> None:
-        self._logger.info("Renew MACsec rule: " + str(rule))
-
-        # update timelimit
-        if str(rule.get_protect().get_address()) in self._soft_time_limit_timeouts:
-            task = self._soft_time_limit_timeouts[str(rule.get_protect().get_address())]
-            task.set_ready(datetime.timestamp(rule.get_soft_time_limit()))
-
+    def _write_renew(self, rule: Rule) -> int:
+        """ Write the new keys of a rule next to the old ones, returns the new key state. """
         protect = rule.get_protect()
         register = self._registers[str(protect.get_address())]
         old_rule = self._rules[str(protect.get_address())]
@@ -189,25 +207,15 @@ class MacsecManager:
         key_state = self._key_state[str(rule.get_protect().get_address())]
         key_state = MacsecManager.KeyState.KEY1 if key_state is MacsecManager.KeyState.KEY2 \
             else MacsecManager.KeyState.KEY2
-        self._key_state[str(rule.get_protect().get_address())] = key_state
 
         key1 = protect.get_key() if key_state is MacsecManager.KeyState.KEY1 else \
                 old_rule.get_protect().get_key()
         key2 = protect.get_key() if key_state is MacsecManager.KeyState.KEY2 else \
                 old_rule.get_protect().get_key()
 
-        protect_entry = self._switch_connection.helper.buildTableEntry(
-            table_name="ingress.ethernet.macsec_protect.targets",
-            match_fields={
-                "standard_metadata.egress_spec": protect.get_address().get_port()
-            },
-            action_name="ingress.ethernet.macsec_protect.protect_packet",
-            action_params={
-                "key1": key1,
-                "key2": key2,
-                "system_id": self._settings.get_mac(),
-                "register_index": register
-            }
+        protect_entry = self._protect_entry.build(
+            [ protect.get_address().get_port() ],
+            [ key1, key2, self._settings.get_mac(), register ]
         )
 
         #validate rule
@@ -216,26 +224,107 @@ class MacsecManager:
                 old_rule.get_validate().get_key()
         key2 = validate.get_key() if key_state is MacsecManager.KeyState.KEY2 else \
                 old_rule.get_validate().get_key()
-        validate_entry = self._switch_connection.helper.buildTableEntry(
-            table_name="ingress.ethernet.macsec_validate.sources",
-            match_fields={
-                "standard_metadata.ingress_port": validate.get_address().get_port()
-            },
-            action_name="ingress.ethernet.macsec_validate.validate_packet",
-            action_params={
-                "key1": key1,
-                "key2": key2,
-                "register_index": register
-            }
+        validate_entry = self._validate_entry.build(
+            [ validate.get_address().get_port() ],
+            [ key1, key2, register ]
         )
 
         self._switch_connection.update_table_entries([ protect_entry, validate_entry ])
 
+        return key_state
+
+    def _renewed(self, rule: Rule, key_state: int) -> None:
+        protect = rule.get_protect()
+        register = self._registers[str(protect.get_address())]
+
+        self._key_state[str(protect.get_address())] = key_state
         self._rules[str(protect.get_address())] = rule
         self._set_soft_packet_limit(register, rule.get_soft_packet_limit());
         self._set_hard_packet_limit(register, rule.get_hard_packet_limit());
         self._set_soft_time_limit(rule)
 
+    def renew(self, rule: Rule) -> None:
+        self._logger.info("Renew MACsec rule: " + str(rule))
+
+        key_state = self._write_renew(rule)
+        self._renewed(rule, key_state)
+
+    def _collect(self, write: Callable[ [ Any ], Any ], subject: Any) \
+            -> Tuple[ Any, List[ PendingUpdate ], Optional[ Exception ] ]:
+        """
+        Call a write function inside of a batch. Returns its result, the
+        handles of its writes and the exception it has raised.
+        """
+        result, error = None, None
+        with self._switch_connection.collect() as pendings:
+            try:
+                result = write(subject)
+            except Exception as e:
+                error = e
+        return result, pendings, error
+
+    @staticmethod
+    def _check(pendings: List[ PendingUpdate ], error: Optional[ Exception ]) -> None:
+        """ Raise the exception of a write function or of its first failed write. """
+        if error is not None:
+            raise error
+        for pending in pendings:
+            pending.result()
+
+    def apply(self, removed: List[ Address ], added: List[ Rule ], renewed: List[ Rule ]) \
+            -> List[ Tuple[ Address, Exception ] ]:
+        """
+        Remove, add and renew rules. The table writes of all rules are sent
+        together, afterwards every rule is checked on its own and a failed
+        one is handled like in remove, add and renew: an added rule is rolled
+        back and retried. Returns the rules which could not be applied.
+        """
+        self._logger.info("Apply MACsec rules: remove " + str(len(removed)) + ", add "
+                + str(len(added)) + ", renew " + str(len(renewed)))
+
+        removes = [ ] # type: list
+        adds = [ ] # type: list
+        renews = [ ] # type: list
+        try:
+            with self._switch_connection.batch():
+                removes = [ (address, self._collect(self._write_remove, address))
+                        for address in removed ]
+                adds = [ (rule, self._collect(self._write_add, rule)) for rule in added ]
+                renews = [ (rule, self._collect(self._write_renew, rule)) for rule in renewed ]
+        except Exception:
+            # the errors are checked rule by rule
+            pass
+
+        errors = [ ] # type: List[ Tuple[ Address, Exception ] ]
+        for address, (_, pendings, error) in removes:
+            try:
+                self._check(pendings, error)
+                self._removed(address)
+            except Exception as e:
+                self._logger.error("Could not remove macsec: " + str(address))
+                errors.append((address, e))
+
+        for rule, (register, pendings, error) in adds:
+            address = rule.get_protect().get_address()
+            try:
+                self._check(pendings, error)
+                self._added(rule, register)
+            except Exception as e:
+                self._add_failed(rule, False)
+                if self._rules.get(str(address)) is not rule:
+                    errors.append((address, e))
+
+        for rule, (key_state, pendings, error) in renews:
+            address = rule.get_protect().get_address()
+            try:
+                self._check(pendings, error)
+                self._renewed(rule, key_state)
+            except Exception as e:
+                self._logger.error("Could not renew macsec: " + str(rule))
+                errors.append((address, e))
+
+        return errors
+
     def handle_notification(self, cpu: CPUPacket) -> None:
         notification = cpu["Notification"]
 
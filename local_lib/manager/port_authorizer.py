@@ -15,6 +15,23 @@ class PortController:
         self._switch_connection = switch_connection
         self._prefix = prefix
 
+        helper = self._switch_connection.helper
+        self._auto_authorization = helper.compileTableEntry(
+                self.resolve("auto_authorizations"), [ "port", "mac" ],
+                self.resolve("grant_access"))
+        self._auto_authorization_key = helper.compileTableEntry(
+                self.resolve("auto_authorizations"), [ "port", "mac" ])
+        self._force_authorization = helper.compileTableEntry(
+                self.resolve("forced_authorizations"), [ "port" ],
+                self.resolve("grant_access"))
+        self._force_authorization_key = helper.compileTableEntry(
+                self.resolve("forced_authorizations"), [ "port" ])
+        self._force_unauthorization = helper.compileTableEntry(
+                self.resolve("forced_unauthorizations"), [ "port" ],
+                self.resolve("grant_access"))
+        self._force_unauthorization_key = helper.compileTableEntry(
+                self.resolve("forced_unauthorizations"), [ "port" ])
+
     def get_prefix(self) -> str:
         return self._prefix
 
@@ -22,57 +39,28 @@ class PortController:
         return self.get_prefix() + "." + path
 
     def add_auto_authorize(self, port: int, mac: str) -> None:
-        self._switch_connection.write(
-            table_name=self.resolve("auto_authorizations"),
-            match_fields={
-                "port": port,
-                "mac": mac
-            },
-            action_name=self.resolve("grant_access")
-        )
+        self._switch_connection.write_table_entry(
+                self._auto_authorization.build([ port, mac ]))
 
     def remove_auto_authorize(self, port: int, mac: str) -> None:
-        self._switch_connection.delete(
-            table_name=self.resolve("auto_authorizations"),
-            match_fields={
-                "port": port,
-                "mac": mac
-            }
-        )
+        self._switch_connection.delete_table_entry(
+                self._auto_authorization_key.build([ port, mac ]))
 
     def add_force_authorize(self, port: int) -> None:
-        self._switch_connection.write(
-            table_name=self.resolve("forced_authorizations"),
-            match_fields={
-                "port": port
-            },
-            action_name=self.resolve("grant_access")
-        )
+        self._switch_connection.write_table_entry(
+                self._force_authorization.build([ port ]))
 
     def remove_force_authorize(self, port: int) -> None:
-        self._switch_connection.delete(
-            table_name=self.resolve("forced_authorizations"),
-            match_fields={
-                "port": port
-            }
-        )
+        self._switch_connection.delete_table_entry(
+                self._force_authorization_key.build([ port ]))
 
     def add_force_unauthorize(self, port: int) -> None:
-        self._switch_connection.write(
-            table_name=self.resolve("forced_unauthorizations"),
-            match_fields={
-                "port": port
-            },
-            action_name=self.resolve("grant_access")
-        )
+        self._switch_connection.write_table_entry(
+                self._force_unauthorization.build([ port ]))
 
     def remove_force_unauthorize(self, port: int) -> None:
-        self._switch_connection.delete(
-            table_name=self.resolve("forced_unauthorizations"),
-            match_fields={
-                "port": port
-            }
-        )
+        self._switch_connection.delete_table_entry(
+                self._force_unauthorization_key.build([ port ]))
 
 class PortAuthorizer:
 
@@ -103,10 +91,11 @@ class PortAuthorizer:
         if mac in self._port_mapping.items():
             self.unauthorize(self._port_mapping[mac], mac)
 
-        self._in_port_controller.add_auto_authorize(port, mac)
-        self._in_port_controller.add_auto_authorize(port, self._settings.get_mac())
-        self._out_port_controller.add_auto_authorize(port, mac)
-        self._out_port_controller.add_auto_authorize(port, "ff:ff:ff:ff:ff:ff")
+        with self._switch_connection.batch():
+            self._in_port_controller.add_auto_authorize(port, mac)
+            self._in_port_controller.add_auto_authorize(port, self._settings.get_mac())
+            self._out_port_controller.add_auto_authorize(port, mac)
+            self._out_port_controller.add_auto_authorize(port, "ff:ff:ff:ff:ff:ff")
 
         self._port_mapping[mac] = port
 
@@ -116,10 +105,11 @@ class PortAuthorizer:
 
         self._logger.info("Revoke access for port " + str(port) + " to " + mac)
 
-        self._in_port_controller.remove_auto_authorize(port, mac)
-        self._in_port_controller.remove_auto_authorize(port, self._settings.get_mac())
-        self._out_port_controller.remove_auto_authorize(port, mac)
-        self._out_port_controller.remove_auto_authorize(port, "ff:ff:ff:ff:ff:ff")
+        with self._switch_connection.batch():
+            self._in_port_controller.remove_auto_authorize(port, mac)
+            self._in_port_controller.remove_auto_authorize(port, self._settings.get_mac())
+            self._out_port_controller.remove_auto_authorize(port, mac)
+            self._out_port_controller.remove_auto_authorize(port, "ff:ff:ff:ff:ff:ff")
 
         del self._port_mapping[mac]
 
@@ -129,32 +119,36 @@ class PortAuthorizer:
     def force_authorization(self, port: int) -> None:
         self._logger.info("Force access for port " + str(port))
 
-        self._in_port_controller.add_force_authorize(port)
-        self._out_port_controller.add_force_authorize(port)
+        with self._switch_connection.batch():
+            self._in_port_controller.add_force_authorize(port)
+            self._out_port_controller.add_force_authorize(port)
 
         self._force_authorized_ports.add(port)
 
     def unforce_authorization(self, port: int) -> None:
         self._logger.info("Revoke access for port " + str(port))
 
-        self._in_port_controller.remove_force_authorize(port)
-        self._out_port_controller.remove_force_authorize(port)
+        with self._switch_connection.batch():
+            self._in_port_controller.remove_force_authorize(port)
+            self._out_port_controller.remove_force_authorize(port)
 
         self._force_authorized_ports.remove(port)
 
     def force_unauthorization(self, port: int) -> None:
         self._logger.info("Block port " + str(port))
 
-        self._in_port_controller.add_force_unauthorize(port)
-        self._out_port_controller.add_force_unauthorize(port)
+        with self._switch_connection.batch():
+            self._in_port_controller.add_force_unauthorize(port)
+            self._out_port_controller.add_force_unauthorize(port)
 
         self._force_unauthorized_ports.add(port)
 
     def unforce_unauthorization(self, port: int) -> None:
         self._logger.info("Unblock port " + str(port))
 
-        self._in_port_controller.remove_force_unauthorize(port)
-        self._out_port_controller.remove_force_unauthorize(port)
+        with self._switch_connection.batch():
+            self._in_port_controller.remove_force_unauthorize(port)
+            self._out_port_controller.remove_force_unauthorize(port)
 
         self._force_unauthorized_ports.remove(port)
 
@@ -1,6 +1,6 @@
 # common
 from common_lib.logger import Logger
-from common_lib.ipaddress import Address, Host, Network
+from common_lib.ipaddress import Host, Network
 from common_lib.routing import ForwardRule
 
 # local
@@ -10,9 +10,21 @@ from local_lib.global_ import GlobalController
 
 # other
 from uuid import UUID
-from typing import Set
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+from itertools import count
+from ipaddress import ip_network
+
+# next hop of a subnet: mac, port
+Hop = Tuple[ str, int ]
 
 class RoutingManager:
+    """
+    Writes the forward rules of the global controller and the routes to
+    local hosts. The forward table uses an action selector, every next
+    hop is a member of it. A subnet with a single next hop references
+    its member directly, a subnet with several equal-cost next hops
+    references a group of their members and the switch picks one per flow.
+    """
 
     def __init__(self,
             logger: Logger,
@@ -27,48 +39,149 @@ class RoutingManager:
         self._global_controller.get_service("registration").on_register(self._init_subnets)
         self._hosts = set() # type: Set[ Host ]
 
+        # next hops by subnet: wanted and written ones
+        self._routes = dict() # type: Dict[ Network, Set[ Hop ] ]
+        self._installed = dict() # type: Dict[ Network, FrozenSet[ Hop ] ]
+
+        # members by next hop and the number of subnets which use them
+        self._members = dict() # type: Dict[ Hop, int ]
+        self._member_counts = dict() # type: Dict[ Hop, int ]
+        self._groups = dict() # type: Dict[ Network, int ]
+        self._member_ids = count(1)
+        self._group_ids = count(1)
+
+        helper = self._switch_connection.helper
+        self._profile_id = helper.get_action_profiles_id("ingress.ethernet.ipv4.forward_selector")
+        self._forward_key = helper.compileTableEntry("ingress.ethernet.ipv4.forward",
+                [ "hdr.ipv4.dstAddr", "hdr.ethernet.dstAddr" ])
+
     def _init_subnets(self, id_: UUID) -> None:
         for subnet in self._settings.get_subnets():
             self.add_subnet(subnet)
 
-    def _write_ipv4_rule(self, address: Address, prefix: int, mac: str, port: int) -> None:
-        self._switch_connection.write(
-                table_name="ingress.ethernet.ipv4.forward",
-                match_fields={
-                    "hdr.ipv4.dstAddr": (str(address), prefix),
-                    "hdr.ethernet.dstAddr": self._settings.get_mac()
-                },
-                action_name="ingress.ethernet.ipv4.do_forward",
-                action_params={
-                    "dstAddr": mac,
-                    "port": port
-                }
-            )
-
-    def _delete_ipv4_rule(self, address: Address, prefix: int) -> None:
-        self._switch_connection.delete(
-                table_name="ingress.ethernet.ipv4.forward",
-                match_fields={
-                    "hdr.ipv4.dstAddr": (str(address), prefix),
-                    "hdr.ethernet.dstAddr": self._settings.get_mac()
-                }
-            )
+    def _build_entry(self, subnet: Network, hops: FrozenSet[ Hop ]):
+        entry = self._forward_key.build([ (str(subnet.network_address), subnet.prefixlen),
+                self._settings.get_mac() ])
+        if len(hops) == 1:
+            entry.action.action_profile_member_id = self._members[next(iter(hops))]
+        else:
+            entry.action.action_profile_group_id = self._groups[subnet]
+        return entry
+
+    def _write_members(self, changes: Dict[ Network, FrozenSet[ Hop ] ]) -> List[ Hop ]:
+        """ Write the members of new next hops, returns the ones which are not used anymore. """
+        for subnet, hops in changes.items():
+            old = self._installed.get(subnet, frozenset())
+            for hop in hops - old:
+                self._member_counts[hop] = self._member_counts.get(hop, 0) + 1
+            for hop in old - hops:
+                self._member_counts[hop] -= 1
+
+        with self._switch_connection.batch():
+            for hop, amount in self._member_counts.items():
+                if amount > 0 and hop not in self._members:
+                    mac, port = hop
+                    self._members[hop] = next(self._member_ids)
+                    self._switch_connection.write_action_profile_member(self._profile_id,
+                            self._members[hop], self._switch_connection.helper.buildAction(
+                                "ingress.ethernet.ipv4.do_forward", { "dstAddr": mac, "port": port }))
+
+        return [ hop for hop, amount in self._member_counts.items() if amount == 0 ]
+
+    def _write_routes(self, changes: Dict[ Network, FrozenSet[ Hop ] ]) -> None:
+        """
+        Write the next hops of subnets. Members are written before the
+        groups and entries which reference them and deleted after them.
+        """
+        unused = self._write_members(changes)
+
+        # groups of subnets with several next hops
+        with self._switch_connection.batch():
+            for subnet, hops in changes.items():
+                if len(hops) < 2:
+                    continue
+                member_ids = [ self._members[hop] for hop in sorted(hops) ]
+                if subnet in self._groups:
+                    self._switch_connection.update_action_profile_group(self._profile_id,
+                            self._groups[subnet], member_ids)
+                else:
+                    self._groups[subnet] = next(self._group_ids)
+                    self._switch_connection.write_action_profile_group(self._profile_id,
+                            self._groups[subnet], member_ids)
+
+        # entries, a subnet which keeps its group does not change
+        with self._switch_connection.batch():
+            for subnet, hops in changes.items():
+                old = self._installed.get(subnet, frozenset())
+                if len(hops) == 0:
+                    self._switch_connection.delete_table_entry(self._build_entry(subnet, old))
+                elif len(old) == 0:
+                    self._switch_connection.write_table_entry(self._build_entry(subnet, hops))
+                elif len(hops) == 1 or len(old) == 1:
+                    self._switch_connection.update_table_entry(self._build_entry(subnet, hops))
+
+        with self._switch_connection.batch():
+            for subnet, hops in changes.items():
+                if len(hops) < 2 and subnet in self._groups:
+                    self._switch_connection.delete_action_profile_group(self._profile_id,
+                            self._groups.pop(subnet))
+
+                if len(hops) > 0:
+                    self._installed[subnet] = hops
+                else:
+                    self._installed.pop(subnet, None)
+
+        with self._switch_connection.batch():
+            for hop in unused:
+                del self._member_counts[hop]
+                self._switch_connection.delete_action_profile_member(self._profile_id,
+                        self._members.pop(hop))
+
+    def _update_routes(self, subnets: Iterable[ Network ]) -> None:
+        changes = dict() # type: Dict[ Network, FrozenSet[ Hop ] ]
+        for subnet in subnets:
+            hops = frozenset(self._routes.get(subnet, set()))
+            if hops != self._installed.get(subnet, frozenset()):
+                changes[subnet] = hops
+            if len(hops) == 0:
+                self._routes.pop(subnet, None)
+
+        if len(changes) > 0:
+            self._write_routes(changes)
 
     def new_forward_rule(self, rule: ForwardRule) -> None:
         self._logger.info("New forward rule: " + str(rule))
-        subnet = rule.get_subnet()
-        self._write_ipv4_rule(subnet.network_address, subnet.prefixlen,
-                rule.get_dst_mac(), rule.get_port())
+        self.apply_forward_rules([ rule ], [ ])
 
     def remove_forward_rule(self, rule: ForwardRule) -> None:
         self._logger.info("Remove forward rule: " + str(rule))
-        subnet = rule.get_subnet()
-        self._delete_ipv4_rule(subnet.network_address, subnet.prefixlen)
+        self.apply_forward_rules([ ], [ rule ])
+
+    def apply_forward_rules(self, added: List[ ForwardRule ], removed: List[ ForwardRule ]) -> None:
+        """
+        Remove and add forward rules with as few switch writes as possible.
+        Rules of the same subnet are equal-cost next hops of it.
+        """
+        self._logger.info("Apply forward rules: remove " + str(len(removed)) + ", add "
+                + str(len(added)))
+        for rule in removed:
+            self._routes.get(rule.get_subnet(), set()).discard(
+                    (rule.get_dst_mac(), rule.get_port()))
+        for rule in added:
+            self._routes.setdefault(rule.get_subnet(), set()).add(
+                    (rule.get_dst_mac(), rule.get_port()))
+
+        self._update_routes(set(rule.get_subnet() for rule in added + removed))
+
+    def get_next_hops(self, subnet: Network) -> FrozenSet[ Hop ]:
+        return self._installed.get(subnet, frozenset())
 
     def add_host(self, host: Host) -> None:
         self._logger.info("Adding host: " + str(host))
         self._hosts.add(host)
-        self._write_ipv4_rule(host.get_address(), 32, host.get_mac(), host.get_port())
+        subnet = ip_network(host.get_address())
+        self._routes[subnet] = { (host.get_mac(), host.get_port()) }
+        self._update_routes([ subnet ])
 
     def get_hosts(self) -> Set[ Host ]:
         return self._hosts
@@ -6,11 +6,11 @@ from common_lib.event import EventSystem
 # local
 from local_lib.p4runtime_lib import SwitchConnection, PortMonitor
 from local_lib.packet import CPUPacket
+from local_lib.packet.fast import REASON_SEND_DIRECT, pack_cpu_header, pack_ethernet_header
 
 # other
 from threading import Lock, Thread, Event
 from time import time, sleep
-from scapy.all import Ether # type: ignore
 from macsec_pb2 import bddp_key # type: ignore
 from typing import Optional
 
@@ -30,9 +30,11 @@ class TopologyManager:
         self._topology = Topology()
 
         self._lldp_interval = 30#s
-        self._event_system.set_interval(self.send_lldp_packets, self._lldp_interval, \
-                immediate=True)
-        self._event_system.set_interval(self.lldp_garbage_collect, self._lldp_interval)
+        self._intervals = [
+            self._event_system.set_interval(self.send_lldp_packets, self._lldp_interval, \
+                    immediate=True),
+            self._event_system.set_interval(self.lldp_garbage_collect, self._lldp_interval)
+        ]
 
         self._bddp_sequence = int(time()) # check if lock is needed when you access this
 
@@ -101,11 +103,8 @@ class TopologyManager:
         self._logger.debug("Sending lldp packets.", 3)
 
         #generate packets
-        bddp_ether = Ether( \
-            src=self._mac, \
-            dst="ff:ff:ff:ff:ff:ff", \
-            type=CPUPacket.TYPE_BDDP \
-        )
+        bddp_ether = pack_ethernet_header("ff:ff:ff:ff:ff:ff", self._mac, CPUPacket.TYPE_BDDP)
+        timestamp = int(time())
         packets = [ ]
         for i in range(self._switch_connection.get_num_ports()):
             if i in self._ignore_ports:
@@ -115,8 +114,8 @@ class TopologyManager:
                     self._bddp_sequence)
             self._bddp_sequence += 1 # only modified here
 
-            cpu = CPUPacket(reason="SEND_DIRECT", port=i, timestamp=int(time()))
-            packets += [ bytes(cpu / bddp_ether / bddp_packet.serialize()) ]
+            cpu = pack_cpu_header(REASON_SEND_DIRECT, i, timestamp)
+            packets += [ cpu + bddp_ether + bddp_packet.serialize() ]
 
         # send
         self._switch_connection.send_packets_out(packets) # threadsafe (synchronized queue)
@@ -137,3 +136,6 @@ class TopologyManager:
 
     def teardown(self):
         self._port_monitor.unregister_on_change(self.handle_port_change)
+
+        for interval in self._intervals:
+            interval.stop()
@@ -1,3 +1,4 @@
 from local_lib.p4runtime_lib.helper import P4InfoHelper
 from local_lib.p4runtime_lib.switch import SwitchConnection
 from local_lib.p4runtime_lib.port import PortMonitor
+from local_lib.p4runtime_lib.pipeline import PendingUpdate
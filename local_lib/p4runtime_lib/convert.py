@@ -15,6 +15,7 @@
 import re
 import socket
 import math
+from functools import lru_cache
 
 '''
 This package contains several helper functions for encoding to and decoding from byte strings:
@@ -27,6 +28,8 @@ mac_pattern = re.compile('^([\da-fA-F]{2}:){5}([\da-fA-F]{2})$')
 def matchesMac(mac_addr_string):
     return mac_pattern.match(mac_addr_string) is not None
 
+# switch, broadcast and host macs are encoded over and over again
+@lru_cache(maxsize=4096)
 def encodeMac(mac_addr_string):
     return bytes.fromhex(mac_addr_string.replace(":", ""))
 
@@ -37,8 +40,10 @@ ip_pattern = re.compile('^(\d{1,3}\.){3}(\d{1,3})$')
 def matchesIPv4(ip_addr_string):
     return ip_pattern.match(ip_addr_string) is not None
 
+@lru_cache(maxsize=4096)
 def encodeIPv4(ip_addr_string):
-    return socket.inet_aton(ip_addr_string)
+    # unlike inet_aton, short forms such as "1" are rejected
+    return socket.inet_pton(socket.AF_INET, ip_addr_string)
 
 def decodeIPv4(encoded_ip_addr):
     return socket.inet_ntoa(encoded_ip_addr)
@@ -47,40 +52,75 @@ def bitwidthToBytes(bitwidth):
     return int(math.ceil(bitwidth / 8.0))
 
 def encodeNum(number, bitwidth):
-    byte_len = bitwidthToBytes(bitwidth)
-    num_str = '%x' % number
     if number >= 2 ** bitwidth:
         raise Exception("Number, %d, does not fit in %d bits" % (number, bitwidth))
-    return bytes.fromhex('0' * (byte_len * 2 - len(num_str)) + num_str)
+    return number.to_bytes(bitwidthToBytes(bitwidth), "big")
 
 def decodeNum(encoded_number):
-    return int(encoded_number.hex(), 16)
-
-def encode(x, bitwidth):
-    'Tries to infer the type of `x` and encode it'
+    return int.from_bytes(encoded_number, "big")
+
+# kinds of fields, an encoder is selected once per field
+MAC = "mac"
+IPV4 = "ipv4"
+NUMBER = "number"
+
+def get_field_kind(bitwidth):
+    'Kind of a field from its P4Info bitwidth, typedefs are not part of the P4Info'
+    if bitwidth == 48:
+        return MAC
+    if bitwidth == 32:
+        return IPV4
+    return NUMBER
+
+_string_encoders = {
+    MAC: encodeMac,
+    IPV4: encodeIPv4
+}
+
+@lru_cache(maxsize=None)
+def get_encoder(bitwidth, kind=NUMBER):
+    '''
+    Select an encoder for a field of the given bitwidth and kind.
+    Strings are read as addresses of the kind, integers are encoded
+    with the bitwidth and bytes are passed through.
+    '''
     byte_len = bitwidthToBytes(bitwidth)
-    if (type(x) == list or type(x) == tuple) and len(x) == 1:
-        x = x[0]
-
-    encoded_bytes = None
-
-    if type(x) == str or type(x) == bytes:
-        try:
-            if matchesMac(x):
-                encoded_bytes = encodeMac(x)
-            elif matchesIPv4(x):
-                encoded_bytes = encodeIPv4(x)
-            else:
-                # Assume that the string is already encoded
-                encoded_bytes = x
-        except:
+    limit = 2 ** bitwidth
+    encode_string = _string_encoders.get(kind)
+
+    def encode_field(x):
+        t = type(x)
+        if t == int:
+            if x >= limit:
+                raise Exception("Number, %d, does not fit in %d bits" % (x, bitwidth))
+            encoded_bytes = x.to_bytes(byte_len, "big")
+        elif t == bytes:
             encoded_bytes = x
-    elif type(x) == int:
-        encoded_bytes = encodeNum(x, bitwidth)
-    else:
-        raise Exception("Encoding objects of %r is not supported" % type(x))
-    assert(len(encoded_bytes) == byte_len)
-    return encoded_bytes
+        elif t == str and encode_string is not None:
+            encoded_bytes = encode_string(x)
+        elif t == list or t == tuple:
+            if len(x) != 1:
+                raise Exception("Encoding objects of %r is not supported" % t)
+            return encode_field(x[0])
+        else:
+            raise Exception("Encoding objects of %r is not supported" % t)
+        assert(len(encoded_bytes) == byte_len)
+        return encoded_bytes
+
+    return encode_field
+
+def get_field_encoder(bitwidth):
+    'Select the encoder of a field from its P4Info bitwidth'
+    return get_encoder(bitwidth, get_field_kind(bitwidth))
+
+def encode(x, bitwidth):
+    'Encode `x` with the encoder of a field of the bitwidth'
+    return get_field_encoder(bitwidth)(x)
+
+def encodeMany(values, bitwidth):
+    'Encode all values of one field'
+    encode_field = get_field_encoder(bitwidth)
+    return [ encode_field(x) for x in values ]
 
 if __name__ == '__main__':
     # TODO These tests should be moved out of main eventually
@@ -113,6 +153,7 @@ if __name__ == '__main__':
     assert(encode(num, 5 * 8) == enc_num)
     assert(encode((num,), 5 * 8) == enc_num)
     assert(encode([num], 5 * 8) == enc_num)
+    assert(encodeMany([mac, enc_mac], 6 * 8) == [enc_mac, enc_mac])
 
     num = 256
     byte_len = 2
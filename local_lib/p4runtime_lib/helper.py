@@ -18,9 +18,13 @@ import google.protobuf.text_format # type: ignore
 from p4.v1 import p4runtime_pb2 # type: ignore
 from p4.config.v1 import p4info_pb2 # type: ignore
 
-from local_lib.p4runtime_lib.convert import encode
+from local_lib.p4runtime_lib.convert import encode, get_field_encoder
+from local_lib.p4runtime_lib.template import TableEntryTemplate
 
 
+get_id_pattern = re.compile("^get_(\\w+)_id$")
+get_name_pattern = re.compile("^get_(\\w+)_name$")
+
 class P4InfoHelper(object):
     def __init__(self, p4_info_filepath):
         p4info = p4info_pb2.P4Info()
@@ -29,18 +33,53 @@ class P4InfoHelper(object):
             google.protobuf.text_format.Merge(p4info_f.read(), p4info)
         self.p4info = p4info
 
+        self._build_indices()
+        self._templates = dict()
+
+    def _build_indices(self):
+        # entity type -> name / alias -> entity
+        self._by_name = dict()
+        # entity type -> id -> entity
+        self._by_id = dict()
+
+        for field in self.p4info.DESCRIPTOR.fields:
+            if field.message_type is None or \
+                    "preamble" not in field.message_type.fields_by_name:
+                continue
+            by_name = self._by_name[field.name] = dict()
+            by_id = self._by_id[field.name] = dict()
+            for o in getattr(self.p4info, field.name):
+                pre = o.preamble
+                by_name[pre.name] = o
+                if pre.alias:
+                    by_name.setdefault(pre.alias, o)
+                by_id[pre.id] = o
+
+        # table name -> match field name / id -> match field
+        self._match_fields_by_name = dict()
+        self._match_fields_by_id = dict()
+        for t in self.p4info.tables:
+            self._match_fields_by_name[t.preamble.name] = { mf.name: mf for mf in t.match_fields }
+            self._match_fields_by_id[t.preamble.name] = { mf.id: mf for mf in t.match_fields }
+
+        # action name -> param name / id -> param
+        self._action_params_by_name = dict()
+        self._action_params_by_id = dict()
+        for a in self.p4info.actions:
+            self._action_params_by_name[a.preamble.name] = { p.name: p for p in a.params }
+            self._action_params_by_id[a.preamble.name] = { p.id: p for p in a.params }
+
     def get(self, entity_type, name=None, id=None):
         if name is not None and id is not None:
             raise AssertionError("name or id must be None")
 
-        for o in getattr(self.p4info, entity_type):
-            pre = o.preamble
-            if name:
-                if (pre.name == name or pre.alias == name):
-                    return o
-            else:
-                if pre.id == id:
-                    return o
+        if name:
+            o = self._by_name.get(entity_type, {}).get(name)
+        else:
+            o = self._by_id.get(entity_type, {}).get(id)
+
+        if o is not None:
+            return o
 
         if name:
             raise AttributeError("Could not find %r of type %s" % (name, entity_type))
@@ -59,31 +98,43 @@ class P4InfoHelper(object):
     def __getattr__(self, attr):
         # Synthesize convenience functions for name to id lookups for top-level entities
         # e.g. get_tables_id(name_string) or get_actions_id(name_string)
-        m = re.search("^get_(\w+)_id$", attr)
+        m = get_id_pattern.search(attr)
         if m:
+            by_name = self._get_index(self._by_name, m.group(1))
             primitive = m.group(1)
-            return lambda name: self.get_id(primitive, name)
+            def get_id(name):
+                o = by_name.get(name)
+                return o.preamble.id if o is not None else self.get_id(primitive, name)
+            # cache the function -> later calls do not pass __getattr__ again
+            setattr(self, attr, get_id)
+            return get_id
 
         # Synthesize convenience functions for id to name lookups
         # e.g. get_tables_name(id) or get_actions_name(id)
-        m = re.search("^get_(\w+)_name$", attr)
+        m = get_name_pattern.search(attr)
         if m:
+            by_id = self._get_index(self._by_id, m.group(1))
             primitive = m.group(1)
-            return lambda id: self.get_name(primitive, id)
+            def get_name(id):
+                o = by_id.get(id)
+                return o.preamble.name if o is not None else self.get_name(primitive, id)
+            setattr(self, attr, get_name)
+            return get_name
 
         raise AttributeError("%r object has no attribute %r" % (self.__class__, attr))
 
+    def _get_index(self, indices, entity_type):
+        if entity_type not in indices:
+            raise AttributeError("%r object has no entity type %r" % (self.__class__, entity_type))
+        return indices[entity_type]
+
     def get_match_field(self, table_name, name=None, id=None):
-        for t in self.p4info.tables:
-            pre = t.preamble
-            if pre.name == table_name:
-                for mf in t.match_fields:
-                    if name is not None:
-                        if mf.name == name:
-                            return mf
-                    elif id is not None:
-                        if mf.id == id:
-                            return mf
+        if name is not None:
+            mf = self._match_fields_by_name.get(table_name, {}).get(name)
+        else:
+            mf = self._match_fields_by_id.get(table_name, {}).get(id)
+        if mf is not None:
+            return mf
         raise AttributeError("%r has no attribute %r" % (table_name, name if name is not None else id))
 
     def get_match_field_id(self, table_name, match_field_name):
@@ -136,16 +187,12 @@ class P4InfoHelper(object):
             raise Exception("Unsupported match type with type %r" % match_type)
 
     def get_action_param(self, action_name, name=None, id=None):
-        for a in self.p4info.actions:
-            pre = a.preamble
-            if pre.name == action_name:
-                for p in a.params:
-                    if name is not None:
-                        if p.name == name:
-                            return p
-                    elif id is not None:
-                        if p.id == id:
-                            return p
+        if name is not None:
+            p = self._action_params_by_name.get(action_name, {}).get(name)
+        else:
+            p = self._action_params_by_id.get(action_name, {}).get(id)
+        if p is not None:
+            return p
         raise AttributeError("action %r has no param %r" % (action_name, name if name is not None else id))
 
     def get_action_param_id(self, action_name, param_name):
@@ -185,3 +232,41 @@ class P4InfoHelper(object):
                     for field_name, value in action_params.items()
                 ])
         return table_entry
+
+    def buildAction(self, action_name, action_params={}):
+        action = p4runtime_pb2.Action()
+        action.action_id = self.get_actions_id(action_name)
+        action.params.extend([
+            self.get_action_param_pb(action_name, field_name, value)
+            for field_name, value in action_params.items()
+        ])
+        return action
+
+    def compileTableEntry(self,
+                          table_name,
+                          match_field_names=(),
+                          action_name=None,
+                          action_param_names=()):
+        """
+        Resolve table, match fields, action and params once and return
+        a template which builds entries from values only. The encoder of
+        every field is selected from its P4Info bitwidth here.
+        """
+        key = (table_name, tuple(match_field_names), action_name, tuple(action_param_names))
+        if key not in self._templates:
+            table = self.get("tables", name=table_name)
+            match_fields = [ self.get_match_field(table.preamble.name, name=name)
+                    for name in match_field_names ]
+
+            action = None
+            params = []
+            if action_name:
+                action = self.get("actions", name=action_name)
+                params = [ self.get_action_param(action.preamble.name, name=name)
+                        for name in action_param_names ]
+
+            self._templates[key] = TableEntryTemplate(table, match_fields,
+                    [ get_field_encoder(field.bitwidth) for field in match_fields ],
+                    action, params,
+                    [ get_field_encoder(param.bitwidth) for param in params ])
+        return self._templates[key]
@@ -0,0 +1,122 @@
+# other
+from collections import deque
+from threading import Lock, Condition
+from time import monotonic
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+class PacketOutQueue:
+    """
+    Bounded queue of packets out.
+    Items are single requests or lists of requests, a list counts with
+    its length. If the queue is full, new packets are dropped, or the
+    producer is blocked until there is space if block is set (and
+    dropped after timeout seconds). The consumer takes all queued items
+    at once, such that a burst costs a single thread handoff.
+    """
+
+    def __init__(self, max_size: int, block: bool = False, timeout: Optional[ float ] = None) -> None:
+        self._max_size = max_size
+        self._block = block
+        self._timeout = timeout
+
+        self._lock = Lock()
+        self._not_empty = Condition(self._lock)
+        self._not_full = Condition(self._lock)
+
+        # (enqueue time, item, number of packets)
+        self._items = deque() # type: Deque[ Tuple[ float, Any, int ] ]
+        self._size = 0
+        self._woken = False
+
+        # statistics
+        self._max_depth = 0
+        self._enqueued = 0
+        self._dropped = 0
+        self._drained = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+
+    def _fits(self, size: int) -> bool:
+        # an item larger than the queue is accepted into an empty queue
+        return self._size == 0 or self._size + size <= self._max_size
+
+    def put(self, item: Any) -> bool:
+        """ Queue an item, returns false if it has been dropped. """
+        size = len(item) if isinstance(item, list) else 1
+
+        with self._lock:
+            if not self._fits(size):
+                if not self._block or \
+                        not self._not_full.wait_for(lambda: self._fits(size), self._timeout):
+                    self._dropped += size
+                    return False
+
+            self._items.append((monotonic(), item, size))
+            self._size += size
+            self._enqueued += size
+            self._max_depth = max(self._max_depth, self._size)
+            self._not_empty.notify()
+            return True
+
+    def get_many(self, max_size: int) -> List[ Any ]:
+        """
+        Wait for items and take up to max_size packets at once.
+        Returns an empty list if the consumer has been woken up.
+        """
+        with self._lock:
+            self._not_empty.wait_for(lambda: self._size > 0 or self._woken)
+            self._woken = False
+
+            now = monotonic()
+            items = [ ] # type: List[ Any ]
+            count = 0
+            while len(self._items) > 0 and count < max_size:
+                enqueued, item, size = self._items.popleft()
+                latency = now - enqueued
+                self._latency_sum += latency * size
+                self._latency_max = max(self._latency_max, latency)
+                items.append(item)
+                count += size
+
+            self._size -= count
+            self._drained += count
+            self._not_full.notify_all()
+            return items
+
+    def requeue(self, items: List[ Any ]) -> None:
+        """ Put items taken by a consumer which could not send them back in front. """
+        now = monotonic()
+        with self._lock:
+            for item in reversed(items):
+                size = len(item) if isinstance(item, list) else 1
+                self._items.appendleft((now, item, size))
+                self._size += size
+                self._drained -= size
+            if len(items) > 0:
+                self._not_empty.notify()
+
+    def wake(self) -> None:
+        """ Let a waiting consumer return without items. """
+        with self._lock:
+            self._woken = True
+            self._not_empty.notify_all()
+
+    def get_depth(self) -> int:
+        with self._lock:
+            return self._size
+
+    def get_dropped(self) -> int:
+        with self._lock:
+            return self._dropped
+
+    def get_statistics(self) -> Dict[ str, float ]:
+        """ Depth, maximum depth, packet counts and the latency of drained packets in seconds. """
+        with self._lock:
+            return {
+                "depth": self._size,
+                "max_depth": self._max_depth,
+                "enqueued": self._enqueued,
+                "dropped": self._dropped,
+                "latency_avg": self._latency_sum / self._drained if self._drained > 0 else 0.0,
+                "latency_max": self._latency_max
+            }
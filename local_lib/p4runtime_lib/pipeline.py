@@ -0,0 +1,327 @@
+# common
+from common_lib.logger import Logger
+
+# local
+from local_lib.exception import WriteException
+from local_lib.p4runtime_lib.shadow import get_entry_key
+
+# other
+from p4.v1.p4runtime_pb2 import WriteRequest, Update, Error # type: ignore
+from google.rpc.status_pb2 import Status # type: ignore
+from google.rpc.code_pb2 import OK # type: ignore
+import grpc # type: ignore
+from threading import Thread, Event, RLock, Lock, Condition
+from queue import Queue
+from contextlib import contextmanager
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class PendingUpdate:
+    """
+    Handle of an update which has been queued in the write pipeline.
+    It is resolved as soon as the write request containing the update
+    has been answered by the switch.
+    """
+
+    def __init__(self, update: Update) -> None:
+        self._update = update
+        self._done = Event()
+        self._error = None # type: Optional[ Exception ]
+        self._lock = Lock()
+        self._callbacks = [ ] # type: List[ Callable[ [ PendingUpdate ], None ] ]
+
+    def get_update(self) -> Update:
+        return self._update
+
+    def resolve(self, error: Optional[ Exception ] = None) -> List[ Callable ]:
+        """ Mark the update as written, returns the callbacks which have to be run. """
+        with self._lock:
+            self._error = error
+            self._done.set()
+            callbacks = self._callbacks
+            self._callbacks = [ ]
+        return callbacks
+
+    def add_done_callback(self, callback: Callable[ [ 'PendingUpdate' ], None ]) -> None:
+        """
+        Call the callback with this handle once the update is written.
+        Callbacks of unfinished updates are run on the callback thread of
+        the write pipeline, thus they must not wait for other writes.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[ float ] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def get_error(self) -> Optional[ Exception ]:
+        return self._error
+
+    def result(self, timeout: Optional[ float ] = None) -> None:
+        """ Block until the update is written, raise its error if it failed. """
+        if not self.wait(timeout):
+            raise WriteException("Timeout while waiting for the switch.")
+        if self._error is not None:
+            raise self._error
+
+class _Slot:
+    """ One update of a write request, shared by all handles coalesced into it. """
+
+    def __init__(self, update: Update, pending: PendingUpdate) -> None:
+        self.update = update
+        self.pendings = [ pending ]
+
+class WritePipeline:
+    """
+    Collects updates of all managers and sends them as multi-update
+    write requests. A request is sent as soon as it is full or when the
+    oldest queued update has waited longer than the maximum delay.
+    Requests are sent asynchronously, at most max_in_flight of them
+    are unanswered at the same time. Requests which touch an entry of
+    an unanswered request wait for it, such that the order is kept.
+    """
+
+    def __init__(self,
+            logger: Logger,
+            create_request: Callable[ [], WriteRequest ],
+            write: Callable[ [ WriteRequest ], Any ],
+            written: Callable[ [ Update ], None ],
+            max_batch_size: int,
+            max_delay: float,
+            max_in_flight: int = 1
+        ) -> None:
+        self._logger = logger
+        self._create_request = create_request
+        self._write = write
+        self._written = written
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay
+        self._max_in_flight = max_in_flight
+
+        self._lock = RLock()
+        self._slots = [ ] # type: List[ _Slot ]
+        self._keys = dict() # type: Dict[ Tuple, _Slot ]
+        self._deadline = None # type: Optional[ float ]
+
+        # requests which have been sent but not answered yet
+        self._in_flight = Condition()
+        self._in_flight_requests = 0
+        self._in_flight_keys = dict() # type: Dict[ Tuple, Update ]
+
+        self._wakeup = Event()
+        self._stopped = Event()
+        self._thread = None # type: Optional[ Thread ]
+
+        self._callbacks = Queue() # type: Queue
+        self._callback_thread = None # type: Optional[ Thread ]
+
+    @staticmethod
+    def get_key(update: Update) -> Optional[ Tuple ]:
+        """ Identify the table entry or action profile member / group an update refers to. """
+        entity = update.entity.WhichOneof("entity")
+        if entity == "table_entry":
+            return get_entry_key(update.entity.table_entry)
+        if entity == "action_profile_member":
+            member = update.entity.action_profile_member
+            return (entity, member.action_profile_id, member.member_id)
+        if entity == "action_profile_group":
+            group = update.entity.action_profile_group
+            return (entity, group.action_profile_id, group.group_id)
+        return None
+
+    def get_queued(self, update: Update) -> Optional[ Update ]:
+        """ Get the latest unanswered update which refers to the same entity or None. """
+        key = self.get_key(update)
+        if key is None:
+            return None
+
+        with self._lock:
+            slot = self._keys.get(key)
+            if slot is not None:
+                return slot.update
+
+        with self._in_flight:
+            return self._in_flight_keys.get(key)
+
+    def submit(self, update: Update) -> PendingUpdate:
+        pending = PendingUpdate(update)
+        key = self.get_key(update)
+
+        with self._lock:
+            slot = self._keys.get(key) if key is not None else None
+            if slot is not None:
+                if update.type == Update.MODIFY and slot.update.type != Update.DELETE:
+                    # the later modification supersedes the queued entity
+                    slot.update.entity.CopyFrom(update.entity)
+                    slot.pendings.append(pending)
+                    return pending
+                # the switch may reorder updates of one request -> keep them apart
+                self._flush()
+
+            slot = _Slot(update, pending)
+            self._slots.append(slot)
+            if key is not None:
+                self._keys[key] = slot
+
+            if len(self._slots) >= self._max_batch_size:
+                self._flush()
+            elif self._deadline is None:
+                self._deadline = time() + self._max_delay
+                self._wakeup.set()
+
+        return pending
+
+    def flush(self) -> None:
+        """ Send all queued updates immediately. """
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        slots = self._slots
+        self._slots = [ ]
+        self._keys = dict()
+        self._deadline = None
+
+        for i in range(0, len(slots), self._max_batch_size):
+            self._send(slots[i:i + self._max_batch_size])
+
+    def _send(self, slots: List[ _Slot ]) -> None:
+        updates = dict((self.get_key(slot.update), slot.update) for slot in slots)
+        updates.pop(None, None)
+        keys = list(updates.keys())
+
+        with self._in_flight:
+            self._in_flight.wait_for(lambda: self._in_flight_requests < self._max_in_flight
+                    and not any(key in self._in_flight_keys for key in keys))
+            self._in_flight_requests += 1
+            self._in_flight_keys.update(updates)
+
+        request = self._create_request()
+        for slot in slots:
+            request.updates.add().CopyFrom(slot.update)
+
+        self._logger.debug("Write " + str(len(slots)) + " updates", 4)
+        try:
+            future = self._write(request)
+            future.add_done_callback(lambda future: self._complete(slots, keys, future))
+        except Exception as e:
+            self._complete(slots, keys, None, e)
+
+    def _complete(self,
+            slots: List[ _Slot ],
+            keys: List[ Tuple ],
+            future,
+            error: Optional[ Exception ] = None
+        ) -> None:
+        """ Handle the answer of the switch, runs on the thread of gRPC. """
+        if error is not None:
+            errors = [ error ] * len(slots) # type: List[ Optional[ Exception ] ]
+        else:
+            try:
+                future.result()
+                errors = [ None ] * len(slots)
+            except grpc.RpcError as e:
+                errors = self._get_errors(e, len(slots))
+            except Exception as e:
+                errors = [ e ] * len(slots)
+
+        for slot, slot_error in zip(slots, errors):
+            if slot_error is None:
+                self._written(slot.update)
+
+        with self._in_flight:
+            self._in_flight_requests -= 1
+            for key in keys:
+                del self._in_flight_keys[key]
+            self._in_flight.notify_all()
+
+        for slot, slot_error in zip(slots, errors):
+            for pending in slot.pendings:
+                for callback in pending.resolve(slot_error):
+                    self._callbacks.put((callback, pending))
+
+    @contextmanager
+    def pause(self):
+        """ Hold back all submits of other threads until the block is left. """
+        with self._lock:
+            yield
+
+    def wait_idle(self, timeout: Optional[ float ] = None) -> bool:
+        """ Send all queued updates and wait until the switch has answered all of them. """
+        self.flush()
+        with self._in_flight:
+            return self._in_flight.wait_for(lambda: self._in_flight_requests == 0, timeout)
+
+    def _get_errors(self, error: grpc.RpcError, size: int) -> List[ Optional[ Exception ] ]:
+        """ Map the error of a write request to the updates which have caused it. """
+        details = None
+        for key, value in error.trailing_metadata() or ():
+            if key == "grpc-status-details-bin":
+                details = value
+
+        if details is None:
+            return [ WriteException(error.details(), error.code()) for i in range(size) ]
+
+        status = Status()
+        status.ParseFromString(details)
+
+        errors = [ ] # type: List[ Optional[ Exception ] ]
+        for detail in status.details:
+            p4_error = Error()
+            detail.Unpack(p4_error)
+            errors.append(None if p4_error.canonical_code == OK
+                    else WriteException(p4_error.message, p4_error.canonical_code))
+
+        # the switch did not report every update -> assume the worst
+        errors += [ WriteException(error.details(), error.code())
+                for i in range(size - len(errors)) ]
+        return errors
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            with self._lock:
+                deadline = self._deadline
+                self._wakeup.clear()
+
+            if deadline is None:
+                self._wakeup.wait()
+            elif deadline > time():
+                self._wakeup.wait(deadline - time())
+            else:
+                self.flush()
+
+        self.wait_idle()
+
+    def _run_callbacks(self) -> None:
+        while True:
+            item = self._callbacks.get(block=True)
+            if item is None:
+                break
+
+            callback, pending = item
+            try:
+                callback(pending)
+            except Exception as e:
+                self._logger.warn("Unexpected exception in write callback: " + str(e))
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = Thread(target=self._run)
+        self._thread.start()
+        self._callback_thread = Thread(target=self._run_callbacks)
+        self._callback_thread.start()
+
+    def stop(self) -> None:
+        assert self._thread != None, "You have not started the write pipeline."
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+
+        self._callbacks.put(None)
+        self._callback_thread.join()
@@ -0,0 +1,164 @@
+# other
+from p4.v1.p4runtime_pb2 import Update, TableEntry, MulticastGroupEntry, ActionProfileMember, ActionProfileGroup # type: ignore
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+def canonical(value: bytes) -> bytes:
+    """ Canonical form of a P4Runtime value, switches answer without leading zeros. """
+    return value.lstrip(b"\x00") or b"\x00"
+
+def _get_match_key(match) -> Tuple:
+    kind = match.WhichOneof("field_match_type")
+    if kind is None:
+        return (match.field_id, kind)
+    field = getattr(match, kind)
+    if kind == "lpm":
+        return (match.field_id, kind, canonical(field.value), field.prefix_len)
+    if kind == "ternary":
+        return (match.field_id, kind, canonical(field.value), canonical(field.mask))
+    if kind == "range":
+        return (match.field_id, kind, canonical(field.low), canonical(field.high))
+    return (match.field_id, kind, canonical(field.value))
+
+def get_entry_key(table_entry: TableEntry) -> Tuple:
+    """ Identify a table entry by its table, priority and canonical match key. """
+    return (table_entry.table_id, table_entry.priority,
+            tuple(sorted(_get_match_key(match) for match in table_entry.match)))
+
+def get_action_key(table_entry: TableEntry) -> Tuple:
+    """ Canonical form of the action of a table entry, to compare actions. """
+    action = table_entry.action
+    type_ = action.WhichOneof("type")
+    if type_ == "action":
+        return (type_, action.action.action_id, tuple(sorted((param.param_id, canonical(param.value))
+                for param in action.action.params)))
+    return (type_, getattr(action, type_) if type_ is not None else None)
+
+class ShadowStore:
+    """
+    Copy of all table entries, multicast groups and action profile
+    members and groups which have been written to the switch. It is updated with every successful write,
+    such that reads can be answered without asking the switch.
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._tables = dict() # type: Dict[ int, Dict[ Tuple, TableEntry ] ]
+        self._groups = dict() # type: Dict[ int, MulticastGroupEntry ]
+        self._members = dict() # type: Dict[ Tuple[ int, int ], ActionProfileMember ]
+        self._profile_groups = dict() # type: Dict[ Tuple[ int, int ], ActionProfileGroup ]
+
+    def _apply_multicast_group(self, update: Update) -> None:
+        pre_entry = update.entity.packet_replication_engine_entry
+        if pre_entry.WhichOneof("type") != "multicast_group_entry":
+            return
+
+        group = pre_entry.multicast_group_entry
+        with self._lock:
+            if update.type == Update.DELETE:
+                self._groups.pop(group.multicast_group_id, None)
+            else:
+                installed = MulticastGroupEntry()
+                installed.CopyFrom(group)
+                self._groups[group.multicast_group_id] = installed
+
+    def _apply_action_profile(self, update: Update, entity: str) -> None:
+        if entity == "action_profile_member":
+            installed = update.entity.action_profile_member
+            store = self._members # type: Dict
+            key = (installed.action_profile_id, installed.member_id)
+        else:
+            installed = update.entity.action_profile_group
+            store = self._profile_groups
+            key = (installed.action_profile_id, installed.group_id)
+
+        with self._lock:
+            if update.type == Update.DELETE:
+                store.pop(key, None)
+            else:
+                copy = type(installed)()
+                copy.CopyFrom(installed)
+                store[key] = copy
+
+    def apply(self, update: Update) -> None:
+        """ Record a successfully written update. """
+        entity = update.entity.WhichOneof("entity")
+        if entity == "packet_replication_engine_entry":
+            self._apply_multicast_group(update)
+            return
+        if entity in ( "action_profile_member", "action_profile_group" ):
+            self._apply_action_profile(update, entity)
+            return
+        if entity != "table_entry":
+            return
+
+        table_entry = update.entity.table_entry
+        key = get_entry_key(table_entry)
+
+        with self._lock:
+            table = self._tables.setdefault(table_entry.table_id, dict())
+            if update.type == Update.DELETE:
+                table.pop(key, None)
+            else:
+                installed = TableEntry()
+                installed.CopyFrom(table_entry)
+                table[key] = installed
+
+    def get(self, table_entry: TableEntry) -> Optional[ TableEntry ]:
+        """ Get the installed entry with the same match key. """
+        with self._lock:
+            return self._tables.get(table_entry.table_id, {}).get(get_entry_key(table_entry))
+
+    def has(self, table_entry: TableEntry) -> bool:
+        return self.get(table_entry) is not None
+
+    def get_table(self, table_id: int) -> List[ TableEntry ]:
+        with self._lock:
+            return list(self._tables.get(table_id, {}).values())
+
+    def get_all(self) -> List[ TableEntry ]:
+        with self._lock:
+            return [ entry for table in self._tables.values() for entry in table.values() ]
+
+    def get_multicast_groups(self) -> List[ MulticastGroupEntry ]:
+        with self._lock:
+            return list(self._groups.values())
+
+    def get_action_profile_members(self) -> List[ ActionProfileMember ]:
+        with self._lock:
+            return list(self._members.values())
+
+    def get_action_profile_groups(self) -> List[ ActionProfileGroup ]:
+        with self._lock:
+            return list(self._profile_groups.values())
+
+    def replace(self, table_entries: Iterable[ TableEntry ], table_id: int = 0) -> int:
+        """
+        Replace the recorded entries of a table (or of all tables if the
+        table id is 0) with the entries read from the switch.
+        Returns the number of entries which differed.
+        """
+        tables = dict() # type: Dict[ int, Dict[ Tuple, TableEntry ] ]
+        for table_entry in table_entries:
+            tables.setdefault(table_entry.table_id, dict())[get_entry_key(table_entry)] = table_entry
+
+        with self._lock:
+            table_ids = set(tables.keys()) | (set(self._tables.keys()) if table_id == 0 else { table_id })
+
+            differences = 0
+            for id_ in table_ids:
+                old = self._tables.get(id_, {})
+                new = tables.get(id_, {})
+                differences += sum(1 for key in old.keys() | new.keys()
+                        if key not in old or key not in new
+                        or get_action_key(old[key]) != get_action_key(new[key]))
+                self._tables[id_] = new
+
+        return differences
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables = dict()
+            self._groups = dict()
+            self._members = dict()
+            self._profile_groups = dict()
@@ -13,26 +13,43 @@
 # limitations under the License.
 #
 from time import sleep
-from p4.v1.p4runtime_pb2 import SetForwardingPipelineConfigRequest, WriteRequest, ReadRequest, Update, StreamMessageRequest, RegisterEntry, Index # type: ignore
+from p4.v1.p4runtime_pb2 import SetForwardingPipelineConfigRequest, GetForwardingPipelineConfigRequest, WriteRequest, ReadRequest, Update, StreamMessageRequest, RegisterEntry, Index # type: ignore
 from p4.v1.p4data_pb2 import P4Data # type: ignore
 from p4.v1.p4runtime_pb2_grpc import P4RuntimeStub # type: ignore
 from p4.tmp.p4config_pb2 import P4DeviceConfig # type: ignore
 from local_lib.p4runtime_lib.helper import P4InfoHelper
+from local_lib.p4runtime_lib.pipeline import WritePipeline, PendingUpdate
+from local_lib.p4runtime_lib.shadow import ShadowStore, get_action_key
+from local_lib.p4runtime_lib.outqueue import PacketOutQueue
+from google.rpc.code_pb2 import OK # type: ignore
 import grpc # type: ignore
-from threading import Thread, Event
-from queue import Queue
+from threading import Thread, Event, Lock, local
+from contextlib import contextmanager
+from random import getrandbits
+from time import perf_counter
 
 import traceback
 
 from common_lib.logger import Logger
+from common_lib.metrics import Registry
+from local_lib.exception import ArbitrationException
 from local_lib.packet.cpu import CPUPacket
+from local_lib.packet.fast import build_flood
 from local_lib.settings import Settings
 
-from typing import Set
+from typing import Set, List, Optional
 from scapy.all import Ether # type: ignore
 
-class CloseConnection:
-    pass
+class _Stream:
+    """ State of one stream, packets out are only sent once it is ready. """
+
+    def __init__(self) -> None:
+        self.ready = Event()
+        self.closed = Event()
+
+    def close(self) -> None:
+        self.closed.set()
+        self.ready.set()
 
 class SwitchConnection:
     """
@@ -41,22 +58,73 @@ class SwitchConnection:
     table entries or listen on packets.
     """
 
-    def __init__(self, logger: Logger, settings: Settings):
+    def __init__(self, logger: Logger, settings: Settings, metrics: Optional[ Registry ] = None):
         self.logger = logger
         self._settings = settings
         self._switch_settings = settings.get_switch()
-        self.stub = P4RuntimeStub(grpc.insecure_channel(self._switch_settings.get_address()))
+        self._init_metrics(metrics if metrics is not None else Registry())
+        self._channel = grpc.insecure_channel(self._switch_settings.get_address())
+        self.stub = P4RuntimeStub(self._channel)
         self.helper = P4InfoHelper(self._switch_settings.get_p4info())
 
-        # Queue that holds all packets which will be send out
-        self.packets_out_q = Queue() # type: Queue
+        # Queue that holds all packets which will be send out, it keeps
+        # them while the stream is down
+        self.packets_out_q = PacketOutQueue(self._switch_settings.get_packet_out_queue_size(),
+                self._switch_settings.get_packet_out_policy() == "block",
+                self._switch_settings.get_packet_out_block_timeout())
+        self._packet_out_drain = self._switch_settings.get_packet_out_drain()
+
+        # Currently open stream
+        self._stream = None # type: Optional[ _Stream ]
+        self._stream_lock = Lock()
 
-        # Thread on which the packets are send / received
+        # Thread which keeps the stream open, packets are send / received on it
         self.thread = None
+        self._closing = Event()
+
+        # Identifies the pipeline we have pushed, a switch which has been
+        # restarted reports another one
+        self._cookie = getrandbits(63)
 
         self.packet_in_listeners = set() # type: Set
+        self.idle_timeout_listeners = set() # type: Set
         self.connection_started = Event()
 
+        # Copy of all entries which are installed on the switch
+        self._shadow = ShadowStore()
+
+        # Pipeline which combines updates into multi-update write requests
+        self._pipeline = WritePipeline(self.logger, self._get_write_request,
+                self._send_write_request, self._shadow.apply,
+                self._switch_settings.get_write_batch_size(),
+                self._switch_settings.get_write_batch_delay(),
+                self._switch_settings.get_write_max_in_flight())
+        self._batch = local()
+
+    def _init_metrics(self, metrics: Registry) -> None:
+        self._write_requests = metrics.counter("p4sec_switch_write_requests_total",
+                "Write requests sent to the switch.", [ "code" ])
+        self._write_updates = metrics.counter("p4sec_switch_write_updates_total",
+                "Updates sent to the switch.")
+        self._write_duration = metrics.histogram("p4sec_switch_write_seconds",
+                "Time until the switch answered a write request.")
+        self._read_requests = metrics.counter("p4sec_switch_read_requests_total",
+                "Read requests sent to the switch.")
+        self._packet_ins = metrics.counter("p4sec_switch_packet_ins_total",
+                "Packets in received from the switch.")
+        self._idle_timeouts = metrics.counter("p4sec_switch_idle_timeouts_total",
+                "Table entries reported idle by the switch.")
+        self._reconnects = metrics.counter("p4sec_switch_reconnects_total",
+                "Streams to the switch which have been reopened.")
+        metrics.gauge("p4sec_switch_connected", "Whether the stream to the switch is up.") \
+                .set_function(lambda: int(self.is_connected()))
+
+        packet_out = metrics.gauge("p4sec_switch_packet_out_queue",
+                "Statistics of the packet out queue, latencies in seconds.", [ "statistic" ])
+        for name in [ "depth", "max_depth", "enqueued", "dropped", "latency_avg", "latency_max" ]:
+            packet_out.labels(name).set_function(
+                    lambda name=name: self.packets_out_q.get_statistics()[name])
+
     def _get_write_request(self):
         # Construct request
         request = WriteRequest()
@@ -71,66 +139,158 @@ class SwitchConnection:
     def get_num_ports(self):
         return self._switch_settings.get_num_ports()
 
-    def write_table_entry(self, table_entry):
-        self.logger.debug("Write table entry", 4)
-        request = self._get_write_request()
-
-        update = request.updates.add()
-        update.type = Update.INSERT
+    def _send_write_request(self, request):
+        start = perf_counter()
+        self._write_updates.inc(len(request.updates))
+
+        def observe(future) -> None:
+            self._write_duration.observe(perf_counter() - start)
+            error = future.exception()
+            if error is None:
+                code = "OK"
+            else:
+                code = error.code().name if isinstance(error, grpc.RpcError) else "UNKNOWN"
+            self._write_requests.labels(code).inc()
+
+        future = self.stub.Write.future(request)
+        future.add_done_callback(observe)
+        return future
+
+    def _submit(self, update, wait: bool = True) -> PendingUpdate:
+        """
+        Queue an update in the write pipeline.
+        If wait is false, the update is sent with the next write request
+        and the caller has to track the returned handle itself.
+        """
+        pending = self._pipeline.submit(update)
+
+        if not wait:
+            pass
+        elif self.in_batch():
+            self._batch.pendings.append(pending)
+        else:
+            self._pipeline.flush()
+            pending.result()
+
+        return pending
+
+    def _submit_table_entry(self, type_, table_entry, wait: bool = True) -> PendingUpdate:
+        update = Update()
+        update.type = type_
         update.entity.table_entry.CopyFrom(table_entry)
+        return self._submit(update, wait)
+
+    def in_batch(self) -> bool:
+        return getattr(self._batch, "depth", 0) > 0
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect all writes of the current thread and send them with as few
+        write requests as possible. Errors are raised when the outermost
+        batch is left.
+        """
+        if not self.in_batch():
+            self._batch.depth = 0
+            self._batch.pendings = [ ] # type: List[ PendingUpdate ]
+
+        self._batch.depth += 1
+        try:
+            yield
+        finally:
+            self._batch.depth -= 1
+
+        if self._batch.depth == 0:
+            pendings = self._batch.pendings
+            self._batch.pendings = [ ]
+            self._pipeline.flush()
+
+            errors = [ pending.get_error() for pending in pendings
+                    if pending.wait() and pending.get_error() is not None ]
+            if len(errors) > 0:
+                raise errors[0]
+
+    @contextmanager
+    def collect(self):
+        """
+        Yield a list which receives the handles of all writes of the block,
+        such that their errors can be checked one by one after the
+        surrounding batch has been left.
+        """
+        assert self.in_batch(), "Writes can only be collected inside of a batch."
+
+        pendings = [ ] # type: List[ PendingUpdate ]
+        start = len(self._batch.pendings)
+        try:
+            yield pendings
+        finally:
+            pendings.extend(self._batch.pendings[start:])
 
-        # write
-        self.stub.Write(request)
-
+    def write_table_entry(self, table_entry, wait: bool = True):
+        self.logger.debug("Write table entry", 4)
+        return self._submit_table_entry(Update.INSERT, table_entry, wait)
 
-    def write(self, table_name, match_fields, action_name, action_params={}):
+    def write(self, table_name, match_fields, action_name, action_params={}, wait: bool = True):
         entry = self.helper.buildTableEntry( \
                 table_name, match_fields, action_name, action_params)
-        self.write_table_entry(entry)
+        return self.write_table_entry(entry, wait)
 
     def update_table_entries(self, table_entries):
         self.logger.debug("Update table entries", 4)
-        request = self._get_write_request()
 
         #TODO this should be added, however it is not supported yet.
         # request.atomicity = WriteRequest.Atomicity.DATAPLANE_ATOMIC
 
-        for table_entry in table_entries:
-            update = request.updates.add()
-            update.type = Update.MODIFY
-            update.entity.table_entry.CopyFrom(table_entry)
+        with self.batch():
+            for table_entry in table_entries:
+                self._submit_table_entry(Update.MODIFY, table_entry)
 
-        self.stub.Write(request)
-
-    def update_table_entry(self, table_entry):
+    def update_table_entry(self, table_entry, wait: bool = True):
         self.logger.debug("Update table entry", 4)
-        request = self._get_write_request()
+        return self._submit_table_entry(Update.MODIFY, table_entry, wait)
 
-        update = request.updates.add()
-        update.type = Update.MODIFY
+    def update(self, table_name, match_fields, action_name, action_params={}, wait: bool = True):
+        entry = self.helper.buildTableEntry( \
+                table_name, match_fields, action_name, action_params)
+        return self.update_table_entry(entry, wait)
+
+    def upsert_table_entry(self, table_entry, wait: bool = True) -> PendingUpdate:
+        """
+        Insert the entry or modify the installed entry with the same match key.
+        Nothing is written if the installed entry has the same action already.
+        """
+        update = Update()
         update.entity.table_entry.CopyFrom(table_entry)
 
-        # write
-        self.stub.Write(request)
-
-    def update(self, table_name, match_fields, action_name, action_params={}):
+        # an update of the current batch may not have been written yet
+        queued = self._pipeline.get_queued(update)
+        if queued is None:
+            installed = self._shadow.get(table_entry)
+        elif queued.type != Update.DELETE:
+            installed = queued.entity.table_entry
+        else:
+            installed = None
+
+        if installed is not None and get_action_key(installed) == get_action_key(table_entry):
+            pending = PendingUpdate(update)
+            pending.resolve()
+            return pending
+
+        self.logger.debug("Upsert table entry", 4)
+        update.type = Update.MODIFY if installed is not None else Update.INSERT
+        return self._submit(update, wait)
+
+    def upsert(self, table_name, match_fields, action_name, action_params={}, wait: bool = True):
         entry = self.helper.buildTableEntry( \
                 table_name, match_fields, action_name, action_params)
-        self.update_table_entry(entry)
+        return self.upsert_table_entry(entry, wait)
 
-    def delete(self, table_name, match_fields):
+    def delete(self, table_name, match_fields, wait: bool = True):
         entry = self.helper.buildTableEntry(table_name, match_fields)
-        self.delete_table_entry(entry)
-
-    def delete_table_entry(self, table_entry):
-        request = self._get_write_request()
-
-        update = request.updates.add()
-        update.type = Update.DELETE
-        update.entity.table_entry.CopyFrom(table_entry)
+        return self.delete_table_entry(entry, wait)
 
-        # delete
-        self.stub.Write(request)
+    def delete_table_entry(self, table_entry, wait: bool = True):
+        return self._submit_table_entry(Update.DELETE, table_entry, wait)
 
     def read_table_entry(self, table_id):
         # request
@@ -143,8 +303,81 @@ class SwitchConnection:
         table_entry.table_id = table_id
 
         # read
+        self._read_requests.inc()
         return self.stub.Read(request)
 
+    def _submit_multicast_group(self, type_, group_id: int, ports=()) -> PendingUpdate:
+        update = Update()
+        update.type = type_
+        entry = update.entity.packet_replication_engine_entry.multicast_group_entry
+        entry.multicast_group_id = group_id
+        for port in ports:
+            replica = entry.replicas.add()
+            replica.egress_port = port
+            replica.instance = 0
+        return self._submit(update)
+
+    def write_multicast_group(self, group_id: int, ports) -> PendingUpdate:
+        self.logger.debug("Write multicast group " + str(group_id), 4)
+        return self._submit_multicast_group(Update.INSERT, group_id, ports)
+
+    def update_multicast_group(self, group_id: int, ports) -> PendingUpdate:
+        self.logger.debug("Update multicast group " + str(group_id), 4)
+        return self._submit_multicast_group(Update.MODIFY, group_id, ports)
+
+    def delete_multicast_group(self, group_id: int) -> PendingUpdate:
+        self.logger.debug("Delete multicast group " + str(group_id), 4)
+        return self._submit_multicast_group(Update.DELETE, group_id)
+
+    def _submit_action_profile_member(self, type_, profile_id: int, member_id: int,
+            action=None) -> PendingUpdate:
+        update = Update()
+        update.type = type_
+        member = update.entity.action_profile_member
+        member.action_profile_id = profile_id
+        member.member_id = member_id
+        if action is not None:
+            member.action.CopyFrom(action)
+        return self._submit(update)
+
+    def write_action_profile_member(self, profile_id: int, member_id: int, action) -> PendingUpdate:
+        self.logger.debug("Write action profile member " + str(member_id), 4)
+        return self._submit_action_profile_member(Update.INSERT, profile_id, member_id, action)
+
+    def update_action_profile_member(self, profile_id: int, member_id: int, action) -> PendingUpdate:
+        self.logger.debug("Update action profile member " + str(member_id), 4)
+        return self._submit_action_profile_member(Update.MODIFY, profile_id, member_id, action)
+
+    def delete_action_profile_member(self, profile_id: int, member_id: int) -> PendingUpdate:
+        self.logger.debug("Delete action profile member " + str(member_id), 4)
+        return self._submit_action_profile_member(Update.DELETE, profile_id, member_id)
+
+    def _submit_action_profile_group(self, type_, profile_id: int, group_id: int,
+            member_ids=()) -> PendingUpdate:
+        update = Update()
+        update.type = type_
+        group = update.entity.action_profile_group
+        group.action_profile_id = profile_id
+        group.group_id = group_id
+        for member_id in member_ids:
+            member = group.members.add()
+            member.member_id = member_id
+            member.weight = 1
+        return self._submit(update)
+
+    def write_action_profile_group(self, profile_id: int, group_id: int, member_ids) -> PendingUpdate:
+        """ Write a group of members, the members must have been written before. """
+        self.logger.debug("Write action profile group " + str(group_id), 4)
+        return self._submit_action_profile_group(Update.INSERT, profile_id, group_id, member_ids)
+
+    def update_action_profile_group(self, profile_id: int, group_id: int, member_ids) -> PendingUpdate:
+        self.logger.debug("Update action profile group " + str(group_id), 4)
+        return self._submit_action_profile_group(Update.MODIFY, profile_id, group_id, member_ids)
+
+    def delete_action_profile_group(self, profile_id: int, group_id: int) -> PendingUpdate:
+        self.logger.debug("Delete action profile group " + str(group_id), 4)
+        return self._submit_action_profile_group(Update.DELETE, profile_id, group_id)
+
     def write_register(self, name: str, index: int, value: int) -> None:
         try:
             entry = RegisterEntry(
@@ -152,33 +385,80 @@ class SwitchConnection:
                 index=Index(index=0),
                 data=P4Data(bitstring=bytes(bytearray([0, 0, 0, 0])))
             )
-            request = self._get_write_request()
-
-            update = request.updates.add()
+            update = Update()
             update.type = Update.INSERT
             update.entity.register_entry.CopyFrom(entry)
 
-            self.stub.Write(request)
+            self._submit(update)
         except:
             raise Exception("Not supported by P4Runtime yet.")
 
     def read_table(self, table_name):
+        """ Read the installed entries of a table without asking the switch. """
         table_id = self.helper.get_tables_id(table_name)
-        return self.read_table_entry(table_id)
+        return self._shadow.get_table(table_id)
+
+    def get_installed_entry(self, table_entry):
+        """ Get the installed entry with the same match key or None. """
+        return self._shadow.get(table_entry)
+
+    def has_table_entry(self, table_entry) -> bool:
+        return self._shadow.has(table_entry)
+
+    def reconcile(self, table_name=None) -> None:
+        """ Replace the recorded entries of a table (default all) with the state of the switch. """
+        self.logger.debug("Reconcile installed table entries", 3)
+        table_id = self.helper.get_tables_id(table_name) if table_name is not None else 0
+
+        # writes in flight would be missed by the read, new ones would be lost by the replace
+        with self._pipeline.pause():
+            self._pipeline.wait_idle()
+
+            table_entries = [ entity.table_entry for response in self.read_table_entry(table_id)
+                    for entity in response.entities ]
+            differences = self._shadow.replace(table_entries, table_id)
+
+        if differences > 0:
+            self.logger.warn("Installed table entries differed from the switch: "
+                    + str(differences))
 
     def send(self, packet: Ether, port: int) -> None:
         cpu = CPUPacket(reason="SEND_DIRECT", port=port)
         packet.src = self._settings.get_mac()
         self.send_packet_out(bytes(cpu / packet))
 
+    def _put_packet_out(self, item) -> None:
+        """ Queue a request or a list of requests. """
+        if not self.packets_out_q.put(item):
+            self.logger.debug("Packet out queue full, dropped packet out", 4)
+
+    def get_packet_out_statistics(self):
+        return self.packets_out_q.get_statistics()
+
+    def is_connected(self) -> bool:
+        stream = self._stream
+        return stream is not None and stream.ready.is_set() and not stream.closed.is_set()
+
     def send_packet_out(self, payload):
         request = StreamMessageRequest()
         request.packet.payload = payload
-        self.packets_out_q.put(request)
+        self._put_packet_out(request)
 
     def send_packets_out(self, payloads):
+        """ Enqueue several packets at once, they are sent in order. """
+        requests = [ ] # type: List[ StreamMessageRequest ]
         for payload in payloads:
-            self.send_packet_out(payload)
+            request = StreamMessageRequest()
+            request.packet.payload = payload
+            requests.append(request)
+
+        if len(requests) > 0:
+            self._put_packet_out(requests)
+
+    def flood(self, ethernet: bytes, exclude: int = 0, first: int = 1) -> None:
+        """ Send an ethernet frame out on every port from first on except exclude. """
+        self.send_packets_out(build_flood(ethernet,
+            [ port for port in range(first, self.get_num_ports()) if port != exclude ]))
 
     def listen_packet_in(self, callback):
         self.packet_in_listeners.add(callback)
@@ -186,38 +466,204 @@ class SwitchConnection:
     def unlisten_packet_in(self, callback):
         self.packet_in_listeners.remove(callback)
 
-    def _notify_listeners(self, packet):
-        for handler in self.packet_in_listeners:
+    def listen_idle_timeout(self, callback):
+        """ The callback receives the list of table entries which have timed out. """
+        self.idle_timeout_listeners.add(callback)
+
+    def unlisten_idle_timeout(self, callback):
+        self.idle_timeout_listeners.remove(callback)
+
+    def _notify_listeners(self, packet, listeners=None):
+        for handler in self.packet_in_listeners if listeners is None else listeners:
             try:
                 handler(packet)
             except Exception as e:
                 traceback.print_exc()
                 self.logger.warn("Unexpected exception occured: " + str(e))
 
-    def _packet_out_iterator(self):
-        # Check if packet is in the queue -> it will be send out via the StreamChannel
-        while True:
-            packet = self.packets_out_q.get(block=True)
-            if isinstance(packet, CloseConnection):
+    def _packet_out_iterator(self, stream: _Stream):
+        yield self._get_arbitration_request()
+
+        # packets out are kept until the switch is ready
+        stream.ready.wait()
+
+        while not stream.closed.is_set():
+            items = self.packets_out_q.get_many(self._packet_out_drain)
+            if stream.closed.is_set():
+                # the items belong to the next stream
+                self.packets_out_q.requeue(items)
                 break
-            yield packet
+
+            for item in items:
+                if isinstance(item, list):
+                    # bulk enqueued by send_packets_out
+                    yield from item
+                else:
+                    yield item
 
     def _handle_packet_in(self, stream):
         for response in stream:
-            if response.packet:
+            update = response.WhichOneof("update")
+            if update == "packet":
+                self._packet_ins.inc()
                 self._notify_listeners(response.packet)
+            elif update == "idle_timeout_notification":
+                # all entries which timed out since the last notification
+                entries = list(response.idle_timeout_notification.table_entry)
+                self._idle_timeouts.inc(len(entries))
+                self.logger.debug("Idle timeout of " + str(len(entries)) + " entries", 4)
+                self._notify_listeners(entries, self.idle_timeout_listeners)
+            elif update == "arbitration" and response.arbitration.status.code != OK:
+                self.logger.warn("Lost mastership of the switch: "
+                        + response.arbitration.status.message)
+
+    def _get_arbitration_request(self):
+        request = StreamMessageRequest()
+        request.arbitration.device_id = self._switch_settings.get_device_id()
+        request.arbitration.election_id.high = 0
+        request.arbitration.election_id.low = 1
+        return request
 
-    def _start_stream(self):
-        self.logger.debug("Starting stream to switch", 3)
+    def _open_stream(self, state: _Stream):
+        """ Open a stream and become master. """
+        stream = self.stub.StreamChannel(self._packet_out_iterator(state))
 
         try:
-            stream = self.stub.StreamChannel(self._packet_out_iterator())
-            self.connection_started.set()
-            self._handle_packet_in(stream)
+            for response in stream:
+                if response.WhichOneof("update") == "arbitration":
+                    break
+            else:
+                raise ArbitrationException("Stream closed by the switch")
+
+            if response.arbitration.status.code != OK:
+                raise ArbitrationException(response.arbitration.status.message)
+        except:
+            self._close_stream(state)
+            raise
+
+        return stream
+
+    def _close_stream(self, state: _Stream) -> None:
+        state.close()
+        # the iterator of the stream may wait for packets
+        self.packets_out_q.wake()
+
+    def _reopen_channel(self) -> None:
+        self._channel.close()
+        self._channel = grpc.insecure_channel(self._switch_settings.get_address())
+        self.stub = P4RuntimeStub(self._channel)
+
+    def _get_cookie(self) -> Optional[ int ]:
+        """ Cookie of the pipeline of the switch, None if it has none. """
+        request = GetForwardingPipelineConfigRequest()
+        request.device_id = self._switch_settings.get_device_id()
+        request.response_type = GetForwardingPipelineConfigRequest.COOKIE_ONLY
+        try:
+            return self.stub.GetForwardingPipelineConfig(request).config.cookie.cookie
         except grpc.RpcError:
-            self.logger.error("Stream to switch broken. Cannot read packages.")
+            return None
+
+    def _replay(self) -> None:
+        """ Write all recorded groups, members and entries to the switch again. """
+        groups = self._shadow.get_multicast_groups()
+        members = self._shadow.get_action_profile_members()
+        profile_groups = self._shadow.get_action_profile_groups()
+        table_entries = self._shadow.get_all()
+        self.logger.info("Replaying " + str(len(table_entries)) + " table entries, "
+                + str(len(groups)) + " multicast groups and "
+                + str(len(members) + len(profile_groups)) + " action profile members and groups.")
+
+        pendings = [ ] # type: List[ PendingUpdate ]
+        for group in groups:
+            update = Update()
+            update.type = Update.INSERT
+            update.entity.packet_replication_engine_entry.multicast_group_entry.CopyFrom(group)
+            pendings.append(self._pipeline.submit(update))
+
+        for member in members:
+            update = Update()
+            update.type = Update.INSERT
+            update.entity.action_profile_member.CopyFrom(member)
+            pendings.append(self._pipeline.submit(update))
+
+        # members must exist before they are grouped, groups before they are referenced
+        self._pipeline.wait_idle()
+
+        for profile_group in profile_groups:
+            update = Update()
+            update.type = Update.INSERT
+            update.entity.action_profile_group.CopyFrom(profile_group)
+            pendings.append(self._pipeline.submit(update))
 
-    def _init_forwarding_pipeline(self):
+        self._pipeline.wait_idle()
+
+        for table_entry in table_entries:
+            update = Update()
+            update.type = Update.INSERT
+            update.entity.table_entry.CopyFrom(table_entry)
+            pendings.append(self._pipeline.submit(update))
+
+        self._pipeline.wait_idle()
+
+        failed = [ pending for pending in pendings if pending.get_error() is not None ]
+        if len(failed) > 0:
+            self.logger.warn("Could not replay " + str(len(failed)) + " updates: "
+                    + str(failed[0].get_error()))
+
+    def _recover(self) -> None:
+        """ Bring a reconnected switch back to the recorded state. """
+        if self._get_cookie() == self._cookie:
+            self.logger.info("Switch kept its pipeline, nothing to replay.")
+            return
+
+        self.logger.warn("Switch lost its pipeline.")
+        self._set_forwarding_pipeline()
+        self._replay()
+
+    def _start_stream(self):
+        """ Keep a stream to the switch open until the connection is closed. """
+        initial_backoff = self._switch_settings.get_reconnect_backoff()
+        max_backoff = self._switch_settings.get_reconnect_max_backoff()
+
+        backoff = initial_backoff
+        reconnect = False
+        while not self._closing.is_set():
+            self.logger.debug("Starting stream to switch", 3)
+            state = _Stream()
+            with self._stream_lock:
+                # disconnect closes the stream under the same lock
+                if self._closing.is_set():
+                    break
+                self._stream = state
+            try:
+                stream = self._open_stream(state)
+                if reconnect:
+                    self._reconnects.inc()
+                    self._recover()
+                    self.logger.info("Reconnected to switch.")
+
+                state.ready.set()
+                self.connection_started.set()
+                backoff = initial_backoff
+                reconnect = True
+
+                self._handle_packet_in(stream)
+            except grpc.RpcError as e:
+                self.logger.error("Stream to switch broken: " + str(e.code()))
+            except ArbitrationException as e:
+                self.logger.error(str(e))
+            finally:
+                self._close_stream(state)
+
+            if self._closing.is_set():
+                break
+
+            self.logger.warn("Reconnecting to switch in " + str(backoff) + "s.")
+            self._closing.wait(backoff)
+            backoff = min(backoff * 2, max_backoff)
+            self._reopen_channel()
+
+    def _set_forwarding_pipeline(self):
         self.logger.debug("initializing forwarding pipeline", 3)
 
         device_config = P4DeviceConfig()
@@ -229,25 +675,21 @@ class SwitchConnection:
         # Request
         request = SetForwardingPipelineConfigRequest()
         request.device_id = self._switch_settings.get_device_id()
-        request.config.p4info.CopyFrom(P4InfoHelper(self._switch_settings.get_p4info()).p4info)
+        request.config.p4info.CopyFrom(self.helper.p4info)
         request.config.p4_device_config = device_config.SerializeToString()
+        request.config.cookie.cookie = self._cookie
         request.action = SetForwardingPipelineConfigRequest.VERIFY_AND_COMMIT
 
         # Send to switch
         self.stub.SetForwardingPipelineConfig(request)
 
-        self.logger.debug("send init to switch", 3)
-        request = StreamMessageRequest()
-        request.arbitration.device_id = self._switch_settings.get_device_id()
-        request.arbitration.election_id.high = 0
-        request.arbitration.election_id.low = 1
-        self.packets_out_q.put(request)
-
     def connect(self):
         self.logger.info("Connecting to switch.")
 
-        self._init_forwarding_pipeline()
+        self._set_forwarding_pipeline()
+        self._pipeline.start()
 
+        self._closing.clear()
         self.connection_started.clear()
         self.thread = Thread(target=self._start_stream)
         self.thread.start()
@@ -257,7 +699,11 @@ class SwitchConnection:
         self.logger.debug("Disconnecting from switch.", 3)
         assert self.thread != None, "You have not started the switch connection."
 
-        self.packets_out_q.put(CloseConnection())
+        self._closing.set()
+        self._pipeline.stop()
+        with self._stream_lock:
+            if self._stream is not None:
+                self._close_stream(self._stream)
 
         self.thread.join()
 
@@ -0,0 +1,86 @@
+from p4.v1 import p4runtime_pb2 # type: ignore
+from p4.config.v1 import p4info_pb2 # type: ignore
+
+
+def _exact_setter(index, encode):
+    def set_exact(entry, value):
+        entry.match[index].exact.value = encode(value)
+    return set_exact
+
+def _lpm_setter(index, encode):
+    def set_lpm(entry, value):
+        lpm = entry.match[index].lpm
+        lpm.value = encode(value[0])
+        lpm.prefix_len = value[1]
+    return set_lpm
+
+def _ternary_setter(index, encode):
+    def set_ternary(entry, value):
+        ternary = entry.match[index].ternary
+        ternary.value = encode(value[0])
+        ternary.mask = encode(value[1])
+    return set_ternary
+
+def _range_setter(index, encode):
+    def set_range(entry, value):
+        range_ = entry.match[index].range
+        range_.low = encode(value[0])
+        range_.high = encode(value[1])
+    return set_range
+
+_match_setters = {
+    p4info_pb2.MatchField.EXACT: _exact_setter,
+    p4info_pb2.MatchField.LPM: _lpm_setter,
+    p4info_pb2.MatchField.TERNARY: _ternary_setter,
+    p4info_pb2.MatchField.RANGE: _range_setter
+}
+
+class TableEntryTemplate(object):
+    """
+    Table entry of a fixed table, match fields, action and params.
+    All names and encoders are resolved when the template is compiled,
+    building an entry only encodes the values into a pre-serialized
+    skeleton.
+    """
+
+    def __init__(self, table, match_fields, match_encoders, action=None, params=(),
+            param_encoders=()):
+        self._table_id = table.preamble.id
+
+        skeleton = p4runtime_pb2.TableEntry()
+        skeleton.table_id = self._table_id
+
+        self._match_setters = []
+        for index, (match_field, encode) in enumerate(zip(match_fields, match_encoders)):
+            if match_field.match_type not in _match_setters:
+                raise Exception("Unsupported match type with type %r" % match_field.match_type)
+            skeleton.match.add().field_id = match_field.id
+            self._match_setters.append(_match_setters[match_field.match_type](index, encode))
+
+        self._param_encoders = list(param_encoders)
+        if action is not None:
+            skeleton.action.action.action_id = action.preamble.id
+            for param in params:
+                skeleton.action.action.params.add().param_id = param.id
+
+        self._skeleton = skeleton.SerializeToString()
+
+    def get_table_id(self):
+        return self._table_id
+
+    def build(self, match_values, param_values=()):
+        """ Build a table entry from values in the order of the compiled names. """
+        assert len(match_values) == len(self._match_setters), "Wrong number of match values"
+        assert len(param_values) == len(self._param_encoders), "Wrong number of param values"
+
+        table_entry = p4runtime_pb2.TableEntry()
+        table_entry.ParseFromString(self._skeleton)
+
+        for set_match, value in zip(self._match_setters, match_values):
+            set_match(table_entry, value)
+
+        params = table_entry.action.action.params
+        for index, (encode, value) in enumerate(zip(self._param_encoders, param_values)):
+            params[index].value = encode(value)
+
+        return table_entry
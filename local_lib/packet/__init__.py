@@ -1,2 +1,5 @@
 from local_lib.packet.cpu import CPUPacket, Config, Notification, notification_types
+from local_lib.packet.fast import FastPacket
+from local_lib.packet.dispatcher import PacketDispatcher
+from local_lib.packet.admission import Admission
 from local_lib.packet.processor import PacketProcessor
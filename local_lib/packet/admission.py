@@ -0,0 +1,90 @@
+# local
+from local_lib.packet.cpu import notification_types
+
+# other
+from time import monotonic
+from typing import Dict, Tuple
+
+class TokenBucket:
+    """ Allows rate events per second with bursts of up to burst events. """
+
+    __slots__ = [ "_rate", "_burst", "_tokens", "_last" ]
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._last = monotonic()
+
+    def has(self, now: float) -> bool:
+        """ Refill the bucket and check if a token is left without taking it. """
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+        return self._tokens >= 1
+
+    def take(self, now: float) -> bool:
+        if not self.has(now):
+            return False
+
+        self._tokens -= 1
+        return True
+
+class Admission:
+    """
+    Admission control of packets in.
+    Every notification type has a token bucket, and so has every
+    notification type on every ingress port, such that a storm on one
+    port cannot use up the budget of the others. Packets are only
+    admitted if both buckets have a token left.
+    """
+
+    def __init__(self,
+            type_rate: float,
+            type_burst: float,
+            port_rate: float,
+            port_burst: float
+        ) -> None:
+        self._type_rate = type_rate
+        self._type_burst = type_burst
+        self._port_rate = port_rate
+        self._port_burst = port_burst
+
+        self._type_buckets = dict() # type: Dict[ int, TokenBucket ]
+        self._port_buckets = dict() # type: Dict[ Tuple[ int, int ], TokenBucket ]
+
+        self._admitted = dict() # type: Dict[ int, int ]
+        self._dropped = dict() # type: Dict[ int, int ]
+
+    def admit(self, type_: int, port: int) -> bool:
+        """ Check if a notification may be handled, it is counted either way. """
+        now = monotonic()
+
+        port_bucket = self._port_buckets.get((type_, port))
+        if port_bucket is None:
+            port_bucket = TokenBucket(self._port_rate, self._port_burst)
+            self._port_buckets[(type_, port)] = port_bucket
+
+        type_bucket = self._type_buckets.get(type_)
+        if type_bucket is None:
+            type_bucket = TokenBucket(self._type_rate, self._type_burst)
+            self._type_buckets[type_] = type_bucket
+
+        # a packet dropped by one bucket must not use up the other one
+        if port_bucket.has(now) and type_bucket.has(now):
+            port_bucket.take(now)
+            type_bucket.take(now)
+            self._admitted[type_] = self._admitted.get(type_, 0) + 1
+            return True
+
+        self._dropped[type_] = self._dropped.get(type_, 0) + 1
+        return False
+
+    def get_admitted(self) -> Dict[ str, int ]:
+        """ Number of admitted packets by notification type. """
+        return dict((notification_types.get(type_, str(type_)), count)
+                for type_, count in list(self._admitted.items()))
+
+    def get_dropped(self) -> Dict[ str, int ]:
+        """ Number of dropped packets by notification type. """
+        return dict((notification_types.get(type_, str(type_)), count)
+                for type_, count in list(self._dropped.items()))
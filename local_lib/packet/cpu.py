@@ -10,7 +10,8 @@ cpu_reason_types = {
     1: "NOTIFICATION",
     2: "CONFIG",
     3: "SEND",
-    4: "SEND_DIRECT"
+    4: "SEND_DIRECT",
+    5: "FLOOD"
 }
 
 class CPUPacket(Packet):
@@ -0,0 +1,73 @@
+# common
+from common_lib.logger import Logger
+
+# other
+from queue import Queue, Full
+from threading import Thread, Lock
+from typing import Any, Callable, Hashable, List
+import traceback
+
+class PacketDispatcher:
+    """
+    Runs packet in handlers on a pool of worker threads.
+    Packets with the same key are handled by the same worker in the order
+    they were dispatched. The queue of each worker is bounded, packets
+    which do not fit are dropped and counted.
+    """
+
+    def __init__(self, logger: Logger, workers: int, queue_size: int) -> None:
+        self._logger = logger
+        self._queues = [ Queue(maxsize=queue_size) for i in range(workers) ] # type: List[ Queue ]
+        self._threads = [ ] # type: List[ Thread ]
+
+        self._lock = Lock()
+        self._dropped = [ 0 ] * workers
+
+    def get_num_workers(self) -> int:
+        return len(self._queues)
+
+    def dispatch(self, key: Hashable, handler: Callable[ [ Any ], None ], packet: Any) -> bool:
+        """ Queue the handling of a packet, returns false if it has been dropped. """
+        index = hash(key) % len(self._queues)
+        try:
+            self._queues[index].put_nowait((handler, packet))
+            return True
+        except Full:
+            with self._lock:
+                self._dropped[index] += 1
+            return False
+
+    def get_dropped(self) -> int:
+        """ Number of packets dropped because the queue of their worker was full. """
+        with self._lock:
+            return sum(self._dropped)
+
+    def get_queue_sizes(self) -> List[ int ]:
+        return [ queue.qsize() for queue in self._queues ]
+
+    def _run(self, queue: Queue) -> None:
+        while True:
+            item = queue.get(block=True)
+            if item is None:
+                break
+
+            handler, packet = item
+            try:
+                handler(packet)
+            except Exception as e:
+                traceback.print_exc()
+                self._logger.warn("Unexpected exception occured: " + str(e))
+
+    def start(self) -> None:
+        self._threads = [ Thread(target=self._run, args=(queue, )) for queue in self._queues ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        assert len(self._threads) > 0, "You have not started the packet dispatcher."
+        for queue in self._queues:
+            # do not drop the stop signal on a full queue
+            queue.put(None, block=True)
+        for thread in self._threads:
+            thread.join()
+        self._threads = [ ]
@@ -0,0 +1,121 @@
+# local
+from local_lib.packet.cpu import CPUPacket, cpu_reason_types, notification_types
+
+# other
+from struct import Struct
+from typing import Iterable, List, Optional
+
+def _get_id(types, name: str) -> int:
+    return next(id_ for id_, type_ in types.items() if type_ == name)
+
+REASON_NOTIFICATION = _get_id(cpu_reason_types, "NOTIFICATION")
+REASON_SEND = _get_id(cpu_reason_types, "SEND")
+REASON_SEND_DIRECT = _get_id(cpu_reason_types, "SEND_DIRECT")
+REASON_FLOOD = _get_id(cpu_reason_types, "FLOOD")
+
+# notification type by name, e.g. NOTIFICATION_TYPES["ARP"]
+NOTIFICATION_TYPES = dict((name, id_) for id_, name in notification_types.items())
+
+# reason, port, timestamp (48 bit), switched_mac_src_with_dst
+CPU_HEADER = Struct("!BHHIB")
+
+# type, index
+NOTIFICATION_HEADER = Struct("!BI")
+
+# port field of the cpu header
+CPU_PORT = Struct("!H")
+CPU_PORT_OFFSET = 1
+
+# dst, src, type
+ETHERNET_HEADER = Struct("!6s6sH")
+
+def format_mac(data: bytes) -> str:
+    return ":".join("%02x" % byte for byte in data)
+
+def parse_mac(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(":", ""))
+
+def pack_cpu_header(reason: int, port: int = 0, timestamp: int = 0) -> bytes:
+    """ Build the cpu header of a packet out without scapy. """
+    return CPU_HEADER.pack(reason, port, (timestamp >> 32) & 0xffff, timestamp & 0xffffffff, 0)
+
+def pack_ethernet_header(dst: str, src: str, type_: int) -> bytes:
+    return ETHERNET_HEADER.pack(parse_mac(dst), parse_mac(src), type_)
+
+def build_flood(ethernet: bytes, ports: Iterable[ int ], reason: int = REASON_SEND_DIRECT) -> List[ bytes ]:
+    """
+    Build the packets out of an ethernet frame for several ports.
+    The cpu header is packed once, only its port is patched per port.
+    """
+    header = bytearray(pack_cpu_header(reason))
+    packets = [ ] # type: List[ bytes ]
+    for port in ports:
+        CPU_PORT.pack_into(header, CPU_PORT_OFFSET, port)
+        packets.append(bytes(header) + ethernet)
+    return packets
+
+class FastPacket:
+    """
+    Packet in which is parsed with struct as far as the fixed cpu and
+    notification headers. The ethernet frame is kept as bytes, the
+    scapy packet is only dissected on demand.
+    """
+
+    __slots__ = [ "_payload", "_offset", "reason", "port", "timestamp", "flags",
+            "type", "index", "_cpu" ]
+
+    def __init__(self, payload: bytes) -> None:
+        self._payload = payload
+
+        reason, port, timestamp_high, timestamp_low, flags = CPU_HEADER.unpack_from(payload)
+        self.reason = reason
+        self.port = port
+        self.timestamp = (timestamp_high << 32) | timestamp_low
+        self.flags = flags
+
+        self._offset = CPU_HEADER.size
+        self.type = None # type: Optional[ int ]
+        self.index = None # type: Optional[ int ]
+        if reason == REASON_NOTIFICATION:
+            self.type, self.index = NOTIFICATION_HEADER.unpack_from(payload, self._offset)
+            self._offset += NOTIFICATION_HEADER.size
+
+        self._cpu = None # type: Optional[ CPUPacket ]
+
+    @classmethod
+    def parse(Class, payload: bytes) -> Optional[ 'FastPacket' ]:
+        """ Parse a packet in, None if it is too short. """
+        if len(payload) < CPU_HEADER.size:
+            return None
+        if payload[0] == REASON_NOTIFICATION \
+                and len(payload) < CPU_HEADER.size + NOTIFICATION_HEADER.size:
+            return None
+        return Class(payload)
+
+    def is_notification(self) -> bool:
+        return self.type is not None
+
+    def get_ethernet(self) -> bytes:
+        """ Get the encapsulated ethernet frame. """
+        return self._payload[self._offset:]
+
+    def get_dst(self) -> str:
+        return format_mac(self._payload[self._offset:self._offset + 6])
+
+    def get_src(self) -> str:
+        return format_mac(self._payload[self._offset + 6:self._offset + 12])
+
+    def get_cpu(self) -> CPUPacket:
+        """ Dissect the packet with scapy, the result is cached. """
+        if self._cpu is None:
+            self._cpu = CPUPacket(self._payload)
+        return self._cpu
+
+    def __getitem__(self, layer):
+        return self.get_cpu()[layer]
+
+    def __str__(self) -> str:
+        return "FastPacket(reason=" + str(self.reason) + \
+                ", port=" + str(self.port) + \
+                ", type=" + str(self.type) + \
+                ", index=" + str(self.index) + ")"
@@ -1,59 +1,131 @@
 # common
 from common_lib.logger import Logger
+from common_lib.metrics import Registry
 
 # local
-from local_lib.packet import CPUPacket, Notification, notification_types
+from local_lib.packet.cpu import notification_types
+from local_lib.packet.fast import FastPacket, NOTIFICATION_TYPES
+from local_lib.packet.dispatcher import PacketDispatcher
+from local_lib.packet.admission import Admission
 from local_lib.p4runtime_lib import SwitchConnection
 
+# other
+from typing import Callable, Dict, List, Tuple
+
 class PacketProcessor:
     def __init__(self,
             logger: Logger,
+            metrics: Registry,
+            dispatcher: PacketDispatcher,
+            admission: Admission,
             topology_manager,
             l2_manager,
             authenticator,
             macsec_manager,
-            ipsec_manager
+            ipsec_manager,
+            by_flow: bool = False
         ):
         self._logger = logger
+        self._dispatcher = dispatcher
+        self._admission = admission
         self._topology_manager = topology_manager
         self._l2_manager = l2_manager
         self._authenticator = authenticator
         self._macsec_manager = macsec_manager
         self._ipsec_manager = ipsec_manager
 
-    def process_packet(self, packet):
-        cpu = CPUPacket(packet.payload)
-        self._logger.info("Packet in -> " + str(cpu.summary()))
+        self._packet_ins = metrics.counter("p4sec_packet_ins_total",
+                "Notifications received from the switch.", [ "type" ])
+        self._dropped = metrics.counter("p4sec_packet_ins_dropped_total",
+                "Notifications which have not been handled.", [ "type", "reason" ])
+        metrics.gauge("p4sec_packet_dispatcher_queued", "Packets in waiting for a worker.") \
+                .set_function(lambda: sum(self._dispatcher.get_queue_sizes()))
+
+        # key l2 packets by (port, source mac) instead of their handler group
+        self._by_flow = by_flow
+
+        # group and handler by notification type, handlers which need
+        # the dissected packet ask for it with get_cpu
+        l2 = ("l2", self._l2_manager.process_packet)
+        macsec = ("macsec", self._handle_macsec)
+        ipsec = ("ipsec", self._handle_ipsec)
+        self._handlers = {
+            NOTIFICATION_TYPES["DST_MAC_UNKNOWN"]: l2,
+            NOTIFICATION_TYPES["SRC_MAC_UNKNOWN"]: l2,
+            NOTIFICATION_TYPES["CHANGED_L2_ENTRY"]: l2,
+            NOTIFICATION_TYPES["ARP"]: l2,
+            NOTIFICATION_TYPES["LLDP"]: ("topology", self._handle_lldp),
+            NOTIFICATION_TYPES["EAP"]: ("eap", self._handle_eap),
+            NOTIFICATION_TYPES["MACSEC_SOFT_PACKET_LIMIT"]: macsec,
+            NOTIFICATION_TYPES["MACSEC_HARD_PACKET_LIMIT"]: macsec,
+            NOTIFICATION_TYPES["IPSEC_SOFT_PACKET_LIMIT"]: ipsec,
+            NOTIFICATION_TYPES["IPSEC_HARD_PACKET_LIMIT"]: ipsec
+        } # type: Dict[ int, Tuple[ str, Callable[ [ FastPacket ], None ] ] ]
+
+    def _handle_lldp(self, packet: FastPacket) -> None:
+        self._topology_manager.handle_lldp(packet.get_cpu())
+
+    def _handle_eap(self, packet: FastPacket) -> None:
+        self._authenticator.handle_eapol(packet.get_cpu())
 
-        if not cpu.haslayer(Notification):
+    def _handle_macsec(self, packet: FastPacket) -> None:
+        self._macsec_manager.handle_notification(packet.get_cpu())
+
+    def _handle_ipsec(self, packet: FastPacket) -> None:
+        self._ipsec_manager.handle_notification(packet.get_cpu())
+
+    def _dispatch(self, group: str, handler: Callable[ [ FastPacket ], None ], \
+            packet: FastPacket) -> None:
+        # the handlers of the other groups are not thread-safe -> one worker each
+        key = (packet.port, packet.get_src()) if self._by_flow and group == "l2" else group
+        if not self._dispatcher.dispatch(key, handler, packet):
+            self._dropped.labels(notification_types[packet.type], "queue").inc()
+            self._logger.debug("Dropped packet in of " + group, 3)
+
+    def process_packet(self, packet):
+        cpu = FastPacket.parse(packet.payload)
+        if cpu is None or not cpu.is_notification():
             # drop the packet
             return
 
-        notification = cpu[Notification]
-
-        self._logger.debug("Notification type: " + notification_types[notification.type])
-
-        if notification.type == Notification(type="DST_MAC_UNKNOWN").type \
-                or notification.type == Notification(type="SRC_MAC_UNKNOWN").type \
-                or notification.type == Notification(type="REFRESH_L2_ENTRY").type \
-                or notification.type == Notification(type="CHANGED_L2_ENTRY").type \
-                or notification.type == Notification(type="ARP").type:
-            self._l2_manager.process_packet(cpu)
-        elif notification.type == Notification(type="LLDP").type:
-            self._l2_manager.learn_source(cpu)
-            self._topology_manager.handle_lldp(cpu)
-        elif notification.type == Notification(type="EAP").type:
-            self._authenticator.handle_eapol(cpu)
-        elif notification.type == Notification(type="MACSEC_SOFT_PACKET_LIMIT").type \
-                or notification.type == Notification(type="MACSEC_HARD_PACKET_LIMIT").type:
-            self._macsec_manager.handle_notification(cpu)
-        elif notification.type == Notification(type="IPSEC_SOFT_PACKET_LIMIT").type \
-                or notification.type == Notification(type="IPSEC_HARD_PACKET_LIMIT").type:
-            self._ipsec_manager.handle_notification(cpu)
-        else:
-            self._logger.warn("Unknown notification type: " + str(notification.type))
+        self._logger.debug("Packet in -> " + str(cpu), 4)
 
-    def listen(self, switch_connection: SwitchConnection):
-        switch_connection.listen_packet_in(self.process_packet)
+        if cpu.type not in self._handlers:
+            self._logger.warn("Unknown notification type: " + str(cpu.type))
+            return
+
+        name = notification_types[cpu.type]
+        self._packet_ins.labels(name).inc()
+
+        if not self._admission.admit(cpu.type, cpu.port):
+            # drop before any handler or scapy looks at the packet
+            self._dropped.labels(name, "admission").inc()
+            return
+
+        self._logger.debug("Notification type: " + name, 4)
+
+        if cpu.type == NOTIFICATION_TYPES["LLDP"]:
+            # learning must not wait for the topology update
+            self._dispatch("l2", self._l2_manager.learn_source, cpu)
 
+        group, handler = self._handlers[cpu.type]
+        self._dispatch(group, handler, cpu)
 
+    def _dispatch_idle_timeout(self, key, table_entries: List) -> None:
+        if not self._dispatcher.dispatch(key, self._l2_manager.handle_idle_timeout, table_entries):
+            self._logger.debug("Dropped idle timeout notification", 3)
+
+    def process_idle_timeout(self, table_entries: List) -> None:
+        # aging is handled on the same worker as learning
+        if not self._by_flow:
+            self._dispatch_idle_timeout("l2", table_entries)
+            return
+
+        for table_entry in table_entries:
+            source = self._l2_manager.get_idle_source(table_entry)
+            if source is not None:
+                self._dispatch_idle_timeout(source, [ table_entry ])
+
+    def listen(self, switch_connection: SwitchConnection):
+        switch_connection.listen_packet_in(self.process_packet)
+        switch_connection.listen_idle_timeout(self.process_idle_timeout)
@@ -6,7 +6,7 @@ from common_lib.credentials import Credentials
 # other
 from json import load
 from ipaddress import ip_network, ip_address
-from typing import Set, Dict
+from typing import Set, Dict, Optional
 from os.path import join, dirname
 
 class SwitchSettings(SubSettings):
@@ -35,6 +35,72 @@ class SwitchSettings(SubSettings):
     def get_notification_socket(self) -> str:
         return self.get_data("notification_socket")
 
+    def get_write_batch_size(self) -> int:
+        return int(self.get_data("write_batch_size")) if self.has("write_batch_size") else 128
+
+    def get_write_batch_delay(self) -> float:
+        return float(self.get_data("write_batch_delay")) if self.has("write_batch_delay") else 0.005
+
+    def get_write_max_in_flight(self) -> int:
+        return int(self.get_data("write_max_in_flight")) if self.has("write_max_in_flight") else 4
+
+    def get_packet_workers(self) -> int:
+        return int(self.get_data("packet_workers")) if self.has("packet_workers") else 4
+
+    def get_packet_queue_size(self) -> int:
+        return int(self.get_data("packet_queue_size")) if self.has("packet_queue_size") else 1024
+
+    def get_packet_dispatch(self) -> str:
+        """ Key packets by "type" (handler group) or l2 packets by "flow" (port, source mac). """
+        return self.get_data("packet_dispatch") if self.has("packet_dispatch") else "type"
+
+    def get_punt_rate(self) -> float:
+        """ Packets in per second and notification type. """
+        return float(self.get_data("punt_rate")) if self.has("punt_rate") else 2000
+
+    def get_punt_burst(self) -> float:
+        return float(self.get_data("punt_burst")) if self.has("punt_burst") else 4000
+
+    def get_punt_port_rate(self) -> float:
+        """ Packets in per second, notification type and ingress port. """
+        return float(self.get_data("punt_port_rate")) if self.has("punt_port_rate") else 200
+
+    def get_punt_port_burst(self) -> float:
+        return float(self.get_data("punt_port_burst")) if self.has("punt_port_burst") else 400
+
+    def get_flood_offload(self) -> bool:
+        """ Flood in the data plane with multicast groups instead of by the controller. """
+        return bool(self.get_data("flood_offload")) if self.has("flood_offload") else True
+
+    def get_reconcile_interval(self) -> Optional[ int ]:
+        return int(self.get_data("reconcile_interval")) if self.has("reconcile_interval") else None
+
+    def get_reconnect_backoff(self) -> float:
+        """ Seconds to wait before the first attempt to reconnect the stream. """
+        return float(self.get_data("reconnect_backoff")) if self.has("reconnect_backoff") else 0.5
+
+    def get_reconnect_max_backoff(self) -> float:
+        return float(self.get_data("reconnect_max_backoff")) \
+                if self.has("reconnect_max_backoff") else 30
+
+    def get_packet_out_queue_size(self) -> int:
+        """ Packets out which are queued, also while the stream is down. """
+        return int(self.get_data("packet_out_queue_size")) \
+                if self.has("packet_out_queue_size") else 4096
+
+    def get_packet_out_policy(self) -> str:
+        """ "drop" new packets out if the queue is full or "block" the sender. """
+        return self.get_data("packet_out_policy") if self.has("packet_out_policy") else "drop"
+
+    def get_packet_out_block_timeout(self) -> float:
+        """ Seconds a blocked sender waits before its packet out is dropped. """
+        return float(self.get_data("packet_out_block_timeout")) \
+                if self.has("packet_out_block_timeout") else 1.0
+
+    def get_packet_out_drain(self) -> int:
+        """ Packets out which are taken from the queue at once. """
+        return int(self.get_data("packet_out_drain")) if self.has("packet_out_drain") else 256
+
 class PortAuthorizationSettings(SubSettings):
 
     def __init__(self, data: Dict) -> None:
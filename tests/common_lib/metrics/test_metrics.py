@@ -0,0 +1,61 @@
+# common
+from common_lib.metrics import Counter, Gauge, Histogram, Registry
+
+# other
+from unittest import TestCase
+
+class TestMetrics(TestCase):
+
+    def test_counter(self):
+        counter = Counter("requests_total", "Handled requests.")
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(counter.expose(), "# HELP requests_total Handled requests.\n"
+                "# TYPE requests_total counter\n"
+                "requests_total 3\n")
+
+    def test_labels(self):
+        counter = Counter("packets_total", "Packets.", [ "port", "kind" ])
+        counter.labels(2, "l2").inc()
+        counter.labels(1, "a\"b\\c\nd").inc(0.5)
+        self.assertIs(counter.labels(2, "l2"), counter.labels("2", "l2"))
+        self.assertEqual(counter.expose().splitlines()[2:], [
+            "packets_total{port=\"1\",kind=\"a\\\"b\\\\c\\nd\"} 0.5",
+            "packets_total{port=\"2\",kind=\"l2\"} 1" ])
+
+    def test_gauge_function(self):
+        gauge = Gauge("queue", "Queue length.")
+        gauge.inc(5)
+        gauge.dec(2)
+        self.assertEqual(gauge.get(), 3)
+        gauge.set_function(lambda: 7)
+        self.assertEqual(gauge.expose().splitlines()[-1], "queue 7")
+
+    def test_histogram(self):
+        histogram = Histogram("latency_seconds", "Latency.", buckets=[ 1, 0.5 ])
+        for value in [ 0.1, 0.5, 0.7, 3 ]:
+            histogram.observe(value)
+        self.assertEqual(histogram.expose().splitlines()[2:], [
+            "latency_seconds_bucket{le=\"0.5\"} 2",
+            "latency_seconds_bucket{le=\"1\"} 3",
+            "latency_seconds_bucket{le=\"+Inf\"} 4",
+            "latency_seconds_sum 4.3",
+            "latency_seconds_count 4" ])
+
+    def test_histogram_labels(self):
+        histogram = Histogram("size", "Size.", [ "kind" ], buckets=[ 1 ])
+        histogram.labels("a").observe(2)
+        self.assertEqual(histogram.expose().splitlines()[2:], [
+            "size_bucket{kind=\"a\",le=\"1\"} 0",
+            "size_bucket{kind=\"a\",le=\"+Inf\"} 1",
+            "size_sum{kind=\"a\"} 2",
+            "size_count{kind=\"a\"} 1" ])
+
+    def test_registry(self):
+        registry = Registry()
+        self.assertIs(registry.counter("b_total", "B."), registry.counter("b_total", "B."))
+        registry.gauge("a", "A.").set(1)
+        with self.assertRaises(AssertionError):
+            registry.gauge("b_total", "B.")
+        self.assertEqual(registry.expose(), "# HELP a A.\n# TYPE a gauge\na 1\n"
+                "# HELP b_total B.\n# TYPE b_total counter\nb_total 0\n")
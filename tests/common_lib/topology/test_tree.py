@@ -0,0 +1,103 @@
+# common
+from common_lib.topology import Edge, Topology, ShortestPathTree
+
+# other
+from networkx import single_source_shortest_path_length # type: ignore
+from random import Random
+from unittest import TestCase
+from uuid import UUID
+
+def node(i: int) -> UUID:
+    return UUID(int=i)
+
+class TestShortestPathTree(TestCase):
+
+    def setUp(self):
+        self.topology = Topology()
+
+    def connect(self, x: int, y: int) -> None:
+        self.topology.set(Edge(node(x), 1, node(y), 1))
+
+    def disconnect(self, x: int, y: int) -> None:
+        self.topology.remove(node(x), node(y))
+
+    def assert_tree(self, tree: ShortestPathTree) -> None:
+        root = tree.get_root()
+        expected = single_source_shortest_path_length(self.topology._connections, root) \
+                if self.topology.has_node(root) else { root: 0 }
+        self.assertEqual(tree._distances, expected)
+        for child, parent in tree.get_parents().items():
+            if parent is not None:
+                self.assertIn(parent, self.topology.get_neighbors(child))
+                self.assertEqual(tree.get_distance(parent), tree.get_distance(child) - 1)
+
+    def test_add_edge(self):
+        self.connect(1, 2)
+        self.connect(2, 3)
+        tree = ShortestPathTree(self.topology, node(1))
+        self.assertEqual(tree.get_distance(node(3)), 2)
+
+        self.connect(1, 3)
+        changes = tree.add_edge(node(1), node(3))
+        self.assertEqual(changes, { node(3): node(2) })
+        self.assertEqual(tree.get_parent(node(3)), node(1))
+
+        # does not shorten any path
+        self.connect(2, 3)
+        self.assertEqual(tree.add_edge(node(2), node(3)), { })
+
+    def test_next_hops(self):
+        for x, y in [ (1, 2), (1, 3), (2, 4), (3, 4) ]:
+            self.connect(x, y)
+        tree = ShortestPathTree(self.topology, node(1))
+        self.assertEqual(set(tree.get_next_hops(node(4))), { node(2), node(3) })
+        self.assertEqual(tree.get_next_hops(node(1)), [ ])
+        self.assertEqual(tree.get_next_hops(node(5)), [ ])
+
+    def test_remove_edge(self):
+        for x, y in [ (1, 2), (2, 3), (1, 4), (4, 5), (5, 3) ]:
+            self.connect(x, y)
+        tree = ShortestPathTree(self.topology, node(1))
+        self.assertEqual(tree.get_parent(node(3)), node(2))
+
+        # the subtree below the edge is reattached
+        self.disconnect(2, 3)
+        changes = tree.remove_edge(node(2), node(3))
+        self.assertEqual(changes, { node(3): node(2) })
+        self.assertEqual(tree.get_parent(node(3)), node(5))
+        self.assertEqual(tree.get_distance(node(3)), 3)
+
+        # not a tree edge
+        self.connect(2, 5)
+        tree.add_edge(node(2), node(5))
+        self.disconnect(2, 5)
+        self.assertEqual(tree.remove_edge(node(2), node(5)), { })
+
+        # unreachable afterwards
+        self.disconnect(1, 4)
+        changes = tree.remove_edge(node(1), node(4))
+        self.assertEqual(set(changes.keys()), { node(3), node(4), node(5) })
+        self.assertIsNone(tree.get_parent(node(4)))
+        self.assertEqual(tree.get_distance(node(5)), float("inf"))
+        self.assert_tree(tree)
+
+    def test_random_changes(self):
+        random = Random(2)
+        nodes = list(range(1, 16))
+        trees = [ ShortestPathTree(self.topology, node(root)) for root in nodes[:4] ]
+
+        for step in range(500):
+            edges = self.topology.get_edges()
+            if len(edges) > 0 and random.random() < 0.4:
+                x, y = self.topology.get_edge_controllers(random.choice(edges))
+                self.topology.remove(x, y)
+                for tree in trees:
+                    tree.remove_edge(x, y)
+            else:
+                x, y = random.sample(nodes, 2)
+                self.connect(x, y)
+                for tree in trees:
+                    tree.add_edge(node(x), node(y))
+
+            for tree in trees:
+                self.assert_tree(tree)
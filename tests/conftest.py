@@ -0,0 +1,16 @@
+"""
+Setup of the unit tests, see the test target of the Makefile. The tests
+need the compiled protos on the PYTHONPATH and the pure python protobuf
+implementation (PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION=python).
+"""
+
+# other
+from types import ModuleType
+import sys
+
+# the port monitor imports nnpy, which needs the nanomsg library of
+# bmv2; no test opens its socket, thus an empty module is enough
+try:
+    import nnpy # type: ignore
+except ImportError:
+    sys.modules["nnpy"] = ModuleType("nnpy")
@@ -0,0 +1,8 @@
+# other
+from typing import Callable
+
+class Logger:
+    """ Logger which drops all messages, replaces common_lib.logger.Logger in tests. """
+
+    def __getattr__(self, name: str) -> Callable:
+        return lambda *args: None
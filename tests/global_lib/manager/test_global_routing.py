@@ -0,0 +1,190 @@
+# tests
+from fakes import Logger
+
+# common
+from common_lib.topology import Edge, Topology
+from common_lib.routing import ForwardRule
+
+# global
+from global_lib.manager.routing import RoutingManager
+
+# other
+from networkx import single_source_shortest_path_length # type: ignore
+from ipaddress import ip_network
+from random import Random
+from unittest import TestCase
+from uuid import UUID
+
+class Settings:
+    def get_routing_workers(self):
+        return 4
+
+    def get_routing_deadline(self):
+        return 5
+
+class Routing:
+    """ Routing service of a local controller which checks the sent changes. """
+
+    def __init__(self) -> None:
+        self.rules = set() # type: set
+        self.failures = 0
+
+    def apply_forward_rules(self, added, removed):
+        if self.failures > 0:
+            self.failures -= 1
+            raise Exception("not reachable")
+        for rule in removed:
+            self.rules.remove(rule)
+        for rule in added:
+            assert rule not in self.rules
+            self.rules.add(rule)
+
+    def stream_forward_rules(self, chunks):
+        for added, removed in chunks:
+            self.apply_forward_rules(added, removed)
+
+class Controller:
+
+    def __init__(self, id_: UUID) -> None:
+        self._id = id_
+        self.routing = Routing()
+
+    def get_mac(self):
+        return "00:00:00:00:00:%02x" % self._id.int
+
+    def get_name(self):
+        return str(self._id)
+
+    def get_service(self, name):
+        return self.routing
+
+class ControllerManager:
+
+    def __init__(self, ids) -> None:
+        self.controllers = dict((id_, Controller(id_)) for id_ in ids)
+
+    def get_local_controller(self, id_):
+        return self.controllers[id_]
+
+    get_controller = get_local_controller
+
+    def has_controller(self, id_):
+        return id_ in self.controllers
+
+    def listen_remove_controller(self, handler):
+        pass
+
+def node(i: int) -> UUID:
+    return UUID(int=i)
+
+class TestRoutingManager(TestCase):
+
+    def create(self, size: int) -> None:
+        self.topology = Topology()
+        self.controller_manager = ControllerManager([ node(i) for i in range(1, size + 1) ])
+        self.manager = RoutingManager(Logger(), Settings(), None, self.controller_manager,
+                self.topology)
+
+    def tearDown(self):
+        self.manager.teardown()
+
+    def get_installed(self) -> set:
+        return set(rule for controller in self.controller_manager.controllers.values()
+                for rule in controller.routing.rules)
+
+    def test_equal_cost_paths(self):
+        self.create(4)
+        subnet = ip_network("10.0.0.0/16")
+        for x, y, port in [ (1, 2, 1), (1, 3, 2), (2, 4, 3), (3, 4, 4) ]:
+            self.topology.set(Edge(node(x), port, node(y), port + 10))
+        self.manager.add_subnet_silent(node(1), subnet)
+
+        rules = self.manager.get_forward_rules()
+        self.assertEqual(set(rule for rule in rules if rule.get_src() == node(4)), {
+            ForwardRule(node(4), node(2), "00:00:00:00:00:02", 13, subnet),
+            ForwardRule(node(4), node(3), "00:00:00:00:00:03", 14, subnet) })
+        self.assertEqual(len(rules), 4)
+        self.assertEqual(self.get_installed(), rules)
+
+        # one of the paths is gone
+        self.topology.remove(node(3), node(4))
+        self.assertEqual(set(rule for rule in self.get_installed() if rule.get_src() == node(4)),
+                { ForwardRule(node(4), node(2), "00:00:00:00:00:02", 13, subnet) })
+
+        self.manager.remove_subnet_silent(node(1), subnet)
+        self.assertEqual(self.manager.get_forward_rules(), set())
+        self.assertEqual(self.get_installed(), set())
+
+    def test_removed_controller(self):
+        self.create(3)
+        self.topology.set(Edge(node(1), 1, node(2), 1))
+        self.topology.set(Edge(node(2), 2, node(3), 2))
+        controller = self.controller_manager.controllers.pop(node(3))
+        self.manager.add_subnet_silent(node(1), ip_network("10.0.0.0/16"))
+        self.assertEqual(len(self.manager.get_forward_rules()), 1)
+        self.assertEqual(len(self.get_installed()), 1)
+
+        # the rules are sent with the next update once the controller is back
+        self.controller_manager.controllers[node(3)] = controller
+        self.manager.add_subnet_silent(node(1), ip_network("10.1.0.0/16"))
+        self.assertEqual(len(controller.routing.rules), 2)
+        self.assertEqual(self.manager.get_forward_rules(), self.get_installed())
+
+    def test_failed_update(self):
+        self.create(3)
+        self.topology.set(Edge(node(1), 1, node(2), 1))
+        self.topology.set(Edge(node(2), 2, node(3), 2))
+        routing = self.controller_manager.controllers[node(3)].routing
+        routing.failures = 1
+
+        subnet = ip_network("10.0.0.0/16")
+        self.manager.add_subnet_silent(node(1), subnet)
+        self.assertEqual(routing.rules, set())
+        self.assertEqual(len(self.manager.get_forward_rules()), 1)
+
+        # an update which does not touch the rules of the controller resends them
+        self.topology.set(Edge(node(1), 3, node(4), 3))
+        self.assertEqual(routing.rules,
+                { ForwardRule(node(3), node(2), "00:00:00:00:00:02", 2, subnet) })
+        self.assertEqual(self.manager.get_forward_rules(), self.get_installed())
+
+    def test_random_changes(self):
+        """ Compare the incremental rules with a full computation. """
+        random = Random(4)
+        self.create(12)
+        ids = list(self.controller_manager.controllers.keys())
+        subnets = [ ip_network("10.%d.0.0/16" % i) for i in range(4) ]
+
+        for step in range(300):
+            value = random.random()
+            edges = self.topology.get_edges()
+            if value < 0.45 or len(edges) == 0:
+                x, y = random.sample(ids, 2)
+                self.topology.set(Edge(x, random.randint(1, 4), y, random.randint(1, 4)))
+            elif value < 0.8:
+                self.topology.remove(*self.topology.get_edge_controllers(random.choice(edges)))
+            elif value < 0.9:
+                self.manager.add_subnet_silent(random.choice(ids), random.choice(subnets))
+            else:
+                owners = [ (owner, subnet) for owner, owned in self.manager._controller_subnets.items()
+                        for subnet in owned ]
+                if len(owners) > 0:
+                    self.manager.remove_subnet_silent(*random.choice(owners))
+
+            expected = set()
+            for owner, owned in self.manager._controller_subnets.items():
+                if len(owned) == 0:
+                    continue
+                distances = single_source_shortest_path_length(self.topology._connections, owner) \
+                        if self.topology.has_node(owner) else { }
+                for x, distance in distances.items():
+                    for y in self.topology.get_neighbors(x):
+                        if distances.get(y) == distance - 1:
+                            edge = self.topology.get_edge(x, y)
+                            port = edge.get_port1() if edge.get_controller1() == x else edge.get_port2()
+                            for subnet in owned:
+                                expected.add(ForwardRule(x, y, "00:00:00:00:00:%02x" % y.int, port,
+                                        subnet))
+
+            self.assertEqual(self.manager.get_forward_rules(), expected)
+            self.assertEqual(self.get_installed(), expected)
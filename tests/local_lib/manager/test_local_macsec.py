@@ -0,0 +1,191 @@
+# tests
+from fakes import Logger
+
+# common
+from common_lib.macsec import Address, Channel, Rule
+from common_lib.topology import Edge
+
+# local
+from local_lib.manager.macsec import MacsecManager
+
+# other
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import TestCase
+from uuid import UUID
+
+class Settings:
+    def get_mac(self):
+        return "00:00:00:00:00:ff"
+
+class Task:
+    def set_ready(self, time):
+        pass
+
+    def cancel(self):
+        pass
+
+class EventSystem:
+    def set_timeout(self, f, timeout):
+        return Task()
+
+class Template:
+
+    def __init__(self, table: str) -> None:
+        self._table = table
+
+    def build(self, match_values, param_values=()):
+        return (self._table, match_values[0], tuple(param_values))
+
+class Helper:
+    def compileTableEntry(self, table, match_fields, action=None, params=()):
+        return Template(table)
+
+class Pending:
+
+    def __init__(self, error) -> None:
+        self._error = error
+
+    def get_error(self):
+        return self._error
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+
+class Switch:
+    """ Switch which applies every update at once and counts the writes of the batches. """
+
+    helper = Helper()
+
+    def __init__(self) -> None:
+        self.entries = dict() # type: dict
+        self.writes = [ ] # type: list
+        # number of inserts which are rejected by port
+        self.rejected = dict() # type: dict
+        self._depth = 0
+        self._pendings = [ ] # type: list
+
+    def in_batch(self):
+        return self._depth > 0
+
+    @contextmanager
+    def batch(self):
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+        if self._depth == 0:
+            pendings, self._pendings = self._pendings, [ ]
+            self.writes.append(len(pendings))
+            for pending in pendings:
+                pending.result()
+
+    @contextmanager
+    def collect(self):
+        pendings = [ ] # type: list
+        start = len(self._pendings)
+        try:
+            yield pendings
+        finally:
+            pendings.extend(self._pendings[start:])
+
+    def _submit(self, operation):
+        try:
+            operation()
+            pending = Pending(None)
+        except Exception as e:
+            pending = Pending(e)
+        if self.in_batch():
+            self._pendings.append(pending)
+        else:
+            self.writes.append(1)
+            pending.result()
+
+    def write_table_entry(self, entry):
+        def insert():
+            table, port, params = entry
+            if self.rejected.get(port, 0) > 0:
+                self.rejected[port] -= 1
+                raise Exception("rejected")
+            assert (table, port) not in self.entries
+            self.entries[(table, port)] = params
+        self._submit(insert)
+
+    def delete_table_entry(self, entry):
+        self._submit(lambda: self.entries.pop(entry[:2]))
+
+    def update_table_entries(self, entries):
+        def modify(entry):
+            assert entry[:2] in self.entries
+            self.entries[entry[:2]] = entry[2]
+        with self.batch():
+            for entry in entries:
+                self._submit(lambda: modify(entry))
+
+    def send_packet_out(self, packet):
+        pass
+
+class PortAuthorizer:
+
+    def __init__(self) -> None:
+        self.ports = set() # type: set
+
+    def force_authorization(self, port):
+        self.ports.add(port)
+
+    def unforce_authorization(self, port):
+        self.ports.remove(port)
+
+def create_rule(port: int) -> Rule:
+    address = Address("00:00:00:00:00:01", port)
+    return Rule(
+        Channel(bytes([ port ] * 16), address),
+        Channel(bytes([ port + 1 ] * 16), address),
+        1000,
+        5000,
+        datetime.now() + timedelta(seconds=30),
+        datetime.now() + timedelta(seconds=60),
+        Edge(UUID(int=1), port, UUID(int=2), port)
+    )
+
+class TestMacsecManager(TestCase):
+
+    def setUp(self):
+        self.switch = Switch()
+        self.port_authorizer = PortAuthorizer()
+        self.manager = MacsecManager(Logger(), Settings(), self.switch, self.port_authorizer,
+                None, EventSystem(), None)
+
+    def test_apply(self):
+        rules = [ create_rule(port) for port in range(1, 4) ]
+        errors = self.manager.apply([ ], rules, [ ])
+        self.assertEqual(errors, [ ])
+        # protect and validate entries of all rules in one write
+        self.assertEqual(self.switch.writes, [ 6 ])
+        self.assertEqual(self.port_authorizer.ports, { 1, 2, 3 })
+
+        renewed = [ create_rule(1) ]
+        errors = self.manager.apply([ rules[2].get_protect().get_address() ], [ ], renewed)
+        self.assertEqual(errors, [ ])
+        self.assertEqual(self.switch.writes[1:], [ 4 ])
+        self.assertEqual(self.port_authorizer.ports, { 1, 2 })
+        self.assertEqual(len(self.switch.entries), 4)
+
+    def test_retry(self):
+        rules = [ create_rule(port) for port in range(1, 4) ]
+        # the first add of port 2 fails, port 3 fails on the retry too
+        self.switch.rejected = { 2: 1, 3: 4 }
+        errors = self.manager.apply([ ], rules, [ ])
+
+        self.assertEqual([ str(address) for address, error in errors ],
+                [ str(rules[2].get_protect().get_address()) ])
+        # the other rules are kept, the failed one is rolled back
+        self.assertEqual(self.port_authorizer.ports, { 1, 2 })
+        self.assertEqual(sorted(port for table, port in self.switch.entries), [ 1, 1, 2, 2 ])
+
+        errors = self.manager.apply([ rule.get_protect().get_address() for rule in rules[:2] ],
+                [ ], [ ])
+        self.assertEqual(errors, [ ])
+        self.assertEqual(self.switch.entries, { })
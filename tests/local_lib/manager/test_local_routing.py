@@ -0,0 +1,218 @@
+# tests
+from fakes import Logger
+
+# common
+from common_lib.ipaddress import Host
+from common_lib.routing import ForwardRule
+
+# local
+from local_lib.manager.routing import RoutingManager
+
+# other
+from p4.v1.p4runtime_pb2 import TableEntry # type: ignore
+from contextlib import contextmanager
+from ipaddress import ip_address, ip_network
+from random import Random
+from unittest import TestCase
+from uuid import UUID
+
+class Settings:
+    def get_mac(self):
+        return "00:00:00:00:00:ff"
+
+    def get_subnets(self):
+        return [ ]
+
+class Registration:
+    def on_register(self, handler):
+        pass
+
+class GlobalController:
+    def get_service(self, name):
+        return Registration()
+
+class Template:
+    def build(self, match_values, param_values=()):
+        table_entry = TableEntry()
+        table_entry.table_id = 1
+        table_entry.match.add().lpm.value = match_values[0][0].encode()
+        return table_entry
+
+class Helper:
+    def compileTableEntry(self, *args):
+        return Template()
+
+    def get_action_profiles_id(self, name):
+        return 7
+
+    def buildAction(self, name, params):
+        return params["port"]
+
+class Switch:
+    """
+    Switch which applies the updates of a batch in random order, as a
+    switch may do with the updates of one write request, and checks
+    that every reference is valid afterwards.
+    """
+
+    helper = Helper()
+
+    def __init__(self, random: Random) -> None:
+        self._random = random
+        self._operations = [ ] # type: list
+        self.members = dict() # type: dict
+        self.groups = dict() # type: dict
+        self.entries = dict() # type: dict
+
+    @contextmanager
+    def batch(self):
+        self._operations = [ ]
+        yield
+        self._random.shuffle(self._operations)
+        for operation in self._operations:
+            operation()
+        self._check()
+
+    def _check(self):
+        for members in self.groups.values():
+            assert all(member in self.members for member in members)
+        for kind, id_ in self.entries.values():
+            assert id_ in (self.members if kind == "member" else self.groups)
+
+    def _is_used(self, member_id):
+        return any(member_id in members for members in self.groups.values()) \
+                or ("member", member_id) in self.entries.values()
+
+    def write_action_profile_member(self, profile_id, member_id, action):
+        def write():
+            assert member_id not in self.members
+            self.members[member_id] = action
+        self._operations.append(write)
+
+    def delete_action_profile_member(self, profile_id, member_id):
+        def delete():
+            assert not self._is_used(member_id)
+            del self.members[member_id]
+        self._operations.append(delete)
+
+    def write_action_profile_group(self, profile_id, group_id, member_ids):
+        def write():
+            assert group_id not in self.groups
+            self.groups[group_id] = list(member_ids)
+        self._operations.append(write)
+
+    def update_action_profile_group(self, profile_id, group_id, member_ids):
+        def update():
+            assert group_id in self.groups
+            self.groups[group_id] = list(member_ids)
+        self._operations.append(update)
+
+    def delete_action_profile_group(self, profile_id, group_id):
+        def delete():
+            assert ("group", group_id) not in self.entries.values()
+            del self.groups[group_id]
+        self._operations.append(delete)
+
+    @staticmethod
+    def _get_reference(table_entry):
+        if table_entry.action.WhichOneof("type") == "action_profile_member_id":
+            return ("member", table_entry.action.action_profile_member_id)
+        return ("group", table_entry.action.action_profile_group_id)
+
+    def write_table_entry(self, table_entry):
+        key, reference = table_entry.match[0].lpm.value, self._get_reference(table_entry)
+        def write():
+            assert key not in self.entries
+            self.entries[key] = reference
+        self._operations.append(write)
+
+    def update_table_entry(self, table_entry):
+        key, reference = table_entry.match[0].lpm.value, self._get_reference(table_entry)
+        def update():
+            assert key in self.entries
+            self.entries[key] = reference
+        self._operations.append(update)
+
+    def delete_table_entry(self, table_entry):
+        key = table_entry.match[0].lpm.value
+        def delete():
+            del self.entries[key]
+        self._operations.append(delete)
+
+    def get_ports(self, subnet):
+        """ Ports the switch forwards a subnet to. """
+        kind, id_ = self.entries[str(subnet.network_address).encode()]
+        members = [ id_ ] if kind == "member" else self.groups[id_]
+        return set(self.members[member] for member in members)
+
+def build_rule(port: int, subnet: str) -> ForwardRule:
+    return ForwardRule(UUID(int=1), UUID(int=port + 1), "00:00:00:00:00:%02x" % port, port,
+            ip_network(subnet))
+
+class TestRoutingManager(TestCase):
+
+    def setUp(self):
+        self.switch = Switch(Random(1))
+        self.manager = RoutingManager(Logger(), Settings(), self.switch, GlobalController())
+
+    def test_single_next_hop(self):
+        self.manager.apply_forward_rules([ build_rule(1, "10.1.0.0/16") ], [ ])
+        self.assertEqual(self.switch.get_ports(ip_network("10.1.0.0/16")), { 1 })
+        self.assertEqual(len(self.switch.groups), 0)
+
+    def test_equal_cost_next_hops(self):
+        subnet = ip_network("10.1.0.0/16")
+        self.manager.apply_forward_rules([ build_rule(1, "10.1.0.0/16"), build_rule(2, "10.1.0.0/16") ], [ ])
+        self.assertEqual(self.switch.get_ports(subnet), { 1, 2 })
+        self.assertEqual(len(self.switch.groups), 1)
+
+        # back to a single next hop -> the group is removed
+        self.manager.apply_forward_rules([ ], [ build_rule(1, "10.1.0.0/16") ])
+        self.assertEqual(self.switch.get_ports(subnet), { 2 })
+        self.assertEqual(len(self.switch.groups), 0)
+        self.assertEqual(len(self.switch.members), 1)
+
+        self.manager.remove_forward_rule(build_rule(2, "10.1.0.0/16"))
+        self.assertEqual(self.switch.entries, { })
+        self.assertEqual(self.switch.members, { })
+
+    def test_shared_members(self):
+        self.manager.apply_forward_rules([ build_rule(1, "10.1.0.0/16"), build_rule(1, "10.2.0.0/16") ], [ ])
+        self.assertEqual(len(self.switch.members), 1)
+
+        self.manager.remove_forward_rule(build_rule(1, "10.1.0.0/16"))
+        self.assertEqual(len(self.switch.members), 1)
+        self.assertEqual(self.switch.get_ports(ip_network("10.2.0.0/16")), { 1 })
+
+    def test_host(self):
+        self.manager.add_host(Host(ip_address("10.9.0.1"), "aa:aa:aa:aa:aa:aa", 3))
+        self.assertEqual(self.switch.get_ports(ip_network("10.9.0.1/32")), { 3 })
+
+    def test_random_changes(self):
+        random = Random(4)
+        subnets = [ "10.%d.0.0/16" % i for i in range(5) ]
+        wanted = dict((subnet, set()) for subnet in subnets) # type: dict
+
+        for step in range(300):
+            added, removed = [ ], [ ]
+            for subnet in random.sample(subnets, 2):
+                port = random.randint(1, 4)
+                if port in wanted[subnet]:
+                    wanted[subnet].discard(port)
+                    removed.append(build_rule(port, subnet))
+                else:
+                    wanted[subnet].add(port)
+                    added.append(build_rule(port, subnet))
+            self.manager.apply_forward_rules(added, removed)
+
+            for subnet, ports in wanted.items():
+                if len(ports) == 0:
+                    self.assertNotIn(subnet.split("/")[0].encode(), self.switch.entries)
+                else:
+                    self.assertEqual(self.switch.get_ports(ip_network(subnet)), ports)
+
+            # unused members and groups are removed
+            used = set(port for ports in wanted.values() for port in ports)
+            self.assertEqual(set(self.switch.members.values()), used)
+            self.assertEqual(len(self.switch.groups),
+                    sum(1 for ports in wanted.values() if len(ports) > 1))
@@ -0,0 +1,76 @@
+# local
+from local_lib.p4runtime_lib.convert import encode, encodeMany, get_encoder, MAC, IPV4, NUMBER
+from local_lib.p4runtime_lib.helper import P4InfoHelper
+
+# other
+from tempfile import NamedTemporaryFile
+from unittest import TestCase
+import os
+
+P4INFO = """
+tables {
+  preamble { id: 1 name: "ingress.forward" alias: "forward" }
+  match_fields { id: 1 name: "hdr.ipv4.dstAddr" bitwidth: 32 match_type: LPM }
+  match_fields { id: 2 name: "hdr.ethernet.dstAddr" bitwidth: 48 match_type: EXACT }
+  action_refs { id: 2 }
+}
+actions {
+  preamble { id: 2 name: "ingress.do_forward" alias: "do_forward" }
+  params { id: 1 name: "dstAddr" bitwidth: 48 }
+  params { id: 2 name: "port" bitwidth: 9 }
+}
+"""
+
+class TestEncode(TestCase):
+
+    def test_addresses(self):
+        self.assertEqual(encode("aa:bb:cc:dd:ee:ff", 48), b"\xaa\xbb\xcc\xdd\xee\xff")
+        self.assertEqual(encode("10.0.0.1", 32), b"\x0a\x00\x00\x01")
+
+    def test_numbers(self):
+        self.assertEqual(encode(1337, 40), b"\x00\x00\x00\x05\x39")
+        self.assertEqual(encode((1337,), 40), b"\x00\x00\x00\x05\x39")
+        self.assertEqual(encode(255, 9), b"\x00\xff")
+        self.assertEqual(encode(1, 32), b"\x00\x00\x00\x01")
+        with self.assertRaises(Exception):
+            encode(256, 8)
+
+    def test_bytes(self):
+        self.assertEqual(encodeMany([ "aa:bb:cc:dd:ee:ff", b"\xaa\xbb\xcc\xdd\xee\xff" ], 48),
+                [ b"\xaa\xbb\xcc\xdd\xee\xff" ] * 2)
+
+    def test_kinds(self):
+        self.assertEqual(get_encoder(48, MAC)("00:00:00:00:00:01"), b"\x00" * 5 + b"\x01")
+        self.assertEqual(get_encoder(32, IPV4)("10.0.0.1"), b"\x0a\x00\x00\x01")
+
+        # strings of other kinds are rejected instead of being guessed
+        with self.assertRaises(Exception):
+            get_encoder(32, IPV4)("1")
+        with self.assertRaises(Exception):
+            get_encoder(48, MAC)("abcdef")
+        with self.assertRaises(Exception):
+            get_encoder(32, NUMBER)("10.0.0.1")
+
+class TestTemplate(TestCase):
+
+    def setUp(self):
+        with NamedTemporaryFile("w", suffix=".txt", delete=False) as p4info:
+            p4info.write(P4INFO)
+        self.addCleanup(os.remove, p4info.name)
+        self.helper = P4InfoHelper(p4info.name)
+
+    def test_build(self):
+        template = self.helper.compileTableEntry("ingress.forward",
+                [ "hdr.ipv4.dstAddr", "hdr.ethernet.dstAddr" ], "ingress.do_forward",
+                [ "dstAddr", "port" ])
+        self.assertIs(template, self.helper.compileTableEntry("ingress.forward",
+                [ "hdr.ipv4.dstAddr", "hdr.ethernet.dstAddr" ], "ingress.do_forward",
+                [ "dstAddr", "port" ]))
+
+        entry = template.build([ ("10.1.0.0", 16), "aa:bb:cc:dd:ee:ff" ],
+                [ "00:00:00:00:00:02", 3 ])
+        self.assertEqual(entry, self.helper.buildTableEntry("ingress.forward",
+                { "hdr.ipv4.dstAddr": ("10.1.0.0", 16), "hdr.ethernet.dstAddr": "aa:bb:cc:dd:ee:ff" },
+                "ingress.do_forward", { "dstAddr": "00:00:00:00:00:02", "port": 3 }))
+        self.assertEqual(entry.match[0].lpm.value, b"\x0a\x01\x00\x00")
+        self.assertEqual(entry.action.action.params[1].value, b"\x00\x03")
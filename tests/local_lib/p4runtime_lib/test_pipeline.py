@@ -0,0 +1,134 @@
+# tests
+from fakes import Logger
+
+# local
+from local_lib.exception import WriteException
+from local_lib.p4runtime_lib.pipeline import WritePipeline
+
+# other
+from p4.v1.p4runtime_pb2 import WriteRequest, Update, Error # type: ignore
+from google.rpc.status_pb2 import Status # type: ignore
+from google.rpc.code_pb2 import OK, ALREADY_EXISTS # type: ignore
+import grpc # type: ignore
+from unittest import TestCase
+
+class Future:
+    """ Answer of a write request which is completed by the test. """
+
+    def __init__(self) -> None:
+        self._callbacks = [ ] # type: list
+        self._error = None
+
+    def add_done_callback(self, callback) -> None:
+        self._callbacks.append(callback)
+
+    def complete(self, error=None) -> None:
+        self._error = error
+        for callback in self._callbacks:
+            callback(self)
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+
+class RpcError(grpc.RpcError):
+
+    def __init__(self, errors) -> None:
+        status = Status()
+        for code in errors:
+            status.details.add().Pack(Error(canonical_code=code, message=str(code)))
+        self._details = status.SerializeToString()
+
+    def trailing_metadata(self):
+        return [ ("grpc-status-details-bin", self._details) ]
+
+    def details(self):
+        return "write failed"
+
+    def code(self):
+        return grpc.StatusCode.UNKNOWN
+
+def build_update(type_, member_id: int, port: int = 0) -> Update:
+    update = Update(type=type_)
+    member = update.entity.action_profile_member
+    member.action_profile_id = 1
+    member.member_id = member_id
+    member.action.action_id = port
+    return update
+
+class TestWritePipeline(TestCase):
+
+    def setUp(self):
+        self.requests = [ ] # type: list
+        self.futures = [ ] # type: list
+        self.written = [ ] # type: list
+        self.pipeline = WritePipeline(Logger(), WriteRequest, self.write, self.written.append,
+                max_batch_size=3, max_delay=10)
+
+    def write(self, request):
+        self.requests.append(request)
+        self.futures.append(Future())
+        return self.futures[-1]
+
+    def test_batch_size(self):
+        pendings = [ self.pipeline.submit(build_update(Update.INSERT, i)) for i in range(4) ]
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(self.requests[0].updates), 3)
+
+        self.futures[0].complete()
+        self.assertEqual([ pending.is_done() for pending in pendings ], [ True ] * 3 + [ False ])
+
+        self.pipeline.flush()
+        self.assertEqual(len(self.requests), 2)
+        self.futures[1].complete()
+        self.assertEqual(len(self.written), 4)
+
+    def test_coalesce_modify(self):
+        insert = self.pipeline.submit(build_update(Update.INSERT, 1, port=1))
+        modify = self.pipeline.submit(build_update(Update.MODIFY, 1, port=2))
+        self.assertEqual(self.pipeline.get_queued(build_update(Update.MODIFY, 1))
+                .entity.action_profile_member.action.action_id, 2)
+
+        self.pipeline.flush()
+        self.assertEqual(len(self.requests[0].updates), 1)
+        update = self.requests[0].updates[0]
+        self.assertEqual(update.type, Update.INSERT)
+        self.assertEqual(update.entity.action_profile_member.action.action_id, 2)
+
+        self.futures[0].complete()
+        insert.result()
+        modify.result()
+
+    def test_delete_is_not_coalesced(self):
+        self.pipeline.submit(build_update(Update.INSERT, 1))
+        self.pipeline.submit(build_update(Update.DELETE, 1))
+        # the insert is sent, the delete waits for its answer
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(self.requests[0].updates), 1)
+        self.futures[0].complete()
+
+        self.pipeline.flush()
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[1].updates[0].type, Update.DELETE)
+
+    def test_error_mapping(self):
+        pendings = [ self.pipeline.submit(build_update(Update.INSERT, i)) for i in range(3) ]
+        self.futures[0].complete(RpcError([ OK, ALREADY_EXISTS ]))
+
+        pendings[0].result()
+        self.assertEqual(pendings[1].get_error().code, ALREADY_EXISTS)
+        # not reported by the switch
+        self.assertEqual(pendings[2].get_error().code, grpc.StatusCode.UNKNOWN)
+        self.assertEqual(self.written, [ self.requests[0].updates[0] ])
+        with self.assertRaises(WriteException):
+            pendings[1].result()
+
+    def test_write_exception(self):
+        def write(request):
+            raise RuntimeError("no connection")
+        self.pipeline._write = write
+
+        pending = self.pipeline.submit(build_update(Update.INSERT, 1))
+        self.pipeline.flush()
+        self.assertIsInstance(pending.get_error(), RuntimeError)
+        self.assertTrue(self.pipeline.wait_idle(0))
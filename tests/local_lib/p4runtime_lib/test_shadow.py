@@ -0,0 +1,77 @@
+# local
+from local_lib.p4runtime_lib.shadow import ShadowStore, get_entry_key, get_action_key
+
+# other
+from p4.v1.p4runtime_pb2 import TableEntry, Update # type: ignore
+from unittest import TestCase
+
+def build_entry(match: bytes, param: bytes, prefix_len: int = 0) -> TableEntry:
+    table_entry = TableEntry()
+    table_entry.table_id = 1
+    field = table_entry.match.add()
+    field.field_id = 1
+    if prefix_len > 0:
+        field.lpm.value = match
+        field.lpm.prefix_len = prefix_len
+    else:
+        field.exact.value = match
+    table_entry.action.action.action_id = 2
+    table_entry.action.action.params.add(param_id=1, value=param)
+    return table_entry
+
+def build_update(type_, table_entry: TableEntry) -> Update:
+    update = Update()
+    update.type = type_
+    update.entity.table_entry.CopyFrom(table_entry)
+    return update
+
+class TestKeys(TestCase):
+
+    def test_leading_zeros(self):
+        padded = build_entry(b"\x00\x00\x01", b"\x00\x05")
+        canonical = build_entry(b"\x01", b"\x05")
+        self.assertEqual(get_entry_key(padded), get_entry_key(canonical))
+        self.assertEqual(get_action_key(padded), get_action_key(canonical))
+
+    def test_zero(self):
+        self.assertEqual(get_entry_key(build_entry(b"\x00\x00", b"")),
+                get_entry_key(build_entry(b"\x00", b"")))
+
+    def test_different_values(self):
+        self.assertNotEqual(get_entry_key(build_entry(b"\x01", b"")),
+                get_entry_key(build_entry(b"\x02", b"")))
+        self.assertNotEqual(get_action_key(build_entry(b"\x01", b"\x01")),
+                get_action_key(build_entry(b"\x01", b"\x02")))
+
+    def test_prefix_length(self):
+        self.assertNotEqual(get_entry_key(build_entry(b"\x0a\x00\x00\x00", b"", 8)),
+                get_entry_key(build_entry(b"\x0a\x00\x00\x00", b"", 16)))
+
+class TestShadowStore(TestCase):
+
+    def test_apply(self):
+        shadow = ShadowStore()
+        table_entry = build_entry(b"\x01", b"\x05")
+        shadow.apply(build_update(Update.INSERT, table_entry))
+        self.assertTrue(shadow.has(build_entry(b"\x00\x01", b"")))
+
+        shadow.apply(build_update(Update.DELETE, table_entry))
+        self.assertFalse(shadow.has(table_entry))
+
+    def test_replace_with_switch_form(self):
+        shadow = ShadowStore()
+        shadow.apply(build_update(Update.INSERT, build_entry(b"\x00\x00\x01", b"\x00\x05")))
+
+        # the switch answers without leading zeros
+        self.assertEqual(shadow.replace([ build_entry(b"\x01", b"\x05") ]), 0)
+        self.assertTrue(shadow.has(build_entry(b"\x00\x00\x01", b"")))
+
+    def test_replace_counts_differences(self):
+        shadow = ShadowStore()
+        shadow.apply(build_update(Update.INSERT, build_entry(b"\x01", b"\x05")))
+        shadow.apply(build_update(Update.INSERT, build_entry(b"\x02", b"\x05")))
+
+        # one entry has another action, one is missing and one is unknown
+        differences = shadow.replace([ build_entry(b"\x01", b"\x06"), build_entry(b"\x03", b"\x05") ])
+        self.assertEqual(differences, 3)
+        self.assertEqual(len(shadow.get_all()), 2)
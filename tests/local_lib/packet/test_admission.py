@@ -0,0 +1,55 @@
+# local
+from local_lib.packet.admission import Admission, TokenBucket
+
+# other
+from time import monotonic
+from unittest import TestCase
+
+class TestTokenBucket(TestCase):
+
+    def test_burst(self):
+        bucket = TokenBucket(1, 3)
+        now = monotonic()
+        self.assertEqual([ bucket.take(now) for i in range(4) ], [ True, True, True, False ])
+
+    def test_rate(self):
+        bucket = TokenBucket(2, 1)
+        now = monotonic()
+        self.assertTrue(bucket.take(now))
+        self.assertFalse(bucket.take(now + 0.25))
+        self.assertTrue(bucket.take(now + 0.5))
+
+    def test_has_keeps_token(self):
+        bucket = TokenBucket(0, 1)
+        now = monotonic()
+        self.assertTrue(bucket.has(now))
+        self.assertTrue(bucket.has(now))
+        self.assertTrue(bucket.take(now))
+        self.assertFalse(bucket.has(now))
+
+class TestAdmission(TestCase):
+
+    def test_port_limit(self):
+        # no refill -> the bursts are the budgets
+        admission = Admission(0, 10, 0, 2)
+        self.assertEqual([ admission.admit(1, 1) for i in range(3) ], [ True, True, False ])
+        self.assertTrue(admission.admit(1, 2))
+
+    def test_type_drops_keep_port_budget(self):
+        admission = Admission(0, 1, 0, 2)
+        self.assertTrue(admission.admit(1, 1))
+        # dropped by the type bucket of type 1
+        self.assertFalse(admission.admit(1, 2))
+        self.assertFalse(admission.admit(1, 2))
+
+        # type 1 on port 2 did not use up its port budget
+        admission._type_buckets[1] = TokenBucket(0, 2)
+        self.assertTrue(admission.admit(1, 2))
+        self.assertTrue(admission.admit(1, 2))
+
+    def test_counts(self):
+        admission = Admission(0, 1, 0, 1)
+        admission.admit(1, 1)
+        admission.admit(1, 1)
+        self.assertEqual(sum(admission.get_admitted().values()), 1)
+        self.assertEqual(sum(admission.get_dropped().values()), 1)
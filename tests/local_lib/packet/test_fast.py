@@ -0,0 +1,51 @@
+# local
+from local_lib.packet.cpu import CPUPacket, Notification
+from local_lib.packet.fast import FastPacket, REASON_NOTIFICATION, REASON_SEND, REASON_SEND_DIRECT, \
+        NOTIFICATION_TYPES, CPU_HEADER, build_flood, pack_cpu_header, pack_ethernet_header
+
+# other
+from scapy.all import Ether, raw # type: ignore
+from unittest import TestCase
+
+DST = "00:00:00:00:00:01"
+SRC = "aa:bb:cc:dd:ee:0f"
+
+class TestFastPacket(TestCase):
+
+    def test_cpu_header_layout(self):
+        header = pack_cpu_header(REASON_SEND, port=513, timestamp=0x123456789abc)
+        self.assertEqual(len(header), len(raw(CPUPacket())))
+        self.assertEqual(header, raw(CPUPacket(reason="SEND", port=513, timestamp=0x123456789abc)))
+
+    def test_parse_notification(self):
+        packet = CPUPacket(reason="NOTIFICATION", port=3, timestamp=0x10000000005,
+                switched_mac_src_with_dst=1) \
+                / Notification(type="ARP", index=7) / Ether(dst=DST, src=SRC, type=0x806)
+        fast = FastPacket.parse(raw(packet))
+
+        self.assertEqual((fast.reason, fast.port, fast.timestamp, fast.flags),
+                (REASON_NOTIFICATION, 3, 0x10000000005, 1))
+        self.assertTrue(fast.is_notification())
+        self.assertEqual((fast.type, fast.index), (NOTIFICATION_TYPES["ARP"], 7))
+        self.assertEqual((fast.get_dst(), fast.get_src()), (DST, SRC))
+        self.assertEqual(fast.get_ethernet(), raw(packet[Ether]))
+        self.assertEqual(fast[Notification].index, 7)
+
+    def test_parse_ethernet(self):
+        ethernet = pack_ethernet_header(DST, SRC, 0x800) + b"payload"
+        fast = FastPacket.parse(pack_cpu_header(REASON_SEND, port=2) + ethernet)
+        self.assertFalse(fast.is_notification())
+        self.assertEqual(fast.get_ethernet(), ethernet)
+        self.assertEqual(fast[Ether].src, SRC)
+
+    def test_parse_too_short(self):
+        self.assertIsNone(FastPacket.parse(b"\x03\x00"))
+        self.assertIsNone(FastPacket.parse(pack_cpu_header(REASON_NOTIFICATION) + b"\x01"))
+
+    def test_build_flood(self):
+        ethernet = pack_ethernet_header(DST, SRC, 0x806)
+        packets = build_flood(ethernet, [ 1, 258 ])
+        self.assertEqual([ CPUPacket(packet).port for packet in packets ], [ 1, 258 ])
+        for packet in packets:
+            self.assertEqual(packet[0], REASON_SEND_DIRECT)
+            self.assertEqual(packet[CPU_HEADER.size:], ethernet)